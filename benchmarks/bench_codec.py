@@ -0,0 +1,74 @@
+"""
+Compares the JSON backends jrpc_helper.codec can use, decoding requests
+and encoding responses of a few realistic sizes
+
+Run it from the repository root:
+    python benchmarks/bench_codec.py
+
+The MIT License (MIT)
+
+Copyright (c) 2016 RPiAwesomneness
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from jrpc_helper import codec  # noqa: E402 pylint: disable=C0413
+
+
+def make_payloads():
+    """
+    Returns (name, request bytes, response object) for each payload size
+    """
+    payloads = []
+
+    for name, count in (("small", 1), ("medium", 100), ("large", 10000)):
+        rows = [{"id": index, "name": "user {}".format(index),
+                 "score": index * 1.5, "active": index % 2 == 0,
+                 "tags": ["spam", "eggs", "été"]}
+                for index in range(count)]
+        request = {"jsonrpc": "2.0", "id": 1, "method": "users:update",
+                   "params": {"rows": rows}}
+        response = {"jsonrpc": "2.0", "id": 1, "result": rows}
+        payloads.append((name, codec.dumps(request), response))
+
+    return payloads
+
+
+def bench(func, arg, size):
+    """
+    Returns the best per-call time of func(arg) in microseconds
+    """
+    number = max(1, 20000 // (size // 100 + 1))
+    timer = timeit.Timer(lambda: func(arg))
+    return min(timer.repeat(repeat=3, number=number)) / number * 1e6
+
+
+def main():
+    """
+    Time loads and dumps for every installed backend
+    """
+    original = codec.BACKEND
+    payloads = make_payloads()
+    backends = codec.available_backends()
+
+    print("{:<10}{:<10}{:>12}".format("backend", "payload", "bytes") +
+          "".join("{:>16}".format(op) for op in ("loads us", "dumps us")))
+
+    try:
+        for backend in backends:
+            codec.set_backend(backend)
+            for name, request, response in payloads:
+                print("{:<10}{:<10}{:>12}{:>16.2f}{:>16.2f}".format(
+                    backend, name, len(request),
+                    bench(codec.loads, request, len(request)),
+                    bench(codec.dumps, response, len(request))))
+    finally:
+        codec.set_backend(original)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Compares the two ways JSONRPCProxy can forward a packet: decoded and
+encoded again, or parsed with lazy_parse and copied as bytes
+
+Run it from the repository root:
+    python benchmarks/bench_lazy.py
+
+Each way gets the packet as bytes, checks its envelope, swaps its id and
+returns it as bytes again, as the proxy does for a request on its way to
+a backend and for the response on its way back. For every payload size it
+reports the time of one forward and the peak memory it holds at once, as
+traced by tracemalloc. Lazy parsing is expected to lose on time, and on
+all but the smallest payloads to win on memory.
+
+The MIT License (MIT)
+
+Copyright (c) 2016 RPiAwesomneness
+"""
+
+import functools
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import jrpc_helper  # noqa: E402 pylint: disable=wrong-import-position
+from jrpc_helper import JSONRPCTypes, codec  # noqa: E402 pylint: disable=C0413
+
+
+def make_payloads():
+    """
+    Returns (name, request bytes, response bytes) for each payload size
+    """
+    payloads = []
+
+    for name, count in (("small", 1), ("medium", 100), ("large", 10000)):
+        rows = [{"id": index, "name": "user {}".format(index),
+                 "score": index * 1.5, "active": index % 2 == 0,
+                 "tags": ["spam", "eggs", "été"]}
+                for index in range(count)]
+        request = {"jsonrpc": "2.0", "id": 1, "method": "users:update",
+                   "params": {"rows": rows}}
+        response = {"jsonrpc": "2.0", "id": 1, "result": rows}
+        payloads.append((name, codec.dumps(request), codec.dumps(response)))
+
+    return payloads
+
+
+def forward_decoded(packet, packet_type):
+    """
+    Forward 'packet' the default way: decoded, checked and encoded again
+    """
+    data = codec.loads(packet)
+    jrpc_helper.check_packet(data, packet_type)
+    return codec.dumps(dict(data, id=2))
+
+
+def forward_lazy(packet, packet_type):
+    """
+    Forward 'packet' the lazy way: only its envelope is decoded
+    """
+    data = jrpc_helper.lazy_parse(packet)
+    data.check(packet_type)
+    return data.replace("id", 2)
+
+
+def per_call(func, size):
+    """
+    Returns the best per-call time of func() in microseconds
+    """
+    number = max(1, 20000 // (size // 100 + 1))
+    timer = timeit.Timer(func)
+    return min(timer.repeat(repeat=3, number=number)) / number * 1e6
+
+
+def peak_bytes(func):
+    """
+    Returns the peak memory, in bytes, allocated while running func() once
+    """
+    func()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        func()
+        return tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    """
+    Time both ways of forwarding and trace their peak memory
+    """
+    print("{:<10}{:<10}{:<10}{:>12}{:>12}{:>14}".format(
+        "payload", "packet", "forward", "bytes", "us", "peak bytes"))
+
+    for name, request, response in make_payloads():
+        for kind, packet, packet_type in (
+                ("request", request, JSONRPCTypes.REQUEST),
+                ("response", response, JSONRPCTypes.RESPONSE)):
+            for way, forward in (("decoded", forward_decoded),
+                                 ("lazy", forward_lazy)):
+                func = functools.partial(forward, packet, packet_type)
+                print("{:<10}{:<10}{:<10}{:>12}{:>12.2f}{:>14,}".format(
+                    name, kind, way, len(packet),
+                    per_call(func, len(packet)), peak_bytes(func)))
+
+
+if __name__ == "__main__":
+    main()
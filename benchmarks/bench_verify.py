@@ -0,0 +1,85 @@
+"""
+Per-packet cost of jrpc_helper.verify_packet and jrpc_helper.check_packet
+
+Run it from the repository root at two revisions to compare them:
+    python benchmarks/bench_verify.py
+
+Results are written to stderr, so anything the library itself writes to
+stdout can be kept or thrown away (> /dev/null) without mixing the two.
+
+The MIT License (MIT)
+
+Copyright (c) 2016 RPiAwesomneness
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import jrpc_helper  # noqa: E402 pylint: disable=wrong-import-position
+from jrpc_helper import JSONRPCTypes  # noqa: E402 pylint: disable=C0413
+
+NUMBER = 20000
+
+PACKETS = (
+    ("request, valid", JSONRPCTypes.REQUEST, {
+        "jsonrpc": "2.0",
+        "id": 13,
+        "method": "spam:eggs",
+        "params": {"foo": "bar", "towel": 42}
+    }),
+    ("request, invalid", JSONRPCTypes.REQUEST, {
+        "jsonrpc": "2.0",
+        "id": 13,
+        "method": "rpc.spam",
+        "params": "eggs"
+    }),
+    ("response, valid", JSONRPCTypes.RESPONSE, {
+        "jsonrpc": "2.0",
+        "id": 13,
+        "result": "Success! It's working!"
+    }),
+    ("error response, valid", JSONRPCTypes.RESPONSE, {
+        "jsonrpc": "2.0",
+        "id": 13,
+        "error": {"code": -32601, "message": "Method not found"}
+    }),
+    ("notification, valid", JSONRPCTypes.NOTIF, {
+        "jsonrpc": "2.0",
+        "method": "notify:queen_of_england",
+        "params": {"crown": "Has been stolen"}
+    }),
+    ("request, valid str", JSONRPCTypes.REQUEST,
+     '{"jsonrpc": "2.0", "id": 13, "method": "spam:eggs", "params": [1, 2]}'),
+)
+
+
+def bench(func, packet, j_type):
+    """
+    Returns the best per-call time of func(packet, j_type) in nanoseconds
+    """
+    timer = timeit.Timer(lambda: func(packet, j_type))
+    return min(timer.repeat(repeat=3, number=NUMBER)) / NUMBER * 1e9
+
+
+def main():
+    """
+    Run every packet through each validation function available
+    """
+    funcs = [("verify_packet", jrpc_helper.verify_packet)]
+    if hasattr(jrpc_helper, "check_packet"):
+        funcs.append(("check_packet", jrpc_helper.check_packet))
+
+    sys.stderr.write("{:<24}".format("packet") + "".join(
+        "{:>16}".format(name + " ns") for name, _ in funcs) + "\n")
+
+    for name, j_type, packet in PACKETS:
+        timings = [bench(func, packet, j_type) for _, func in funcs]
+        sys.stderr.write("{:<24}".format(name) + "".join(
+            "{:>16.0f}".format(timing) for timing in timings) + "\n")
+
+
+if __name__ == "__main__":
+    main()
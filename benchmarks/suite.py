@@ -0,0 +1,255 @@
+"""
+Reference benchmarks for the hot paths of jrpc_helper: validation, JSON
+and MessagePack decoding, packet building and predefined errors, each on
+small, medium and large payloads
+
+Run it from the repository root:
+    python benchmarks/suite.py --output results.json
+
+and at a later revision, compare against those results:
+    python benchmarks/suite.py --baseline results.json --threshold 10
+
+For every benchmark it reports operations per second and the memory
+blocks one operation allocates and leaves in use, its return value kept,
+as counted by sys.getallocatedblocks(). Blocks it frees again before it
+returns aren't counted. The table goes to stderr, the results are
+written as JSON to --output. With --baseline the exit status is 1 if any
+benchmark got slower by more than --threshold percent, so it can gate a
+release.
+
+The MIT License (MIT)
+
+Copyright (c) 2016 RPiAwesomneness
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+import jrpc_helper  # noqa: E402 pylint: disable=wrong-import-position
+from jrpc_helper import (  # noqa: E402 pylint: disable=C0413
+    JSONRPCTypes, JSONRPCValidation, codec)
+from jrpc_helper.binary import (  # noqa: E402 pylint: disable=C0413
+    packb, unpackb)
+
+SIZES = (("small", 1), ("medium", 100), ("large", 10000))
+
+# Seconds each timing run should last, and how many runs to take the best of
+TARGET_TIME = 0.2
+REPEAT = 3
+
+# Calls to average the allocations of each benchmark over
+ALLOC_CALLS = 20
+
+
+def make_rows(count):
+    """
+    Returns 'count' rows of a realistic mix of JSON values
+    """
+    return [{"id": index, "name": "user {}".format(index),
+             "score": index * 1.5, "active": index % 2 == 0,
+             "tags": ["spam", "eggs", "été"]}
+            for index in range(count)]
+
+
+def make_cases(size, count):
+    """
+    Returns a list of (name, callable) for one payload size
+    """
+    rows = make_rows(count)
+    request = {"jsonrpc": "2.0", "id": 13, "method": "users:update",
+               "params": {"rows": rows}}
+    notif = {"jsonrpc": "2.0", "method": "users:updated",
+             "params": {"rows": rows}}
+    response = {"jsonrpc": "2.0", "id": 13, "result": rows}
+    error = {"jsonrpc": "2.0", "code": 4200, "message": "Towel not found",
+             "data": {"rows": rows}}
+    error_response = {"jsonrpc": "2.0", "id": 13,
+                      "error": {"code": 4200, "message": "Towel not found",
+                                "data": {"rows": rows}}}
+    request_bytes = codec.dumps(request)
+    request_str = request_bytes.decode("utf-8")
+    request_msgpack = packb(request)
+    verify = jrpc_helper.verify_packet
+    check_json = jrpc_helper._check_valid_json  # pylint: disable=W0212
+    template = jrpc_helper.ResponseTemplate.result(rows)
+
+    cases = [
+        ("verify_packet[request]", lambda: verify(request,
+                                                  JSONRPCTypes.REQUEST)),
+        ("verify_packet[request,fast]", lambda: verify(
+            request, JSONRPCTypes.REQUEST, JSONRPCValidation.FAST)),
+        ("verify_packet[notif]", lambda: verify(notif, JSONRPCTypes.NOTIF)),
+        ("verify_packet[response]", lambda: verify(response,
+                                                   JSONRPCTypes.RESPONSE)),
+        ("verify_packet[response,error]", lambda: verify(
+            error_response, JSONRPCTypes.RESPONSE)),
+        ("verify_packet[error]", lambda: verify(error, JSONRPCTypes.ERROR)),
+        ("_check_valid_json[str]", lambda: check_json(request_str)),
+        ("_check_valid_json[bytes]", lambda: check_json(request_bytes)),
+        ("_check_valid_json[dict]", lambda: check_json(request)),
+        ("lazy_parse[request]", lambda: jrpc_helper.lazy_parse(
+            request_bytes).check(JSONRPCTypes.REQUEST)),
+        ("binary.packb[response]", lambda: packb(response)),
+        ("binary.unpackb[request]", lambda: unpackb(request_msgpack)),
+        ("JSONRPCRequest", lambda: jrpc_helper.JSONRPCRequest(
+            "users:update", params={"rows": rows},
+            response_id=13).return_packet()),
+        ("JSONRPCResult", lambda: jrpc_helper.JSONRPCResult(
+            rows, response_id=13).return_packet()),
+        ("ResponseTemplate.render", lambda: template.render(13)),
+        ("JSONRPCError", lambda: jrpc_helper.JSONRPCError(
+            4200, "Towel not found", data={"rows": rows},
+            response_id=13).return_packet()),
+    ]
+
+    if size == "small":
+        # Predefined errors carry no payload, one size covers them
+        cases.append(("generate_error_packet", lambda:
+                      jrpc_helper.generate_error_packet(-32601, 13)))
+
+    return [("{}/{}".format(name, size), func) for name, func in cases]
+
+
+def ops_per_sec(func):
+    """
+    Returns the best operations per second of func() over REPEAT runs
+    """
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * TARGET_TIME / max(elapsed, 1e-9)))
+    best = min(timer.repeat(repeat=REPEAT, number=number))
+    return number / best
+
+
+def allocations(func):
+    """
+    Returns the memory blocks one func() call allocates and leaves in use,
+        averaged over ALLOC_CALLS calls whose return values are all kept
+        and rounded, which also rounds away the block or two the
+        measuring itself takes
+    Blocks it frees again before it returns aren't counted
+    """
+    func()
+    kept = [None] * ALLOC_CALLS
+    indexes = iter(range(ALLOC_CALLS))
+    gc.disable()
+    try:
+        before = sys.getallocatedblocks()
+        for index in indexes:
+            kept[index] = func()
+        return round((sys.getallocatedblocks() - before) / ALLOC_CALLS)
+    finally:
+        gc.enable()
+
+
+def run(match=None):
+    """
+    Run every benchmark whose name contains 'match' (all if it's None)
+    Returns dict of name to {"ops_per_sec": float, "allocs_per_op": int}
+    """
+    results = {}
+
+    for size, count in SIZES:
+        for name, func in make_cases(size, count):
+            if match is not None and match not in name:
+                continue
+            results[name] = {"ops_per_sec": ops_per_sec(func),
+                             "allocs_per_op": allocations(func)}
+            write_row(name, results[name])
+
+    return results
+
+
+def write_row(name, result, baseline=None):
+    """
+    Write one line of the results table to stderr
+    """
+    line = "{:<36}{:>14,.0f}{:>14,}".format(
+        name, result["ops_per_sec"], result["allocs_per_op"])
+    if baseline is not None:
+        line += "{:>+10.1f}%".format(change(result, baseline))
+    sys.stderr.write(line + "\n")
+
+
+def change(result, baseline):
+    """
+    Returns how much faster 'result' is than 'baseline', in percent
+    """
+    return (result["ops_per_sec"] / baseline["ops_per_sec"] - 1) * 100
+
+
+def compare(results, baseline, threshold):
+    """
+    Write the change of every benchmark in both 'results' and 'baseline'
+    Returns the names of those that got slower by more than 'threshold'
+        percent
+    """
+    slower = []
+
+    sys.stderr.write("\n{:<36}{:>14}{:>14}{:>11}\n".format(
+        "compared to baseline", "ops/sec", "allocs/op", "change"))
+
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        write_row(name, result, baseline[name])
+        if change(result, baseline[name]) < -threshold:
+            slower.append(name)
+
+    return slower
+
+
+def main(argv=None):
+    """
+    Parse the command line, run the benchmarks and write or compare results
+    """
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--output", help="write the results as JSON here")
+    parser.add_argument("--baseline", help="compare against these results")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="percent slower than the baseline that fails"
+                        " (default 10)")
+    parser.add_argument("--match", help="only run benchmarks whose name"
+                        " contains this")
+    args = parser.parse_args(argv)
+
+    sys.stderr.write("{:<36}{:>14}{:>14}\n".format("benchmark", "ops/sec",
+                                                   "allocs/op"))
+    results = run(args.match)
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "backend": codec.BACKEND,
+        "results": results
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline:
+            slower = compare(results, json.load(baseline)["results"],
+                             args.threshold)
+        if slower:
+            sys.stderr.write("\nSlower than the baseline by more than"
+                             " {}%: {}\n".format(args.threshold,
+                                                 ", ".join(slower)))
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
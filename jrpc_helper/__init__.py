@@ -27,10 +27,10 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-import json
-from json import JSONDecodeError
 import enum
 
+from . import codec
+
 
 JSON_RPC_PREDEFINED_ERRORS = {
     "-32700": "Parse error",
@@ -49,6 +49,109 @@ class JSONRPCTypes(enum.IntEnum):
     ERROR = 1
     NOTIF = 2
     RESPONSE = 3
+    BATCH = 4       # Only reported by classify_and_verify, see verify_batch
+
+
+class JSONRPCVerifyCodes(enum.IntEnum):
+    """
+    Enum-type class of the result codes returned by check_packet
+    OK is 0 so any failure is truthy, just like a process exit status
+    """
+    OK = 0
+    UNKNOWN_TYPE = 1
+    UNSUPPORTED_DATA = 2
+    INVALID_JSON = 3
+    NOT_AN_OBJECT = 4
+    MISSING_JSONRPC = 5
+    BAD_JSONRPC_VERSION = 6
+    MISSING_ID = 7
+    ID_NOT_ALLOWED = 8
+    BAD_ID_TYPE = 9
+    MISSING_METHOD = 10
+    BAD_METHOD_TYPE = 11
+    RESERVED_METHOD = 12
+    BAD_PARAMS_TYPE = 13
+    MISSING_RESULT_OR_ERROR = 14
+    RESULT_AND_ERROR = 15
+    BAD_ERROR_TYPE = 16
+    MISSING_ERROR_CODE = 17
+    MISSING_ERROR_MESSAGE = 18
+    BAD_ERROR_CODE_TYPE = 19
+    PREDEFINED_MESSAGE_MISMATCH = 20
+    RESERVED_ERROR_CODE = 21
+
+
+class JSONRPCValidation(enum.IntEnum):
+    """
+    Enum-type class of how thoroughly packets are validated
+        STRICT: every rule of the spec, with the full error messages
+        FAST:   structure only, the keys each packet type needs are present
+                    and have a usable shape, but values aren't checked
+        TRUST:  nothing at all, for packets from a trusted source
+    """
+    STRICT = 0
+    FAST = 1
+    TRUST = 2
+
+
+# Looking members up on an enum class is several times slower than a plain
+#   global lookup, so the hot path uses these instead
+_VERIFY_OK = JSONRPCVerifyCodes.OK
+_J_TYPES = frozenset((JSONRPCTypes.REQUEST, JSONRPCTypes.ERROR,
+                      JSONRPCTypes.NOTIF, JSONRPCTypes.RESPONSE))
+_STRICT = JSONRPCValidation.STRICT
+_FAST = JSONRPCValidation.FAST
+_TRUST = JSONRPCValidation.TRUST
+
+# The validation level used when a call doesn't give one, see
+#   set_validation
+_VALIDATION = _STRICT
+
+
+def _validation_level(level):
+    """
+    Returns the JSONRPCValidation value of 'level', which may also be the
+        member's name in any case, or the global level if it's None
+    Raises JSONRPCException for anything else
+    """
+    if level is None:
+        return _VALIDATION
+    if isinstance(level, JSONRPCValidation):
+        return level
+    if isinstance(level, str) and \
+            level.upper() in JSONRPCValidation.__members__:
+        return JSONRPCValidation[level.upper()]
+
+    raise JSONRPCException("Unexpected validation level '{}'. Must be one of"
+                           " {}".format(level, ", ".join(
+                               name.lower() for name in
+                               JSONRPCValidation.__members__)))
+
+
+def set_validation(level):
+    """
+    Set the validation level used by every call that doesn't give its own
+    Arguments:
+        'level':    REQUIRED, a JSONRPCValidation value or its name, such as
+                        "fast"
+    Returns the previous level, so it can be put back
+    Example:
+        # An internal service that only talks to trusted peers
+        jrpc_helper.set_validation("trust")
+    """
+    global _VALIDATION  # pylint: disable=global-statement
+
+    previous = _VALIDATION
+    _VALIDATION = _validation_level(level)
+
+    return previous
+
+
+def get_validation():
+    """
+    Returns the JSONRPCValidation value used by calls that don't give one
+    """
+    return _VALIDATION
 
 
 def _verify_error_contents(packet):
@@ -59,13 +162,7 @@ def _verify_error_contents(packet):
         - Returns True, None if passes verification
     """
     errors = []
-    j_rpc_predefined = {
-        "-32700": "Parse error",
-        "-32600": "Invalid Request",
-        "-32601": "Method not found",
-        "-32602": "Invalid params",
-        "-32603": "Internal error"
-    }
+    j_rpc_predefined = JSON_RPC_PREDEFINED_ERRORS
 
     for key in ("code", "message"):
         if key not in packet:
@@ -86,7 +183,7 @@ def _verify_error_contents(packet):
                                                           packet["message"]))
         else:
             # It's not in the predefined values dict, but it's reserved
-            if packet["code"] in range(-32768, -32000):
+            if packet["code"] in range(-32768, -31999):
                 errors.append("Key 'code' value '{}' is a JSON-RPC reserved"
                               " code and MAY NOT be used for a response"
                               " code.".format(packet["code"]))
@@ -121,10 +218,13 @@ def _verify_response_contents(packet):
                           " packet. Either 'error' or 'result' may exist in a"
                           " packet, NOT both.")
 
-        success, ret_errs = _verify_error_contents(packet["error"])
+        if isinstance(packet["error"], dict):
+            success, ret_errs = _verify_error_contents(packet["error"])
 
-        if not success:
-            errors.extend(ret_errs)
+            if not success:
+                errors.extend(ret_errs)
+        else:
+            errors.append("Key 'error' is not required type dict")
 
     elif "result" not in packet and "error" not in packet:
         errors.append("Missing one of either required keys 'result'"
@@ -165,7 +265,7 @@ def _verify_notif_contents(packet):
 
         # If it exists, "params" must be list or dict
         if packet.get("params", None) is not None and \
-           not isinstance(packet, (dict, list)):
+           not isinstance(packet["params"], (dict, list)):
             errors.append("Key 'params' is not required structured type "
                           "(list/dict)")
 
@@ -226,53 +326,331 @@ def _verify_request_contents(packet):
         return True, None
 
 
+# The _check_*_contents functions mirror the _verify_*_contents functions
+#   above, but stop at the first failure and return a JSONRPCVerifyCodes
+#   value instead of building a list of messages. They are what the hot path
+#   runs, the _verify_* functions are only called to explain a failure.
+
+def _check_error_contents(packet):
+    """
+    Check the contents of an error object
+        - Returns the JSONRPCVerifyCodes value of the first failure
+                            OR
+        - Returns JSONRPCVerifyCodes.OK if passes verification
+    """
+    if "code" not in packet:
+        return JSONRPCVerifyCodes.MISSING_ERROR_CODE
+    if "message" not in packet:
+        return JSONRPCVerifyCodes.MISSING_ERROR_MESSAGE
+
+    code = packet["code"]
+    if not isinstance(code, int):
+        return JSONRPCVerifyCodes.BAD_ERROR_CODE_TYPE
+
+    if -32768 <= code <= -32000:
+        message = JSON_RPC_PREDEFINED_ERRORS.get(str(code))
+        if message is None:
+            return JSONRPCVerifyCodes.RESERVED_ERROR_CODE
+        if packet["message"] != message:
+            return JSONRPCVerifyCodes.PREDEFINED_MESSAGE_MISMATCH
+
+    return _VERIFY_OK
+
+
+def _check_response_contents(packet):
+    """
+    Check the contents of a result packet
+        - Returns the JSONRPCVerifyCodes value of the first failure
+                            OR
+        - Returns JSONRPCVerifyCodes.OK if passes verification
+    """
+    if "id" not in packet:
+        return JSONRPCVerifyCodes.MISSING_ID
+
+    if "error" in packet:
+        if "result" in packet:
+            return JSONRPCVerifyCodes.RESULT_AND_ERROR
+        if not isinstance(packet["error"], dict):
+            return JSONRPCVerifyCodes.BAD_ERROR_TYPE
+        return _check_error_contents(packet["error"])
+
+    if "result" not in packet:
+        return JSONRPCVerifyCodes.MISSING_RESULT_OR_ERROR
+
+    return _VERIFY_OK
+
+
+def _check_notif_contents(packet):
+    """
+    Check the contents of a notification packet
+        - Returns the JSONRPCVerifyCodes value of the first failure
+                            OR
+        - Returns JSONRPCVerifyCodes.OK if passes verification
+    """
+    if "id" in packet:
+        return JSONRPCVerifyCodes.ID_NOT_ALLOWED
+    if "method" not in packet:
+        return JSONRPCVerifyCodes.MISSING_METHOD
+    if not isinstance(packet["method"], str):
+        return JSONRPCVerifyCodes.BAD_METHOD_TYPE
+
+    params = packet.get("params", None)
+    if params is not None and not isinstance(params, (dict, list)):
+        return JSONRPCVerifyCodes.BAD_PARAMS_TYPE
+
+    return _VERIFY_OK
+
+
+def _check_request_contents(packet):
+    """
+    Check the contents of a request packet
+        - Returns the JSONRPCVerifyCodes value of the first failure
+                            OR
+        - Returns JSONRPCVerifyCodes.OK if passes verification
+    """
+    if "method" not in packet:
+        return JSONRPCVerifyCodes.MISSING_METHOD
+    if "id" not in packet:
+        return JSONRPCVerifyCodes.MISSING_ID
+
+    method = packet["method"]
+    if not isinstance(method, str):
+        return JSONRPCVerifyCodes.BAD_METHOD_TYPE
+    if not isinstance(packet["id"], (str, int, type(None))):
+        return JSONRPCVerifyCodes.BAD_ID_TYPE
+
+    params = packet.get("params", None)
+    if params is not None and not isinstance(params, (dict, list)):
+        return JSONRPCVerifyCodes.BAD_PARAMS_TYPE
+
+    if method.startswith("rpc."):
+        return JSONRPCVerifyCodes.RESERVED_METHOD
+
+    return _VERIFY_OK
+
+
+# The _structure_*_contents functions are the checks of the FAST validation
+#   level. They only look at which keys are present and the shape the rest
+#   of the module relies on, never at the values themselves
+
+def _structure_error_contents(packet):
+    """
+    Check that an error object has a code and a message
+    """
+    if "code" not in packet:
+        return JSONRPCVerifyCodes.MISSING_ERROR_CODE
+    if "message" not in packet:
+        return JSONRPCVerifyCodes.MISSING_ERROR_MESSAGE
+
+    return _VERIFY_OK
+
+
+def _structure_response_contents(packet):
+    """
+    Check that a response has an id and exactly one of result or error
+    """
+    if "id" not in packet:
+        return JSONRPCVerifyCodes.MISSING_ID
+
+    if "error" in packet:
+        if "result" in packet:
+            return JSONRPCVerifyCodes.RESULT_AND_ERROR
+        if not isinstance(packet["error"], dict):
+            return JSONRPCVerifyCodes.BAD_ERROR_TYPE
+        return _structure_error_contents(packet["error"])
+
+    if "result" not in packet:
+        return JSONRPCVerifyCodes.MISSING_RESULT_OR_ERROR
+
+    return _VERIFY_OK
+
+
+# What 'params' may be, missing or null included
+_PARAMS_TYPES = (dict, list, type(None))
+
+
+def _structure_notif_contents(packet):
+    """
+    Check that a notification has a str method and no id
+    """
+    if "id" in packet:
+        return JSONRPCVerifyCodes.ID_NOT_ALLOWED
+    if not isinstance(packet.get("method"), str):
+        return JSONRPCVerifyCodes.MISSING_METHOD
+    if not isinstance(packet.get("params"), _PARAMS_TYPES):
+        return JSONRPCVerifyCodes.BAD_PARAMS_TYPE
+
+    return _VERIFY_OK
+
+
+def _structure_request_contents(packet):
+    """
+    Check that a request has a str method and an id a response can echo
+    """
+    if not isinstance(packet.get("method"), str):
+        return JSONRPCVerifyCodes.MISSING_METHOD
+    if "id" not in packet:
+        return JSONRPCVerifyCodes.MISSING_ID
+    if not isinstance(packet["id"], (str, int, type(None))):
+        return JSONRPCVerifyCodes.BAD_ID_TYPE
+    if not isinstance(packet.get("params"), _PARAMS_TYPES):
+        return JSONRPCVerifyCodes.BAD_PARAMS_TYPE
+
+    return _VERIFY_OK
+
+
+_STRUCTURE_CHECKS = {
+    JSONRPCTypes.ERROR: _structure_error_contents,
+    JSONRPCTypes.RESPONSE: _structure_response_contents,
+    JSONRPCTypes.NOTIF: _structure_notif_contents,
+    JSONRPCTypes.REQUEST: _structure_request_contents
+}
+
+_CONTENT_CHECKS = {
+    JSONRPCTypes.ERROR: _check_error_contents,
+    JSONRPCTypes.RESPONSE: _check_response_contents,
+    JSONRPCTypes.NOTIF: _check_notif_contents,
+    JSONRPCTypes.REQUEST: _check_request_contents
+}
+
+_CONTENT_VERIFIES = {
+    JSONRPCTypes.ERROR: _verify_error_contents,
+    JSONRPCTypes.RESPONSE: _verify_response_contents,
+    JSONRPCTypes.NOTIF: _verify_notif_contents,
+    JSONRPCTypes.REQUEST: _verify_request_contents
+}
+
+
 def _check_valid_json(packet):
     """
-    Checks if data is a string or a dictionary and then returns:
+    Checks if data is a string, a bytes-like object (bytes, bytearray or
+    memoryview), a dictionary or a list (batch) and then returns:
         - True and the JSON in dict form if it's valid JSON (True, dict)
                                 OR
         - False and a traceback object if it's invalid JSON (False, traceback)
     """
-    if isinstance(packet, str):
-        # Attempt to decode the string into a dictionary
+    if isinstance(packet, (dict, list)):
+        # Already in dictionary (or batch array) form
+        data = packet
+        return True, data
+
+    elif isinstance(packet, (str, bytes, bytearray, memoryview)):
+        # Attempt to decode the string into a dictionary, the codec decodes
+        #   UTF-8 bytes itself, there's no need for a str copy first.
+        #   A memoryview can be a slice of a larger receive buffer, which is
+        #   decoded in place
+        if isinstance(packet, memoryview) and (packet.itemsize != 1 or
+                                               not packet.c_contiguous):
+            # Strided or not a view of bytes, the rare case that is copied
+            packet = memoryview(packet.tobytes())
+
         try:
-            data = json.loads(packet)
-        except JSONDecodeError as exception:
+            data = codec.loads(packet)
+        except codec.DECODE_ERRORS as exception:
             # It's not valid JSON
             return False, exception
 
         # Made it past the try/except, that means it's valid JSON
         return True, data
 
-    elif isinstance(packet, dict):
-        # Already in dictionary form
-        data = packet
-        return True, data
-
-    elif isinstance(packet, bytes):
-        # In bytes form, let's convert to utf-8 str
-        decoded = packet.decode('utf-8')
-
-        # SO MUCH META O_O
-        # Dude, it's just a recursive call
-        # SHUT UP. BEING SUPER META IS WAY COOLER
-
-        # Recursively called with decoded string, will return success/fail
-        return _check_valid_json(decoded)
-
     else:
         # It's something else, so fail since we can't check it
         return False, JSONRPCException("Unable to validate data of "
                                        "type {}".format(type(packet)))
 
 
-def verify_packet(packet, j_type):
+def _check_data(data, content_check):
+    """
+    Check already decoded data against the common envelope rules and then
+    'content_check', returns a JSONRPCVerifyCodes value
+    """
+    if not isinstance(data, dict):
+        return JSONRPCVerifyCodes.NOT_AN_OBJECT
+
+    if "jsonrpc" not in data:
+        return JSONRPCVerifyCodes.MISSING_JSONRPC
+    elif data["jsonrpc"] != "2.0":
+        return JSONRPCVerifyCodes.BAD_JSONRPC_VERSION
+
+    return content_check(data)
+
+
+def _explain_data(data, j_type):
+    """
+    Build the list of human-readable errors for decoded data that failed
+    _check_data. Only ever called on the failure path
+    """
+    if not isinstance(data, dict):
+        return ["Packet is not a JSON object, got type {}".format(type(data))]
+
+    # Errors to return to the user
+    errors = []
+
+    # Check for 'jsonrpc': '2.0' required key/value pair
+    if "jsonrpc" not in data:
+        # Required key 'jsonrpc' doesn't exist, so fail
+        errors.append("Missing required key 'jsonrpc'")
+    elif data["jsonrpc"] != "2.0":
+        # 'jsonrpc' key DOES exist, but doesn't have correct value
+        errors.append("'jsonrpc' key has incorrect value {}".format(
+            data["jsonrpc"])
+                     )
+
+    success, content_errors = _CONTENT_VERIFIES[j_type](data)
+
+    if not success:
+        errors.extend(content_errors)
+
+    return errors
+
+
+def check_packet(packet, j_type, level=None):
+    """
+    Quietly checks whether or not 'packet' is a JSON-RPC compliant packet
+    Takes the same arguments as verify_packet, but does no I/O and builds no
+    error messages, so it is the one to use on a hot path
+
+    Returns JSONRPCVerifyCodes.OK (0) if the packet passes, otherwise the
+        JSONRPCVerifyCodes value of the first failure found
+    Example:
+        if jrpc_helper.check_packet(foo, JSONRPCTypes.RESPONSE):
+            # Something's wrong, now it's worth building the messages
+            success, errors = jrpc_helper.verify_packet(
+                foo, JSONRPCTypes.RESPONSE)
+    """
+    level = _VALIDATION if level is None else _validation_level(level)
+
+    if level is _TRUST:
+        return _VERIFY_OK
+
+    if j_type not in _J_TYPES:
+        return JSONRPCVerifyCodes.UNKNOWN_TYPE
+
+    success, data = _check_valid_json(packet)
+
+    if not success:
+        if isinstance(data, JSONRPCException):
+            return JSONRPCVerifyCodes.UNSUPPORTED_DATA
+        return JSONRPCVerifyCodes.INVALID_JSON
+
+    if level is _FAST:
+        return _check_data(data, _STRUCTURE_CHECKS[j_type])
+
+    return _check_data(data, _CONTENT_CHECKS[j_type])
+
+
+def verify_packet(packet, j_type, level=None):
     """
     Verifies whether or not 'packet' is a JSON-RPC compliant packet
     Arguments:
-        'packet':   REQUIRED - JSON-encoded str or dict to be verified
+        'packet':   REQUIRED - dict, or JSON-encoded str, bytes, bytearray or
+                        memoryview to be verified
         'j_type':   REQUIRED - "error" or "response", tells function what
                         type of JSON-RPC packet to verify 'packet' against
+        'level':    OPTIONAL - JSONRPCValidation value or name, default the
+                        global level, see set_validation. With TRUST the
+                        packet isn't even decoded. A packet that fails FAST
+                        gets the same messages as with STRICT
     Example:
         foo = {
             "jsonrpc": "2.0",
@@ -281,12 +659,14 @@ def verify_packet(packet, j_type):
         }
         json_rpc.verify_packet(foo, JSONRPCTypes.RESPONSE)   # Will return True
     """
+    level = _VALIDATION if level is None else _validation_level(level)
+
+    if level is _TRUST:
+        return True, None
+
     # Check initially, if it's not a string, there's not point in continuing
     #   any further, save time/CPU cycles
-    if j_type not in (JSONRPCTypes.ERROR,
-                      JSONRPCTypes.NOTIF,
-                      JSONRPCTypes.RESPONSE,
-                      JSONRPCTypes.REQUEST):
+    if j_type not in _J_TYPES:
         return False, JSONRPCException("Incorrect type {}. Expected "
                                        "JSONRPCTypes object".format(j_type))
 
@@ -296,58 +676,469 @@ def verify_packet(packet, j_type):
         # It's either not a string or not a dict, so we can't work with it
         return False, data
 
-    # Errors to return to the user
-    errors = []
+    checks = _STRUCTURE_CHECKS if level is _FAST else _CONTENT_CHECKS
 
-    # Check for 'jsonrpc': '2.0' required key/value pair
-    if "jsonrpc" not in data:
-        # Required key 'jsonrpc' doesn't exist, so fail
-        errors.append("Missing required key 'jsonrpc'")
-    elif data["jsonrpc"] != "2.0":
-        # 'jsonrpc' key DOES exist, but doesn't have correct value
-        errors.append("'jsonrpc' key has incorrect value {}".format(
-            data["jsonrpc"])
-                     )
+    if _check_data(data, checks[j_type]) is _VERIFY_OK:
+        # Success! Packet is JSON-RPC compliant
+        return True, None
+
+    # Packet failed validation somewhere, only now is it worth building the
+    #   list of failures to return
+    return False, _explain_data(data, j_type)
+
+
+def _classify(data):
+    """
+    Tell the JSONRPCTypes value of decoded 'data' from the keys present
+    Returns the type and the content check to run, or None, None
+    """
+    if "method" in data:
+        if "id" in data:
+            return JSONRPCTypes.REQUEST, _check_request_contents
+        return JSONRPCTypes.NOTIF, _check_notif_contents
+    elif "error" in data:
+        return JSONRPCTypes.ERROR, _check_response_contents
+    elif "result" in data:
+        return JSONRPCTypes.RESPONSE, _check_response_contents
+
+    return None, None
+
+
+def _classify_and_check(data):
+    """
+    Classify and check a single decoded packet
+    Returns j_type, None if it passes, otherwise j_type, list of errors
+    """
+    if not isinstance(data, dict):
+        return None, _explain_data(data, None)
+
+    j_type, content_check = _classify(data)
+
+    if j_type is None:
+        return None, ["Unable to tell the packet type, one of the keys"
+                      " 'method', 'result' or 'error' MUST exist"]
+
+    if _check_data(data, content_check) is _VERIFY_OK:
+        return j_type, None
+
+    return j_type, _explain_data(
+        data,
+        JSONRPCTypes.RESPONSE if j_type == JSONRPCTypes.ERROR else j_type)
 
-    if j_type == JSONRPCTypes.ERROR:
-        print("Type:\t ERROR")
-        # Begin checking if it's a correct error packet
-        success, data = _verify_error_contents(data)
-    elif j_type == JSONRPCTypes.RESPONSE:
-        print("Type:\t RESPONSE")
-        # Begin checking if it's a correct response packet
-        success, data = _verify_response_contents(data)
-    elif j_type == JSONRPCTypes.NOTIF:
-        print("Type:\t NOTIF")
-        # Begin checking if it's a correct notification packet
-        success, data = _verify_notif_contents(data)
-    elif j_type == JSONRPCTypes.REQUEST:
-        print("Type:\t REQUEST")
-        # Begin checking if it's a correct notification packet
-        success, data = _verify_request_contents(data)
-    else:
-        # It's not "error" or "result", so return error
-        return False, "type {} is unknown: it must be either error, result, " \
-            "or notification"
+
+def classify_and_verify(packet):
+    """
+    Works out what type of JSON-RPC packet 'packet' is and verifies it as
+    that type, so a packet of unknown type is only ever checked once
+    Arguments:
+        'packet':   REQUIRED - dict, list, or JSON-encoded str, bytes,
+                        bytearray or memoryview to be verified
+    Returns j_type, data, errors:
+        'j_type':   JSONRPCTypes.REQUEST or NOTIF for packets with a
+                        'method' key (telling them apart by 'id'),
+                        JSONRPCTypes.ERROR for a response with an 'error'
+                        key and JSONRPCTypes.RESPONSE for one with a
+                        'result' key. Error responses are verified with the
+                        same rules as verify_packet uses for RESPONSE.
+                        JSONRPCTypes.BATCH for a batch array, each element
+                        of which is classified and verified on its own.
+                        None if the type couldn't be told
+        'data':     The decoded packet, or None if it couldn't be decoded
+        'errors':   None if the packet passes, otherwise a list of errors
+                        (or the exception if it couldn't be decoded).
+                        For a batch, one entry per element, None for the
+                        elements that pass
+    Example:
+        j_type, data, errors = jrpc_helper.classify_and_verify(
+            '{"jsonrpc": "2.0", "id": 1, "result": 19}')
+        # JSONRPCTypes.RESPONSE, {...}, None
+    """
+    success, data = _check_valid_json(packet)
 
     if not success:
-        errors.extend(data)
+        return None, None, data
 
-    if len(errors) > 0:
-        # Packet failed validation somewhere, return False and a list of
-        #   failures
-        return False, errors
-    else:
-        # Success! Packet is JSON-RPC compliant
-        return True, None
+    if isinstance(data, list):
+        if not data:
+            return JSONRPCTypes.BATCH, data, [
+                "Batch array MUST contain at least one value"]
+
+        errors = None
+        for index, element in enumerate(data):
+            element_errors = _classify_and_check(element)[1]
+            if element_errors is not None:
+                if errors is None:
+                    errors = [None] * len(data)
+                errors[index] = element_errors
+
+        return JSONRPCTypes.BATCH, data, errors
+
+    j_type, errors = _classify_and_check(data)
+
+    return j_type, data, errors
+
+
+def verify_batch(packet, j_type=JSONRPCTypes.REQUEST):
+    """
+    Verifies whether or not 'packet' is a JSON-RPC compliant batch array
+    Arguments:
+        'packet':   REQUIRED - JSON-encoded str, bytes or list to be verified
+        'j_type':   OPTIONAL - JSONRPCTypes.REQUEST (the default) checks a
+                        batch sent by a client, where each element is
+                        verified as a request if it has an 'id' key and as
+                        a notification if it doesn't.
+                        JSONRPCTypes.RESPONSE checks a batch sent back by a
+                        server
+    Returns:
+        - True, list of (True, None) if every element passes
+                            OR
+        - False, list of (success, errors) with one tuple per element, in
+            the same order as the batch, errors being what verify_packet
+            would have returned for that element
+                            OR
+        - False, errors if 'packet' isn't a non-empty JSON array at all
+    Example:
+        foo = [
+            {"jsonrpc": "2.0", "id": 1, "method": "spam"},
+            {"jsonrpc": "2.0", "method": "eggs"}
+        ]
+        jrpc_helper.verify_batch(foo)   # Will return True, [...]
+    """
+    if j_type not in (JSONRPCTypes.REQUEST, JSONRPCTypes.RESPONSE):
+        return False, JSONRPCException("Incorrect type {}. Expected "
+                                       "JSONRPCTypes.REQUEST or "
+                                       "JSONRPCTypes.RESPONSE".format(j_type))
+
+    success, data = _check_valid_json(packet)
+
+    if not success:
+        return False, data
+
+    if not isinstance(data, list):
+        return False, ["Batch is not a JSON array, got type {}".format(
+            type(data))]
+
+    if not data:
+        # An empty array is explicitly an invalid request in the spec
+        return False, ["Batch array MUST contain at least one value"]
+
+    # Hoisted out of the loop, every element is checked in this one pass
+    check_data = _check_data
+    request_check = _CONTENT_CHECKS[j_type]
+    notif_check = _CONTENT_CHECKS[JSONRPCTypes.NOTIF]
+    is_request = j_type == JSONRPCTypes.REQUEST
+    all_passed = True
+    results = []
+
+    for element in data:
+        element_type = j_type
+        content_check = request_check
+        if is_request and isinstance(element, dict) and "id" not in element:
+            element_type = JSONRPCTypes.NOTIF
+            content_check = notif_check
+
+        if check_data(element, content_check) is _VERIFY_OK:
+            results.append((True, None))
+        else:
+            all_passed = False
+            results.append((False, _explain_data(element, element_type)))
+
+    return all_passed, results
+
+
+def _encode_id(response_id):
+    """
+    Encode a packet 'id' to JSON bytes, for splicing into a body that was
+    serialized without one
+    """
+    if response_id is None:
+        return b"null"
+    if type(response_id) is int:  # pylint: disable=unidiomatic-typecheck
+        # Not isinstance, True must still be encoded as true
+        return b"%d" % response_id
+    return codec.dumps(response_id)
+
+
+class ResponseTemplate:
+    """
+    A response packet serialized once, without its 'id'
+
+    render() produces the packet for any 'id' by splicing the encoded id
+    between the bytes before and after it, without building the packet
+    dict or encoding the result again. For the same result or error sent
+    to many requests: broadcasts, cached results, common errors.
+
+    Create one with ResponseTemplate.result(), ResponseTemplate.error() or
+    ResponseTemplate.from_response()
+
+    Arguments:
+        'head':     REQUIRED, bytes of the packet before the id
+        'tail':     REQUIRED, bytes of the packet after the id
+
+    Example:
+        template = jrpc_helper.ResponseTemplate.result({"spam": "eggs"})
+        template.render(7)
+        # b'{"jsonrpc":"2.0","id":7,"result":{"spam":"eggs"}}'
+    """
+    __slots__ = ("head", "tail")
+
+    def __init__(self, head, tail):
+        self.head = head
+        self.tail = tail
+
+    @classmethod
+    def result(cls, result):
+        """
+        Returns the template of a result packet for 'result', any JSON value
+        Raises JSONRPCException if 'result' can't be encoded to JSON
+        """
+        try:
+            body = codec.dumps(result)
+        except codec.ENCODE_ERRORS as exception:
+            raise JSONRPCException("Unable to encode result to JSON:"
+                                   " {}".format(exception)) from exception
+
+        return cls._from_body(body)
+
+    @classmethod
+    def error(cls, code, message, data=None):
+        """
+        Returns the template of an error packet, the arguments are checked
+            as for JSONRPCError
+        Raises JSONRPCException if they're not valid
+        """
+        return cls.from_response(JSONRPCError(code, message, data=data))
+
+    @classmethod
+    def from_response(cls, response):
+        """
+        Returns the template of a JSONRPCResult or JSONRPCError object, its
+            own 'id' is ignored
+        """
+        if isinstance(response, JSONRPCResult):
+            return cls.result(response.data)
+
+        if isinstance(response, JSONRPCError):
+            error = response.packet["error"]
+            if "data" not in error:
+                # Known errors have one already
+                template = _ERROR_INDEX.get(error["code"])
+                if template is not None and \
+                        template.message == error["message"]:
+                    return template
+            return cls(b'{"jsonrpc":"2.0","error":' + codec.dumps(error) +
+                       b',"id":', b"}")
+
+        raise JSONRPCException("Unexpected data type for argument"
+                               " 'response': '{}'. Must be type {} or"
+                               " {}".format(type(response), JSONRPCResult,
+                                            JSONRPCError))
+
+    @classmethod
+    def _from_body(cls, body):
+        """
+        Returns the template of a result packet for an already encoded
+            result
+        """
+        return cls(b'{"jsonrpc":"2.0","id":', b',"result":' + body + b"}")
+
+    def render(self, response_id):
+        """
+        Returns the packet for 'response_id' as JSON bytes
+        """
+        return self.head + _encode_id(response_id) + self.tail
+
+    def render_many(self, response_ids):
+        """
+        Returns a list of the packets for each of 'response_ids', as JSON
+            bytes
+        """
+        head = self.head
+        tail = self.tail
+
+        return [head + _encode_id(response_id) + tail
+                for response_id in response_ids]
+
+    def render_batch(self, response_ids):
+        """
+        Returns a batch array of the packets for each of 'response_ids', as
+            JSON bytes, or None if there are none
+        """
+        if not response_ids:
+            return None
+
+        separator = self.tail + b"," + self.head
+
+        return b"".join((b"[", self.head, separator.join(
+            [_encode_id(response_id) for response_id in response_ids]),
+                         self.tail, b"]"))
+
+    def __len__(self):
+        return len(self.head) + len(self.tail)
+
+    def __repr__(self):
+        return "JSON-RPC ResponseTemplate: {!r}".format(
+            self.head + b"<id>" + self.tail)
+
+
+class _ErrorTemplate(ResponseTemplate):
+    """
+    The template of a known error code and message, which are kept for
+    looking it up
+    """
+    __slots__ = ("code", "message")
+
+    def __init__(self, code, message):
+        super().__init__(b'{"jsonrpc":"2.0","error":' +
+                         codec.dumps({"code": code, "message": message}) +
+                         b',"id":', b"}")
+        self.code = code
+        self.message = message
+
+
+# Every known error, indexed both by code (int) and by message in lower case
+#   (str), built at import time so finding one is a single dict lookup
+_ERROR_INDEX = {}
+
+
+def _add_error_template(code, message):
+    """
+    Add an error to _ERROR_INDEX
+    """
+    template = _ErrorTemplate(code, message)
+    _ERROR_INDEX[code] = template
+    _ERROR_INDEX[message.lower()] = template
+
+
+for _code, _message in JSON_RPC_PREDEFINED_ERRORS.items():
+    _add_error_template(int(_code), _message)
+
+
+def register_error(code, message):
+    """
+    Register an application-defined error so that generate_error,
+    generate_error_packet and generate_error_bytes can create it, by code
+    or by message, as quickly as the JSON-RPC predefined errors
+
+    Raises JSONRPCException if 'code' is in the range reserved by JSON-RPC,
+    or if 'code' or 'message' is already registered to a different error
+
+    Parameters:
+        - 'code':           REQUIRED - int error code
+        - 'message':        REQUIRED - str short description of the error
+    """
+    if not isinstance(code, int) or isinstance(code, bool):
+        raise JSONRPCException("code parameter for error MUST be"
+                               " type {}!".format(int))
+
+    if not isinstance(message, str):
+        raise JSONRPCException("message parameter for error MUST be"
+                               " type {}!".format(str))
+
+    if -32768 <= code <= -32000:
+        raise JSONRPCException("Key 'code' value '{}' is a JSON-RPC reserved"
+                               " code and MAY NOT be used for a response"
+                               " code.".format(code))
+
+    for key in (code, message.lower()):
+        template = _ERROR_INDEX.get(key)
+        if template is not None and (template.code, template.message) != \
+                (code, message):
+            raise JSONRPCException("Error '{}' is already registered as"
+                                   " code {}, message '{}'".format(
+                                       key, template.code, template.message))
+
+    _add_error_template(code, message)
+
+
+def _find_error(code):
+    """
+    Returns the _ErrorTemplate for error code (int) or message (str, any
+    case), or None if there isn't one
+    """
+    if isinstance(code, str):
+        return _ERROR_INDEX.get(code.lower())
+    elif isinstance(code, int):
+        return _ERROR_INDEX.get(code)
+
+    return None
+
+
+def generate_error(code, response_id=None, data=None):
+    """
+    Generate a JSON-RPC predefined (or registered) error object from its
+    error code
+
+    Returns None if code doesn't match any JSON-RPC predefined codes or
+    any registered with register_error
+
+    Parameters:
+        - 'code':           REQUIRED - JSON-RPC predefined error code for the
+                                        error to create
+                                        Can be code (int), or message (str)
+        - 'response_id':    ID of message you're responding to, default None
+        - 'data':           Additional info about the error, default None
+    """
+    template = _find_error(code)
+
+    if template is None:
+        return None
+
+    if data is not None or not (response_id is None or
+                                isinstance(response_id, (int, str))):
+        # Leave anything that needs checking to the constructor
+        return JSONRPCError(template.code, template.message, data=data,
+                            response_id=response_id)
+
+    # The code and message were checked when the template was made, so
+    #   skip straight to filling in the fields
+    error = JSONRPCError.__new__(JSONRPCError)
+    error.response_id = response_id
+    error.code = template.code
+    error.message = template.message
+    error.data = None
+
+    return error
+
+
+def generate_error_bytes(code, response_id=None):
+    """
+    Generate a JSON-RPC predefined (or registered) error packet from its
+    error code, serialized to JSON bytes ready to be sent
+
+    The packet is serialized once per error, this only splices in the 'id',
+    so it costs next to nothing
+
+    Returns None if code doesn't match any JSON-RPC predefined codes or
+    any registered with register_error
+
+    Parameters:
+        - 'code':           REQUIRED - JSON-RPC predefined error code for the
+                                        error to create
+                                        Can be code (int), or message (str)
+        - 'response_id':    ID of message you're responding to, default None
+    """
+    template = _find_error(code)
+
+    if template is None:
+        return None
+
+    if not (response_id is None or isinstance(response_id, (int, str))):
+        raise JSONRPCException("Unexpected data type for argument"
+                               " 'response_id': '{}'. Must be type"
+                               " {} or {}".format(type(response_id), int,
+                                                  str))
+
+    return template.render(response_id)
 
 
 def generate_error_packet(code, response_id=None):
     """
-    Generate a JSON-RPC predefined error packet from a JSON-RPC predefined
+    Generate a JSON-RPC predefined (or registered) error packet from its
     error code
 
-    Returns None if code doesn't match any JSON-RPC predefined codes
+    Returns None if code doesn't match any JSON-RPC predefined codes or
+    any registered with register_error
 
     Parameters:
         - 'code':           REQUIRED - JSON-RPC predefined error code for the
@@ -355,18 +1146,31 @@ def generate_error_packet(code, response_id=None):
                                         Can be code (int), or message (str)
         - 'response_id':    ID of message you're responding to, default None
     """
-    if isinstance(code, str):
-        for error in JSON_RPC_PREDEFINED_ERRORS:
-            if code.lower() == JSON_RPC_PREDEFINED_ERRORS[error].lower():
-                return JSONRPCError(int(error),
-                                    code,
-                                    response_id=response_id
-                                   ).packet
-    elif isinstance(code, int):
-        return JSONRPCError(code,
-                            JSON_RPC_PREDEFINED_ERRORS[str(code)],
-                            response_id=response_id
-                           ).packet
+    error = generate_error(code, response_id=response_id)
+
+    if error is not None:
+        return error.packet
+
+
+def _return_packet(packet, j_type, level):
+    """
+    Validate a packet built by one of the packet objects at 'level'
+    Returns the (success, packet, errors) tuple return_packet returns
+    """
+    level = _VALIDATION if level is None else _validation_level(level)
+
+    if level is _TRUST:
+        return True, packet, None
+
+    checks = _STRUCTURE_CHECKS if level is _FAST else _CONTENT_CHECKS
+
+    if checks[j_type](packet) is _VERIFY_OK:
+        return True, packet, None
+
+    # Only build the messages once it's known to fail
+    success, errors = _CONTENT_VERIFIES[j_type](packet)
+
+    return success, packet, None if success else errors
 
 
 class JSONRPCException(Exception):
@@ -399,11 +1203,18 @@ class JSONRPCRequest:
         'params':       OPTIONAL, must be type list or dict
         'is_notif':     OPTIONAL, tells whether or not this request packet
                             will be a notification
+
+    Every object owns its own fields, the packet dict is only built when
+    it's asked for, so objects can be created and used on any thread
     """
-    response_id = 0
-    packet = {
-        "jsonrpc": "2.0",        # Default required key/value pair for JSON-RPC
-        "id": response_id
+    __slots__ = ("response_id", "method", "params", "is_notif")
+    type = "Request"
+
+    # Packet keys that update_packet can change, and the fields they live in
+    _packet_fields = {
+        "id": "response_id",
+        "method": "method",
+        "params": "params"
     }
 
     def __init__(self, method, params=None, response_id=None, is_notif=False):
@@ -411,23 +1222,23 @@ class JSONRPCRequest:
         Create a JSON-RPC Request object
         Returns nothing on success, otherwise JSONRPCException is raised
         """
-        self.type = "Request"
-        self.response_id = None
+        self.is_notif = is_notif
 
         # Set the packet's ID correctly, or raise exception if not int/None
-        if isinstance(response_id, int):
+        if isinstance(response_id, int) and not is_notif:
             self.response_id = response_id
-            self.packet["id"] = self.response_id
-        elif response_id is None and not is_notif:
-            self.packet["id"] = self.response_id
-            # Don't include it in the packet
+        elif response_id is None:
+            self.response_id = None
         else:
             raise JSONRPCException("Unexpected data type for argument"
                                    " 'response_id': '{}'. Must be type"
-                                   " {}".format(type(response_id), int))
+                                   " {}{}".format(type(response_id), int,
+                                                  "" if not is_notif else
+                                                  " or None for a"
+                                                  " notification"))
         if isinstance(method, str):
             self.method = method
-            if not method.startswith("rpc."):
+            if method.startswith("rpc."):
                 raise JSONRPCException(
                     "'method' value '{}' starts with reserved for internal"
                     " JSON-RPC use value 'rpc.'".format(method)
@@ -454,39 +1265,51 @@ class JSONRPCRequest:
                                    " 'params': '{}'. Must be type {} or"
                                    " {}".format(type(params), list, dict))
 
-        # Made it passed the if statement successfully, let's create the packet
-        self.packet["method"] = self.method
-        self.packet["params"] = self.params
+    @property
+    def packet(self):
+        """
+        A newly built dict of the JSON-RPC packet
+        """
+        packet = {"jsonrpc": "2.0"}      # Default required key/value pair
 
-    def return_packet(self):
+        if not self.is_notif:
+            packet["id"] = self.response_id
+
+        packet["method"] = self.method
+
+        if self.params is not None:
+            packet["params"] = self.params
+
+        return packet
+
+    def return_packet(self, level=None):
         """
         Returns the generated JSON-RPC packet after validating it
+        'level' is a JSONRPCValidation value or name, default the global
+            level, see set_validation
         Returns True, packet, None if it validates,
                 otherwise False, packet, errors
         """
-        success, result = _verify_request_contents(self.packet)
-
-        to_return = (
-            True,
-            self.packet,
-            None
-            ) if success else (
-                False,
-                self.packet,
-                result
-            )
+        return _return_packet(self.packet, JSONRPCTypes.NOTIF if
+                              self.is_notif else JSONRPCTypes.REQUEST, level)
 
-        return to_return
+    def serialize(self, dumps=None):
+        """
+        Returns the packet encoded as compact UTF-8 JSON bytes, ready to be
+        sent. Unlike return_packet() it doesn't validate the packet
+        'dumps' encodes it some other way instead, such as binary.packb
+        """
+        return (dumps or codec.dumps)(self.packet)
 
     def update_packet(self, **kwargs):
         """
         Allows you to update the packet's key/data pairs via a method
         """
         for arg in kwargs:
-            if arg in self.packet:
-                self.packet[arg] = kwargs[arg]
-            elif arg in self.packet["result"]:
-                self.packet["result"][arg] = kwargs[arg]
+            if arg in self._packet_fields:
+                setattr(self, self._packet_fields[arg], kwargs[arg])
+            elif isinstance(self.params, dict) and arg in self.params:
+                self.params[arg] = kwargs[arg]
 
     def __repr__(self):
         return "JSON-RPC Request: {}".format(repr(self.method))
@@ -504,71 +1327,110 @@ class JSONRPCResult:
     Arguments:
         'response_id':  REQUIRED, otherwise it will be set to None/NULL
         'result':       Required when creating a JSON-RPC Result object
-                            MUST be type dict or str (JSON encoded)
+                            MUST be a JSON value: dict, list, str, int,
+                            float, bool or None
+        'is_json':      OPTIONAL, whether a str 'result' is JSON-encoded and
+                            should be decoded, default True. Set it to
+                            False when the result is a plain string
+        'binary':       OPTIONAL, whether a bytes 'result' is accepted,
+                            default False. Only a binary encoding such as
+                            MessagePack can send one, serialize() with
+                            JSON raises TypeError
+
+    Every object owns its own fields, the packet dict is only built when
+    it's asked for, so objects can be created and used on any thread
     """
-    response_id = 0
-    packet = {
-        "jsonrpc": "2.0",        # Default required key/value pair for JSON-RPC
-        "id": response_id
-    }
+    __slots__ = ("response_id", "data", "_template")
+    type = "Result"
 
-    def __init__(self, result, response_id=None):
+    def __init__(self, result, response_id=None, is_json=True,
+                 binary=False):
         """
         Create a JSON-RPC Result object
         Returns nothing on success, otherwise JSONRPCException is raised
         """
-        self.type = "Result"
+        # ResponseTemplate of the result already encoded, if it has been
+        self._template = None
 
-        # Set the packet's ID correctly, or raise exception if not int/None
-        if isinstance(response_id, int):
+        # Set the packet's ID correctly, or raise exception if not int/str/None
+        #   Responses echo the request's 'id', which may be any of these
+        if isinstance(response_id, (int, str)):
             self.response_id = response_id
-            self.packet["id"] = self.response_id
         elif response_id is None:
             self.response_id = None
-            self.packet["id"] = self.response_id
         else:
             raise JSONRPCException("Unexpected data type for argument"
                                    " 'response_id': '{}'. Must be type"
-                                   " {}".format(type(response_id), int))
+                                   " {} or {}".format(type(response_id), int,
+                                                      str))
 
-        if isinstance(result, dict):
+        if isinstance(result, str) and not is_json:
             self.data = result
         elif isinstance(result, str):
             try:
-                self.data = json.loads(result)
-            except JSONDecodeError:
+                self.data = codec.loads(result)
+            except codec.DECODE_ERRORS:
                 # It's not actual JSON, so just return the actual data
                 self.data = result
+        elif isinstance(result, (dict, list, int, float, type(None))):
+            # bool is a subclass of int, so it's covered too
+            self.data = result
+        elif binary and isinstance(result, bytes):
+            self.data = result
         else:
             raise JSONRPCException("Unexpected data type for result {}".format(
                 str(type(result))
             ))
 
-        # Made it past the if statement successfully, let's create the packet
-        self.packet["result"] = self.data
+    @property
+    def packet(self):
+        """
+        A newly built dict of the JSON-RPC packet
+        """
+        return {
+            "jsonrpc": "2.0",        # Default required key/value pair
+            "id": self.response_id,
+            "result": self.data
+        }
 
-    def return_packet(self):
+    def return_packet(self, level=None):
         """
         Returns the generated JSON-RPC packet after validating it
+        'level' is a JSONRPCValidation value or name, default the global
+            level, see set_validation
         Returns True, packet, None if it validates,
                 otherwise False, packet, errors
         """
-        success, result = _verify_request_contents(self.packet)
+        return _return_packet(self.packet, JSONRPCTypes.RESPONSE, level)
 
-        if success:
-            return True, self.packet, None
-        else:
-            return False, self.packet, result
+    def serialize(self, dumps=None):
+        """
+        Returns the packet encoded as compact UTF-8 JSON bytes, ready to be
+        sent. Unlike return_packet() it doesn't validate the packet
+        'dumps' encodes it some other way instead, such as binary.packb
+        """
+        if dumps is not None:
+            return dumps(self.packet)
+
+        if self._template is not None:
+            # Only the id needs encoding, the result already is
+            return self._template.render(self.response_id)
+
+        return codec.dumps(self.packet)
 
     def update_packet(self, **kwargs):
         """
         Allows you to update the packet's key/data pairs via a method
         """
         for arg in kwargs:
-            if arg in self.packet:
-                self.packet[arg] = kwargs[arg]
-            elif arg in self.packet["result"]:
-                self.packet["result"][arg] = kwargs[arg]
+            if arg == "id":
+                self.response_id = kwargs[arg]
+            elif arg == "result":
+                self.data = kwargs[arg]
+                self._template = None
+            elif isinstance(self.data, dict) and arg in self.data:
+                self.data[arg] = kwargs[arg]
+                self._template = None
 
     def __repr__(self):
         return "JSON-RPC Result: {}".format(repr(self.data))
@@ -579,6 +1441,20 @@ class JSONRPCResult:
             id=self.response_id)
 
 
+def _encoded_result(result, template, response_id):
+    """
+    Returns a JSONRPCResult for 'result', already encoded in ResponseTemplate
+    'template', without checking either again. Its serialize() only encodes
+    'response_id'
+    """
+    response = JSONRPCResult.__new__(JSONRPCResult)
+    response.response_id = response_id
+    response.data = result
+    response._template = template  # pylint: disable=protected-access
+
+    return response
+
+
 class JSONRPCError:
     """
     JSON-RPC Error object
@@ -589,97 +1465,122 @@ class JSONRPCError:
         'message':          Required when creating a JSON-RPC Error object
                                 MUST be type str, short desc. of the error
         'data':             Required when creating a JSON-RPC Error object
-                                type str or dict, contains additional info
-                                about the error
+                                type str, dict or list, contains additional
+                                info about the error
+
+    Every object owns its own fields, the packet dict is only built when
+    it's asked for, so objects can be created and used on any thread
     """
-    response_id = 0
-    packet = {
-        "jsonrpc": "2.0",        # Default required key/value pair for JSON-RPC
-        "id": response_id
-    }
+    __slots__ = ("response_id", "code", "message", "data")
+    type = "Error"
 
     def __init__(self, code, message, data=None, response_id=None):
         """
         Create a JSON-RPC Error object
         Returns nothing on success, otherwise JSONRPCException is raised
         """
-        self.type = "Error"
-
-        # Set the packet's ID correctly, or raise exception if not int/None
-        if isinstance(response_id, int):
+        # Set the packet's ID correctly, or raise exception if not int/str/None
+        #   Responses echo the request's 'id', which may be any of these
+        if isinstance(response_id, (int, str)):
             self.response_id = response_id
-            self.packet["id"] = self.response_id
         elif response_id is None:
             self.response_id = None
-            self.packet["id"] = self.response_id
         else:
             raise JSONRPCException("Unexpected data type for argument"
                                    " 'response_id': '{}'. Must be type"
-                                   " {}".format(type(response_id), int))
+                                   " {} or {}".format(type(response_id), int,
+                                                      str))
 
-        if isinstance(code, int) is not True or code is None:
+        if not isinstance(code, int):
             raise JSONRPCException("code parameter for error MUST be"
                                    " type {}!".format(int))
 
-        if code is None and isinstance(message, str) is not True:
+        if not isinstance(message, str):
             raise JSONRPCException("message parameter for error MUST be"
                                    " type {}!".format(str))
 
         self.code = code
         self.message = message
 
-        self.packet["error"] = {
-            "code": self.code,
-            "message": self.message
-        }
+        error = {"code": code, "message": message}
+        if _check_error_contents(error) is not _VERIFY_OK:
+            # Predefined code with the wrong message, or a reserved code
+            raise JSONRPCException(_verify_error_contents(error)[1][0])
 
-        if isinstance(data, (dict, str)):
-            success, data = _check_valid_json(data)
-            if success:
-                self.data = data
-                self.packet["error"]["data"] = self.data
-            else:
-                raise JSONRPCException(data)
+        if isinstance(data, (dict, list)):
+            self.data = data
 
         elif isinstance(data, str):
-            try:
-                self.data = json.loads(data)
-            except json.decoder.JSONDecodeError:
-                # We're going to assume that it's just returning a string, not
-                #   a JSON object
+            success, decoded = _check_valid_json(data)
+            if success:
+                self.data = decoded
+            else:
+                # We're going to assume that it's just returning a string,
+                #   not a JSON object
                 self.data = data
 
-            self.packet["error"]["data"] = self.data
-
         elif data is None:
-            self.data = ""
+            self.data = None
 
         else:
             raise JSONRPCException("Unexpected data type for error -"
                                    " type '{}'".format(str(type(data))))
 
-    def return_packet(self):
+    @property
+    def packet(self):
+        """
+        A newly built dict of the JSON-RPC packet
+        """
+        error = {
+            "code": self.code,
+            "message": self.message
+        }
+
+        if self.data is not None:
+            error["data"] = self.data
+
+        return {
+            "jsonrpc": "2.0",        # Default required key/value pair
+            "id": self.response_id,
+            "error": error
+        }
+
+    def return_packet(self, level=None):
         """
         Returns the generated JSON-RPC packet after validating it
+        'level' is a JSONRPCValidation value or name, default the global
+            level, see set_validation
         Returns True, packet, None if it validates,
                 otherwise False, packet, errors
         """
-        success, result = _verify_request_contents(self.packet)
+        return _return_packet(self.packet, JSONRPCTypes.RESPONSE, level)
 
-        if success:
-            return True, self.packet, None
-        else:
-            return False, self.packet, result
+    def serialize(self, dumps=None):
+        """
+        Returns the packet encoded as compact UTF-8 JSON bytes, ready to be
+        sent. Unlike return_packet() it doesn't validate the packet
+        'dumps' encodes it some other way instead, such as binary.packb
+        """
+        if dumps is not None:
+            return dumps(self.packet)
+
+        if self.data is None:
+            # Known errors have their packet serialized already
+            template = _ERROR_INDEX.get(self.code)
+            if template is not None and template.message == self.message:
+                return template.render(self.response_id)
+
+        return codec.dumps(self.packet)
 
     def update_packet(self, **kwargs):
         """
         Allows you to update the packet's key/data pairs via a method
         """
         for arg in kwargs:
-            if arg in self.packet:
-                self.packet[arg] = kwargs[arg]
-            elif arg in self.packet["error"]:
-                self.packet["result"][arg] = kwargs[arg]
+            if arg == "id":
+                self.response_id = kwargs[arg]
+            elif arg in ("code", "message", "data"):
+                setattr(self, arg, kwargs[arg])
 
     def __repr__(self):
         return "JSON-RPC Error: {}".format(repr(self.data))
@@ -688,3 +1589,107 @@ class JSONRPCError:
         return "<JSON-RPC {type} object - {id}>".format(
             type=self.type,
             id=self.response_id)
+
+
+class JSONRPCBatch:
+    """
+    JSON-RPC Batch object, an ordered collection of packet objects that is
+    sent as a single JSON array
+
+    Arguments:
+        'items':    OPTIONAL, iterable of JSONRPCRequest objects for a client
+                        batch, or of JSONRPCResult/JSONRPCError objects for
+                        a server's response to one. None is accepted in a
+                        response batch as the (lack of) response to a
+                        notification and is dropped, as the spec requires
+        'level':    OPTIONAL, JSONRPCValidation value or name the items are
+                        validated at, default the global level
+    """
+
+    def __init__(self, items=None, level=None):
+        """
+        Create a JSON-RPC Batch object
+        Returns nothing on success, otherwise JSONRPCException is raised
+        """
+        self.type = "Batch"
+        self.items = []
+        self.level = level
+
+        for item in items or ():
+            self.append(item)
+
+    def append(self, item):
+        """
+        Add a packet object to the end of the batch
+        """
+        if item is None:
+            # No response for a notification
+            return
+
+        if not isinstance(item, (JSONRPCRequest, JSONRPCResult,
+                                 JSONRPCError)):
+            raise JSONRPCException("Unexpected data type for batch item"
+                                   " '{}'. Must be type {}, {} or"
+                                   " {}".format(type(item), JSONRPCRequest,
+                                                JSONRPCResult, JSONRPCError))
+
+        # Built now, so later changes to the item don't change the batch
+        self.items.append(item.return_packet(self.level))
+
+    def return_packet(self):
+        """
+        Returns the generated JSON-RPC batch array after validating it
+        Returns True, packet, None if every element validates,
+                otherwise False, packet, list of per-element errors
+        The packet is None if there is nothing to send, which is the case
+            for a response to a batch made up only of notifications
+        """
+        if not self.items:
+            return True, None, None
+
+        packet = [item[1] for item in self.items]
+
+        if all(item[0] for item in self.items):
+            return True, packet, None
+        else:
+            return False, packet, [item[2] for item in self.items]
+
+    def serialize(self, dumps=None):
+        """
+        Returns the batch array encoded as compact UTF-8 JSON bytes, ready
+        to be sent, or None if there is nothing to send
+        Unlike return_packet() it doesn't validate the packets
+        'dumps' encodes it some other way instead, such as binary.packb
+        """
+        if not self.items:
+            return None
+
+        return (dumps or codec.dumps)([item[1] for item in self.items])
+
+    def __len__(self):
+        return len(self.items)
+
+    def __repr__(self):
+        return "JSON-RPC Batch: {}".format(repr(
+            [item[1] for item in self.items]))
+
+    def __str__(self):
+        return "<JSON-RPC {type} object - {length} items>".format(
+            type=self.type,
+            length=len(self.items))
+
+
+# Imported last, it's built on everything above
+# pylint: disable=wrong-import-position
+from .schema import compile_schema  # noqa: E402
+from .metrics import Metrics  # noqa: E402
+from .cache import ResultCache  # noqa: E402
+from .lazy import LazyPacket, lazy_parse  # noqa: E402
+from .dispatcher import Dispatcher, AsyncDispatcher  # noqa: E402
+from .streaming import JSONRPCResultStream  # noqa: E402
+from .server import (JSONRPCServerProtocol, serve_tcp,  # noqa: E402
+                     serve_unix)
+from .client import (JSONRPCRemoteError, JSONRPCClient,  # noqa: E402
+                     ClientPool, connect_tcp, connect_unix)
+from .prefork import PreforkServer  # noqa: E402
+from .proxy import JSONRPCProxy  # noqa: E402
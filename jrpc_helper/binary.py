@@ -0,0 +1,391 @@
+"""
+Compact binary encoding for the JSON-RPC module
+A MessagePack encoder and decoder for the JSON-RPC envelope, with byte
+strings, for connections that don't need JSON text
+
+The MIT License (MIT)
+
+Copyright (c) 2016 RPiAwesomneness
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import struct
+
+from . import JSONRPCException
+
+
+# The encodings a connection can use
+ENCODINGS = ("json", "msgpack")
+
+# Framings that can carry any bytes, so binary encodings, unlike "newline"
+#   and "concatenated" which look for JSON text
+BINARY_FRAMINGS = ("length-prefix", "content-length")
+
+# Deepest nesting of maps and arrays unpackb decodes, well within Python's
+#   recursion limit, so a hostile packet gets a ValueError
+MAX_DEPTH = 256
+
+# Formats with their MessagePack type byte
+_UINT8 = struct.Struct(">BB")
+_UINT16 = struct.Struct(">BH")
+_UINT32 = struct.Struct(">BI")
+_UINT64 = struct.Struct(">BQ")
+_INT8 = struct.Struct(">Bb")
+_INT16 = struct.Struct(">Bh")
+_INT32 = struct.Struct(">Bi")
+_INT64 = struct.Struct(">Bq")
+_FLOAT64 = struct.Struct(">Bd")
+
+# ...and without, for decoding what follows a type byte
+_U16 = struct.Struct(">H")
+_U32 = struct.Struct(">I")
+_U64 = struct.Struct(">Q")
+_I8 = struct.Struct(">b")
+_I16 = struct.Struct(">h")
+_I32 = struct.Struct(">i")
+_I64 = struct.Struct(">q")
+_F32 = struct.Struct(">f")
+_F64 = struct.Struct(">d")
+
+
+def packb(obj):
+    """
+    Returns 'obj' encoded as MessagePack bytes
+    'obj' may be made of dict, list, tuple, str, bytes, bytearray, int,
+        float, bool and None
+    Raises TypeError for anything else, OverflowError for an int that
+        doesn't fit in 64 bits, the same errors codec.dumps raises
+    """
+    out = bytearray()
+    _pack(obj, out)
+    return bytes(out)
+
+
+def pack_array(items):
+    """
+    Returns a MessagePack array of 'items', each already encoded with
+        packb, without decoding them again
+    """
+    out = bytearray()
+    _pack_header(len(items), 0x90, 0xdc, 0xdd, out)
+    for item in items:
+        out += item
+    return bytes(out)
+
+
+def _pack_header(length, fix, code16, code32, out):
+    """
+    Add the header of a str, bin, array or map of 'length' to 'out', with
+    type bytes 'fix' for the short form (None if there isn't one), then
+    'code16' and 'code32'
+    """
+    if fix is not None and length < (32 if fix == 0xa0 else 16):
+        out.append(fix | length)
+    elif length < 0x10000:
+        out += _UINT16.pack(code16, length)
+    elif length < 0x100000000:
+        out += _UINT32.pack(code32, length)
+    else:
+        raise OverflowError("MessagePack can't hold {} items or"
+                            " bytes".format(length))
+
+
+def _pack_int(obj, out):
+    """
+    Add int 'obj' to 'out' in the shortest form that holds it
+    """
+    if 0 <= obj < 0x80:
+        out.append(obj)
+    elif -32 <= obj < 0:
+        out.append(obj & 0xff)
+    elif obj > 0:
+        if obj < 0x100:
+            out += _UINT8.pack(0xcc, obj)
+        elif obj < 0x10000:
+            out += _UINT16.pack(0xcd, obj)
+        elif obj < 0x100000000:
+            out += _UINT32.pack(0xce, obj)
+        elif obj < 0x10000000000000000:
+            out += _UINT64.pack(0xcf, obj)
+        else:
+            raise OverflowError("int too big for MessagePack: {}".format(obj))
+    elif obj >= -0x80:
+        out += _INT8.pack(0xd0, obj)
+    elif obj >= -0x8000:
+        out += _INT16.pack(0xd1, obj)
+    elif obj >= -0x80000000:
+        out += _INT32.pack(0xd2, obj)
+    elif obj >= -0x8000000000000000:
+        out += _INT64.pack(0xd3, obj)
+    else:
+        raise OverflowError("int too small for MessagePack: {}".format(obj))
+
+
+def _pack(obj, out):
+    """
+    Add 'obj' encoded to bytearray 'out'
+    """
+    kind = type(obj)
+
+    if kind is str:
+        data = obj.encode("utf-8")
+        length = len(data)
+        if length < 32:
+            out.append(0xa0 | length)
+        elif length < 0x100:
+            out += _UINT8.pack(0xd9, length)
+        else:
+            _pack_header(length, None, 0xda, 0xdb, out)
+        out += data
+    elif kind is int:
+        _pack_int(obj, out)
+    elif kind is dict:
+        _pack_header(len(obj), 0x80, 0xde, 0xdf, out)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    elif kind is list or kind is tuple:
+        _pack_header(len(obj), 0x90, 0xdc, 0xdd, out)
+        for item in obj:
+            _pack(item, out)
+    elif kind is float:
+        out += _FLOAT64.pack(0xcb, obj)
+    elif obj is None:
+        out.append(0xc0)
+    elif obj is True:
+        out.append(0xc3)
+    elif obj is False:
+        out.append(0xc2)
+    elif kind is bytes or kind is bytearray or kind is memoryview:
+        length = obj.nbytes if kind is memoryview else len(obj)
+        if length < 0x100:
+            out += _UINT8.pack(0xc4, length)
+        else:
+            _pack_header(length, None, 0xc5, 0xc6, out)
+        out += obj
+    # Subclasses, such as IntEnum and OrderedDict, are rare enough to be
+    #   checked for last
+    elif isinstance(obj, str):
+        _pack(str(obj), out)
+    elif isinstance(obj, int):
+        _pack_int(int(obj), out)
+    elif isinstance(obj, float):
+        out += _FLOAT64.pack(0xcb, obj)
+    elif isinstance(obj, dict):
+        _pack(dict(obj), out)
+    elif isinstance(obj, (list, tuple)):
+        _pack(list(obj), out)
+    else:
+        raise TypeError("Object of type {} is not MessagePack"
+                        " serializable".format(type(obj).__name__))
+
+
+def unpackb(data):
+    """
+    Returns the object MessagePack bytes-like 'data' decode to, maps as
+        dict, arrays as list, bin as bytes
+    Raises ValueError if 'data' isn't exactly one MessagePack object of the
+        types packb makes, or is nested deeper than MAX_DEPTH, the same
+        error codec.loads raises
+    """
+    if isinstance(data, memoryview) and (data.itemsize != 1 or
+                                         not data.c_contiguous):
+        data = data.tobytes()
+
+    try:
+        obj, end = _unpack(data, 0, 0)
+    except (IndexError, struct.error) as exception:
+        raise ValueError("Truncated MessagePack data") from exception
+    except RecursionError as exception:
+        # Only when called with most of the stack used up already
+        raise ValueError("MessagePack data nested too deeply") from exception
+
+    if end != len(data):
+        raise ValueError("Extra data after the MessagePack object, at byte"
+                         " {}".format(end))
+
+    return obj
+
+
+def _check_depth(depth, pos):
+    """
+    Raise ValueError if a map or array at 'depth' is nested too deeply
+    """
+    if depth > MAX_DEPTH:
+        raise ValueError("MessagePack data nested deeper than {} levels, at"
+                         " byte {}".format(MAX_DEPTH, pos))
+
+
+def _unpack_array(data, pos, length, depth):
+    """
+    Returns the list of 'length' items starting at 'pos', 'depth' levels
+    down, and the position after them
+    """
+    _check_depth(depth, pos)
+    items = []
+    for _ in range(length):
+        item, pos = _unpack(data, pos, depth)
+        items.append(item)
+    return items, pos
+
+
+def _unpack_map(data, pos, length, depth):
+    """
+    Returns the dict of 'length' pairs starting at 'pos', 'depth' levels
+    down, and the position after them
+    """
+    _check_depth(depth, pos)
+    items = {}
+    for _ in range(length):
+        key, pos = _unpack(data, pos, depth)
+        value, pos = _unpack(data, pos, depth)
+        try:
+            items[key] = value
+        except TypeError as exception:
+            raise ValueError("MessagePack map key of type {} can't be a dict"
+                             " key".format(type(key).__name__)) from exception
+    return items, pos
+
+
+def _unpack_str(data, pos, length):
+    """
+    Returns the str of 'length' UTF-8 bytes at 'pos', and the position after
+    """
+    end = pos + length
+    if end > len(data):
+        raise IndexError(end)
+    return str(data[pos:end], "utf-8"), end
+
+
+def _unpack_bin(data, pos, length):
+    """
+    Returns the bytes of 'length' at 'pos', and the position after
+    """
+    end = pos + length
+    if end > len(data):
+        raise IndexError(end)
+    return bytes(data[pos:end]), end
+
+
+def _unpack(data, pos, depth):
+    """
+    Returns the object starting at 'pos' in 'data', inside 'depth' maps and
+    arrays, and the position after it
+    """
+    code = data[pos]
+    pos += 1
+
+    if code < 0x80:
+        return code, pos
+    if code < 0x90:
+        return _unpack_map(data, pos, code & 0x0f, depth + 1)
+    if code < 0xa0:
+        return _unpack_array(data, pos, code & 0x0f, depth + 1)
+    if code < 0xc0:
+        return _unpack_str(data, pos, code & 0x1f)
+    if code >= 0xe0:
+        return code - 0x100, pos
+
+    if code == 0xc0:
+        return None, pos
+    if code == 0xc2:
+        return False, pos
+    if code == 0xc3:
+        return True, pos
+    if code == 0xcb:
+        return _F64.unpack_from(data, pos)[0], pos + 8
+    if code == 0xca:
+        return _F32.unpack_from(data, pos)[0], pos + 4
+    if code == 0xcc:
+        return data[pos], pos + 1
+    if code == 0xcd:
+        return _U16.unpack_from(data, pos)[0], pos + 2
+    if code == 0xce:
+        return _U32.unpack_from(data, pos)[0], pos + 4
+    if code == 0xcf:
+        return _U64.unpack_from(data, pos)[0], pos + 8
+    if code == 0xd0:
+        return _I8.unpack_from(data, pos)[0], pos + 1
+    if code == 0xd1:
+        return _I16.unpack_from(data, pos)[0], pos + 2
+    if code == 0xd2:
+        return _I32.unpack_from(data, pos)[0], pos + 4
+    if code == 0xd3:
+        return _I64.unpack_from(data, pos)[0], pos + 8
+    if code == 0xd9:
+        return _unpack_str(data, pos + 1, data[pos])
+    if code == 0xda:
+        return _unpack_str(data, pos + 2, _U16.unpack_from(data, pos)[0])
+    if code == 0xdb:
+        return _unpack_str(data, pos + 4, _U32.unpack_from(data, pos)[0])
+    if code == 0xc4:
+        return _unpack_bin(data, pos + 1, data[pos])
+    if code == 0xc5:
+        return _unpack_bin(data, pos + 2, _U16.unpack_from(data, pos)[0])
+    if code == 0xc6:
+        return _unpack_bin(data, pos + 4, _U32.unpack_from(data, pos)[0])
+    if code == 0xdc:
+        return _unpack_array(data, pos + 2, _U16.unpack_from(data, pos)[0],
+                             depth + 1)
+    if code == 0xdd:
+        return _unpack_array(data, pos + 4, _U32.unpack_from(data, pos)[0],
+                             depth + 1)
+    if code == 0xde:
+        return _unpack_map(data, pos + 2, _U16.unpack_from(data, pos)[0],
+                           depth + 1)
+    if code == 0xdf:
+        return _unpack_map(data, pos + 4, _U32.unpack_from(data, pos)[0],
+                           depth + 1)
+
+    # Extension types and the never used 0xc1
+    raise ValueError("Unsupported MessagePack type byte 0x{:02x}, at byte"
+                     " {}".format(code, pos - 1))
+
+
+def detect_encoding(frame):
+    """
+    Returns the encoding of the first frame a peer sent, "msgpack" if it
+    starts with a MessagePack map or array, a packet or a batch, otherwise
+    "json". JSON text starts with '{', '[' or whitespace, none of which
+    can start those
+    """
+    if frame and (0x80 <= frame[0] <= 0x9f or frame[0] in
+                  (0xdc, 0xdd, 0xde, 0xdf)):
+        return "msgpack"
+    return "json"
+
+
+def check_encoding(encoding, framing, allow_auto=False):
+    """
+    Raise JSONRPCException unless 'encoding' is one of ENCODINGS, or
+    "auto" if 'allow_auto', that 'framing' can carry
+    """
+    allowed = ENCODINGS + (("auto",) if allow_auto else ())
+
+    if encoding not in allowed:
+        raise JSONRPCException("Unexpected value for argument 'encoding':"
+                               " '{}'. Must be one of {}".format(encoding,
+                                                                 allowed))
+
+    if encoding != "json" and framing not in BINARY_FRAMINGS:
+        raise JSONRPCException("Encoding '{}' needs a framing that can"
+                               " carry any bytes, one of {}, not"
+                               " '{}'".format(encoding, BINARY_FRAMINGS,
+                                              framing))
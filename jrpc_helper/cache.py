@@ -0,0 +1,193 @@
+"""
+Result cache for the JSON-RPC module
+Remembers the results of pure methods by their params, already serialized,
+so a repeated call costs a dict lookup and splicing in the 'id'
+
+The MIT License (MIT)
+
+Copyright (c) 2016 RPiAwesomneness
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import collections
+import time
+
+from . import JSONRPCException, ResponseTemplate, codec, _encoded_result
+
+
+def _canonical(value):
+    """
+    Returns a hashable form of JSON value 'value' that is the same for
+    equal values, whatever the order of their keys
+    """
+    if isinstance(value, dict):
+        return (dict, tuple(sorted((key, _canonical(item))
+                                   for key, item in value.items())))
+    if isinstance(value, (list, tuple)):
+        return (list, tuple(_canonical(item) for item in value))
+    if isinstance(value, bool):
+        # True == 1 in Python, they must not share an entry
+        return (bool, value)
+    return value
+
+
+class ResultCache:
+    """
+    Least recently used cache of method results, with optional expiry
+
+    Results are kept serialized, a hit is answered with a JSONRPCResult
+    whose serialize() only has to splice in the request's 'id'. Only
+    successful results are cached, never errors.
+
+    Register a method with a cache to use it, one cache can be shared by
+    many methods:
+        cache = jrpc_helper.ResultCache(maxsize=4096, ttl=60)
+
+        @dispatcher.register(cache=cache)
+        def get_config(name):
+            ...
+
+    Only cache methods whose result depends on nothing but their params.
+    Results are shared between responses, so neither the method nor its
+    callers should change a result once it's returned.
+
+    Arguments:
+        'maxsize':      OPTIONAL, most results kept, default 1024
+        'ttl':          OPTIONAL, seconds a result is kept, default None,
+                            until it's evicted
+        'max_bytes':    OPTIONAL, most bytes of serialized results kept,
+                            default None, no limit
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, max_bytes=None):
+        for name, value in (("maxsize", maxsize), ("max_bytes", max_bytes)):
+            if value is not None and (not isinstance(value, int) or
+                                      value < 1):
+                raise JSONRPCException("Unexpected value for argument"
+                                       " '{}': '{}'. Must be an int of at"
+                                       " least 1".format(name, value))
+        if ttl is not None and (not isinstance(ttl, (int, float)) or
+                                ttl <= 0):
+            raise JSONRPCException("Unexpected value for argument 'ttl':"
+                                   " '{}'. Must be None or a positive"
+                                   " number".format(ttl))
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size = 0           # Bytes of serialized results kept
+        self.hits = 0
+        self.misses = 0
+        # key: (result, its ResponseTemplate, expiry time or None)
+        self._entries = collections.OrderedDict()
+
+    @staticmethod
+    def key(method, args, kwargs):
+        """
+        Returns the cache key of a call of 'method' with 'args' and 'kwargs'
+        """
+        if kwargs:
+            return method, _canonical(args), _canonical(kwargs)
+        return method, _canonical(args)
+
+    def get(self, key, response_id):
+        """
+        Returns the JSONRPCResult for the result cached under 'key', with
+            'response_id', or None if there isn't one
+        """
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        if entry[2] is not None and entry[2] <= time.monotonic():
+            self._discard(key)
+            self.misses += 1
+            return None
+
+        try:
+            self._entries.move_to_end(key)
+        except KeyError:
+            # Evicted by another thread in the meantime, still usable
+            pass
+
+        self.hits += 1
+
+        return _encoded_result(entry[0], entry[1], response_id)
+
+    def put(self, key, result, response_id):
+        """
+        Serialize and cache 'result' under 'key', evicting the least
+        recently used results if that goes over a limit
+        Returns the JSONRPCResult for 'result' with 'response_id', already
+            serialized
+        Raises one of codec.ENCODE_ERRORS if 'result' isn't JSON
+        """
+        # pylint: disable=protected-access
+        template = ResponseTemplate._from_body(codec.dumps(result))
+        response = _encoded_result(result, template, response_id)
+
+        if self.max_bytes is not None and len(template) > self.max_bytes:
+            # Would evict everything else and still not fit
+            return response
+
+        self._discard(key)
+        self._entries[key] = (result, template, None if self.ttl is None
+                              else time.monotonic() + self.ttl)
+        self.size += len(template)
+
+        while len(self._entries) > self.maxsize or (
+                self.max_bytes is not None and self.size > self.max_bytes):
+            try:
+                _, entry = self._entries.popitem(last=False)
+            except KeyError:
+                break
+            self.size -= len(entry[1])
+
+        return response
+
+    def invalidate(self, method=None):
+        """
+        Drop every result of 'method', or every result if it's None
+        """
+        if method is None:
+            self._entries.clear()
+            self.size = 0
+            return
+
+        for key in [key for key in self._entries if key[0] == method]:
+            self._discard(key)
+
+    def _discard(self, key):
+        """
+        Drop the result cached under 'key', if there is one
+        """
+        entry = self._entries.pop(key, None)
+
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return "JSON-RPC ResultCache: {} results, {} hits, {} misses".format(
+            len(self._entries), self.hits, self.misses)
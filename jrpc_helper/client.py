@@ -0,0 +1,662 @@
+"""
+asyncio client for the JSON-RPC module
+Keeps many requests in flight over each connection, matching responses
+back to them by 'id', and pools connections across endpoints
+
+The MIT License (MIT)
+
+Copyright (c) 2016 RPiAwesomneness
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import collections
+import itertools
+import logging
+
+from . import (JSONRPCTypes, JSONRPCException, JSONRPCRequest, codec,
+               _check_data, _CONTENT_CHECKS, _VERIFY_OK)
+from .binary import packb, pack_array, unpackb, check_encoding
+from .framing import MAX_FRAME_SIZE, get_decoder
+from .lazy import LazyPacket, lazy_parse
+
+
+LOGGER = logging.getLogger(__name__)
+
+_RESPONSE_CHECK = _CONTENT_CHECKS[JSONRPCTypes.RESPONSE]
+
+# Default most requests gathered into one batch
+BATCH_SIZE = 100
+
+
+class JSONRPCRemoteError(JSONRPCException):
+    """
+    Raised by a client call when the server responds with an error
+    'code', 'message' and 'data' are those of the error object
+    """
+
+    def __init__(self, code, message, data=None):
+        super().__init__(message)
+        self.code = code
+        self.data = data
+
+    def __repr__(self):
+        return "JSON-RPC error {}: {}".format(self.code, self.message)
+
+    def __str__(self):
+        return "JSON-RPC error {}: {}".format(self.code, self.message)
+
+
+class JSONRPCClient(asyncio.Protocol):
+    """
+    One connection of a JSON-RPC client
+
+    Each call() gets the next id of the connection and a future, and
+    doesn't wait for the calls before it, so many requests can be in
+    flight at once. Responses may come back in any order, each resolves
+    the future waiting on its id. If the connection is lost every call
+    still waiting raises JSONRPCException.
+
+    Writing waits while the transport's write buffer is above its
+    high-water mark, so a server that stops reading slows callers down
+    rather than filling memory.
+
+    With 'batch_window' set, requests and notifications aren't written
+    straight away. Those made within 'batch_window' seconds of the first
+    are sent together as one batch array, or as soon as 'batch_size' of
+    them are waiting, and the responses in the batch response go back to
+    their callers by 'id'. A window of 0 batches everything sent before
+    the event loop next gets control.
+
+    With 'encoding' "msgpack" packets are sent as MessagePack, which needs
+    a binary-safe framing such as "length-prefix", and a server using
+    "msgpack" or "auto".
+
+    A server answers a frame it can't read at all, such as a batch it
+    refuses, with an error whose 'id' is null. That error fails every
+    call of the oldest frame none of whose calls has been answered yet.
+    Inside a batch response such an error answers only one element, with
+    no telling which, so it's logged and dropped.
+
+    With 'lazy' True, JSON responses are parsed with lazy_parse, and a
+    call's 'result' is only decoded for the caller waiting on it. A
+    response nobody waits on any more is never decoded, and forward()
+    hands back responses without decoding them at all. That saves memory
+    on large results, but takes more time than decoding them.
+
+    Use connect_tcp() or connect_unix() to create one.
+
+    Arguments:
+        'framing':      OPTIONAL, name of the framing, see
+                            jrpc_helper.framing.DECODERS, default "newline"
+        'max_frame':    OPTIONAL, largest frame in bytes, default
+                            framing.MAX_FRAME_SIZE
+        'batch_window': OPTIONAL, seconds to gather requests into a batch,
+                            default None, send each one on its own
+        'batch_size':   OPTIONAL, most requests in a batch, default
+                            BATCH_SIZE
+        'encoding':     OPTIONAL, "json" or "msgpack", default "json"
+        'lazy':         OPTIONAL, parse JSON responses lazily, default False
+    """
+
+    def __init__(self, framing="newline", max_frame=MAX_FRAME_SIZE,
+                 batch_window=None, batch_size=BATCH_SIZE, encoding="json",
+                 lazy=False):
+        if batch_window is not None and (
+                not isinstance(batch_window, (int, float)) or
+                batch_window < 0):
+            raise JSONRPCException("Unexpected value for argument"
+                                   " 'batch_window': '{}'. Must be None or a"
+                                   " number of at least 0".format(
+                                       batch_window))
+        if not isinstance(batch_size, int) or batch_size < 1:
+            raise JSONRPCException("Unexpected value for argument"
+                                   " 'batch_size': '{}'. Must be an int of"
+                                   " at least 1".format(batch_size))
+
+        check_encoding(encoding, framing)
+
+        self.decoder = get_decoder(framing, max_frame)
+        self.encoding = encoding
+        # None for JSON, with whichever codec backend is in use
+        self._loads, self._dumps = (unpackb, packb) if \
+            encoding == "msgpack" else (None, None)
+        if lazy and encoding == "json":
+            self._loads = lazy_parse
+        self.lazy = lazy
+        self.batch_window = batch_window
+        self.batch_size = batch_size
+        self.pending = {}
+        # Ids of forward() calls, whose futures get the whole response
+        self._forwards = set()
+        self.transport = None
+        self._ids = itertools.count(1)
+        self._write_paused = False
+        self._drain_waiters = []
+        self._lost = None
+        self._batch = []
+        # Ids of the requests waiting in _batch, and of those in each frame
+        #   written, oldest first, for errors with a null id
+        self._batch_ids = []
+        self._frames = collections.deque()
+        self._flush_handle = None
+
+    @property
+    def is_closed(self):
+        """
+        True once the connection is closed or closing
+        """
+        return self.transport is None or self.transport.is_closing()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self.transport = None
+        self._batch.clear()
+        self._batch_ids.clear()
+        self._frames.clear()
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        self._lost = JSONRPCException("Connection lost{}".format(
+            "" if exc is None else ": {}".format(exc)))
+
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(self._lost)
+        self.pending.clear()
+
+        for waiter in self._drain_waiters:
+            if not waiter.done():
+                waiter.set_exception(self._lost)
+        self._drain_waiters.clear()
+
+    def data_received(self, data):
+        try:
+            frames = self.decoder.feed_frames(data)
+        except JSONRPCException as exception:
+            LOGGER.warning("Closing connection: %s", exception.message)
+            self.transport.close()
+            return
+
+        for frame in frames:
+            try:
+                data = (self._loads or codec.loads)(frame)
+            except (JSONRPCException, IndexError) + codec.DECODE_ERRORS:
+                LOGGER.warning("Dropping a response that isn't valid %s",
+                               self.encoding)
+                continue
+
+            if isinstance(data, list):
+                for item in data:
+                    self._resolve(item, in_batch=True)
+            else:
+                self._resolve(data)
+
+    def pause_writing(self):
+        self._write_paused = True
+
+    def resume_writing(self):
+        self._write_paused = False
+
+        for waiter in self._drain_waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        self._drain_waiters.clear()
+
+    async def call(self, method, params=None, timeout=None):
+        """
+        Send a request and wait for its response
+        Arguments:
+            'method':   REQUIRED, name of the method
+            'params':   OPTIONAL, list or dict of params
+            'timeout':  OPTIONAL, seconds to wait for the response, default
+                            None, wait as long as it takes
+        Returns the 'result' of the response
+        Raises JSONRPCRemoteError if the response is an error,
+            JSONRPCException if the connection is lost and
+            asyncio.TimeoutError if 'timeout' runs out
+        """
+        response_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[response_id] = future
+
+        try:
+            await self._send(JSONRPCRequest(method, params,
+                                            response_id=response_id),
+                             response_id)
+            if timeout is None:
+                return await future
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(response_id, None)
+
+    async def notify(self, method, params=None):
+        """
+        Send a notification, nothing comes back for it
+        """
+        await self._send(JSONRPCRequest(method, params, is_notif=True))
+
+    async def forward(self, packet, timeout=None):
+        """
+        Send a request that came from elsewhere under the next id of this
+        connection, and wait for its response
+        Only the 'id' is rewritten. The rest of a LazyPacket is sent as it
+            is, without its params being decoded or encoded
+        Arguments:
+            'packet':   REQUIRED, the request or notification as a
+                            LazyPacket or a decoded dict
+            'timeout':  OPTIONAL, as for call()
+        Returns the whole response, with this connection's id rather than
+            the original one, a LazyPacket if the client is lazy,
+            otherwise a dict. None for a notification, which is sent
+            unchanged
+        Raises JSONRPCException if the connection is lost, or the client
+            doesn't use the JSON encoding, asyncio.TimeoutError if
+            'timeout' runs out and one of codec.ENCODE_ERRORS if a dict
+            'packet' isn't JSON
+        """
+        lazy = type(packet) is LazyPacket  # pylint: disable=C0123
+
+        if self._dumps is not None:
+            raise JSONRPCException("Only a client with encoding 'json' can"
+                                   " forward packets")
+
+        if "id" not in packet:
+            await self._send_raw(packet.raw() if lazy else
+                                 codec.dumps(packet))
+            return None
+
+        response_id = next(self._ids)
+        payload = packet.replace("id", response_id) if lazy else \
+            codec.dumps(dict(packet, id=response_id))
+        future = asyncio.get_running_loop().create_future()
+        self.pending[response_id] = future
+        self._forwards.add(response_id)
+
+        try:
+            await self._send_raw(payload, response_id)
+            if timeout is None:
+                return await future
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(response_id, None)
+            self._forwards.discard(response_id)
+
+    def close(self):
+        """
+        Close the connection, calls still waiting raise JSONRPCException
+        Requests waiting to be batched are sent first
+        """
+        if self.transport is not None:
+            self.flush()
+            self.transport.close()
+
+    def flush(self):
+        """
+        Send the requests waiting to be batched now, without waiting for the
+        rest of the window
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        if not self._batch:
+            return
+
+        batch = self._batch
+        ids = self._batch_ids
+        self._batch = []
+        self._batch_ids = []
+
+        if self.transport is None or self.transport.is_closing():
+            return
+
+        if len(batch) == 1:
+            payload = batch[0]
+        elif self._dumps is not None:
+            payload = pack_array(batch)
+        else:
+            payload = b"[" + b",".join(batch) + b"]"
+
+        self.transport.write(self.decoder.frame(payload))
+        if ids:
+            self._sent(ids)
+
+    async def _send(self, request, response_id=None):
+        """
+        Frame and write 'request' (any packet object), waiting first if the
+        write buffer is full
+        'response_id' is its id if it's a request
+        """
+        await self._send_raw(request.serialize(self._dumps), response_id)
+
+    async def _send_raw(self, payload, response_id=None):
+        """
+        As _send, for a packet already serialized to 'payload'
+        """
+        if self._lost is not None:
+            raise self._lost
+        if self.transport is None or self.transport.is_closing():
+            raise JSONRPCException("Connection is closed")
+
+        if self._write_paused:
+            waiter = asyncio.get_running_loop().create_future()
+            self._drain_waiters.append(waiter)
+            await waiter
+
+        if self.batch_window is None:
+            self.transport.write(self.decoder.frame(payload))
+            if response_id is not None:
+                self._sent([response_id])
+            return
+
+        self._batch.append(payload)
+        if response_id is not None:
+            self._batch_ids.append(response_id)
+
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+        elif self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            if self.batch_window:
+                self._flush_handle = loop.call_later(self.batch_window,
+                                                     self.flush)
+            else:
+                self._flush_handle = loop.call_soon(self.flush)
+
+    def _sent(self, ids):
+        """
+        Remember the request 'ids' of a frame just written, forgetting the
+        oldest frames once none of their calls are waiting
+        """
+        frames = self._frames
+        while frames and not any(response_id in self.pending
+                                 for response_id in frames[0]):
+            frames.popleft()
+        frames.append(ids)
+
+    def _fail_frame(self, response, error):
+        """
+        Fail the calls of the oldest frame none of which has been answered
+        with 'error', from 'response' whose 'id' is null
+        """
+        for ids in self._frames:
+            if all(response_id in self.pending for response_id in ids):
+                break
+        else:
+            LOGGER.warning("Dropping an error with a null id no call is"
+                           " waiting for: %r", response)
+            return
+
+        self._frames.remove(ids)
+        exception = JSONRPCRemoteError(error["code"], error["message"],
+                                       error.get("data"))
+
+        for response_id in ids:
+            future = self.pending.pop(response_id)
+            if future.done():
+                continue
+            if response_id in self._forwards:
+                future.set_result(response)
+            else:
+                future.set_exception(exception)
+
+    def _resolve(self, data, in_batch=False):
+        """
+        Resolve the future waiting on the id of response 'data', which is
+            an element of a batch response if 'in_batch'
+        """
+        response = data
+
+        if type(data) is LazyPacket:  # pylint: disable=unidiomatic-typecheck
+            try:
+                data = response.shape()
+            except JSONRPCException:
+                data = None
+
+        if _check_data(data, _RESPONSE_CHECK) is not _VERIFY_OK:
+            LOGGER.warning("Dropping an invalid response: %r", response)
+            return
+
+        if data["id"] is None and "error" in data:
+            if in_batch:
+                # Answers one element of a batch, no telling which
+                LOGGER.warning("Dropping an error with a null id from a"
+                               " batch response: %r", response)
+            else:
+                # Refuses a whole frame
+                self._fail_frame(response, data["error"])
+            return
+
+        future = self.pending.pop(data["id"], None)
+
+        # No one is waiting on a call that timed out
+        if future is None or future.done():
+            return
+
+        if data["id"] in self._forwards:
+            future.set_result(response)
+        elif "error" in data:
+            error = data["error"]
+            future.set_exception(JSONRPCRemoteError(
+                error["code"], error["message"], error.get("data")))
+        else:
+            try:
+                future.set_result(response["result"])
+            except JSONRPCException as exception:
+                # A lazy result that isn't JSON after all
+                future.set_exception(exception)
+
+
+async def connect_tcp(host, port, **kwargs):
+    """
+    Open a JSON-RPC client connection over TCP
+    Arguments:
+        'host', 'port': REQUIRED, address of the server
+        'kwargs':       OPTIONAL, 'framing', 'max_frame', 'batch_window',
+                            'batch_size', 'encoding' and 'lazy' are passed
+                            on to JSONRPCClient, the rest to asyncio's
+                            create_connection, such as 'ssl'
+    Returns the connected JSONRPCClient
+
+    Example:
+        client = await jrpc_helper.connect_tcp("127.0.0.1", 4000)
+        total = await client.call("add", [1, 2])
+    """
+    client_kwargs, kwargs = _split_kwargs(kwargs)
+
+    _, client = await asyncio.get_running_loop().create_connection(
+        lambda: JSONRPCClient(**client_kwargs), host, port, **kwargs)
+
+    return client
+
+
+async def connect_unix(path, **kwargs):
+    """
+    Open a JSON-RPC client connection over a Unix domain socket
+    Arguments are as for connect_tcp, with 'path' the socket's path
+    Returns the connected JSONRPCClient
+    """
+    client_kwargs, kwargs = _split_kwargs(kwargs)
+
+    _, client = await asyncio.get_running_loop().create_unix_connection(
+        lambda: JSONRPCClient(**client_kwargs), path, **kwargs)
+
+    return client
+
+
+_CLIENT_KWARGS = frozenset(("framing", "max_frame", "batch_window",
+                            "batch_size", "encoding", "lazy"))
+
+
+def _split_kwargs(kwargs):
+    """
+    Split keyword arguments into those for JSONRPCClient and those for
+    asyncio's create_connection
+    Raises JSONRPCException for bad client arguments before connecting
+    """
+    client_kwargs = {key: value for key, value in kwargs.items()
+                     if key in _CLIENT_KWARGS}
+    connection_kwargs = {key: value for key, value in kwargs.items()
+                         if key not in _CLIENT_KWARGS}
+
+    JSONRPCClient(**client_kwargs)
+
+    return client_kwargs, connection_kwargs
+
+
+class ClientPool:
+    """
+    Pool of JSON-RPC client connections across one or more endpoints
+
+    Every call goes to the open connection with the fewest calls in
+    flight. Connections are opened on first use, and a connection that is
+    lost is opened again on a later call. An endpoint that can't be
+    reached isn't tried again for 'retry_delay' seconds, unless no
+    connection at all is open. Calls only fail to connect if no endpoint
+    can be reached.
+
+    Arguments:
+        'endpoints':    REQUIRED, list of endpoints, each a (host, port)
+                            tuple for TCP or a str path for a Unix socket
+        'size':         OPTIONAL, connections per endpoint, default 1
+        'retry_delay':  OPTIONAL, seconds before reconnecting to an
+                            endpoint that failed, default 1.0
+        'kwargs':       OPTIONAL, passed on to connect_tcp and connect_unix
+
+    Example:
+        pool = jrpc_helper.ClientPool([("10.0.0.1", 4000),
+                                       ("10.0.0.2", 4000)], size=4)
+        total = await pool.call("add", [1, 2])
+        pool.close()
+    """
+
+    def __init__(self, endpoints, size=1, retry_delay=1.0, **kwargs):
+        if not endpoints:
+            raise JSONRPCException("A ClientPool needs at least one"
+                                   " endpoint")
+        if not isinstance(size, int) or size < 1:
+            raise JSONRPCException("Unexpected value for argument 'size':"
+                                   " '{}'. Must be an int of at least"
+                                   " 1".format(size))
+
+        self.endpoints = [endpoint for endpoint in endpoints
+                          for _ in range(size)]
+        self.clients = [None] * len(self.endpoints)
+        self.retry_delay = retry_delay
+        self.kwargs = kwargs
+        self._retry_at = [0.0] * len(self.endpoints)
+        self._lock = None
+
+    async def call(self, method, params=None, timeout=None):
+        """
+        Send a request on the least busy connection and wait for its result
+        Arguments, return value and exceptions are as for
+            JSONRPCClient.call
+        """
+        client = await self.get_client()
+        return await client.call(method, params, timeout)
+
+    async def notify(self, method, params=None):
+        """
+        Send a notification on the least busy connection
+        """
+        client = await self.get_client()
+        await client.notify(method, params)
+
+    async def get_client(self):
+        """
+        Returns the open JSONRPCClient with the fewest calls in flight,
+            opening any connections that aren't open first
+        Raises the error of the first endpoint tried if none can be reached
+        """
+        now = asyncio.get_running_loop().time()
+        best = None
+        reconnect = False
+
+        for index, client in enumerate(self.clients):
+            if client is None or client.is_closed:
+                reconnect = reconnect or self._retry_at[index] <= now
+            elif best is None or len(client.pending) < len(best.pending):
+                best = client
+
+        if best is not None and not reconnect:
+            return best
+
+        await self._connect_missing(force=best is None)
+
+        return min((client for client in self.clients
+                    if client is not None and not client.is_closed),
+                   key=lambda client: len(client.pending))
+
+    def close(self):
+        """
+        Close every connection of the pool
+        """
+        for client in self.clients:
+            if client is not None:
+                client.close()
+
+    async def _connect_missing(self, force):
+        """
+        Open a connection for every slot without an open one that is due a
+        retry, or for every one if 'force'
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            is_open = [client is not None and not client.is_closed
+                       for client in self.clients]
+            # Another call may have connected while this one waited
+            force = force and not any(is_open)
+            missing = [index for index, client in enumerate(self.clients)
+                       if not is_open[index] and
+                       (force or self._retry_at[index] <= loop.time())]
+            results = await asyncio.gather(
+                *[self._connect(self.endpoints[index]) for index in missing],
+                return_exceptions=True)
+
+            for index, result in zip(missing, results):
+                if isinstance(result, BaseException):
+                    LOGGER.warning("Couldn't connect to %r: %s",
+                                   self.endpoints[index], result)
+                    self.clients[index] = None
+                    self._retry_at[index] = loop.time() + self.retry_delay
+                else:
+                    self.clients[index] = result
+
+            if not any(client is not None and not client.is_closed
+                       for client in self.clients):
+                for result in results:
+                    if isinstance(result, Exception):
+                        raise result
+                raise JSONRPCException("No endpoint could be reached")
+
+    def _connect(self, endpoint):
+        """
+        Returns the coroutine that connects to 'endpoint'
+        """
+        if isinstance(endpoint, str):
+            return connect_unix(endpoint, **self.kwargs)
+        return connect_tcp(*endpoint, **self.kwargs)
@@ -0,0 +1,177 @@
+"""
+JSON encoding and decoding for the JSON-RPC module
+Uses the fastest JSON library that's installed: orjson, then ujson, and
+falls back to the standard library's json module
+
+The MIT License (MIT)
+
+Copyright (c) 2016 RPiAwesomneness
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import json
+import os
+
+
+# In order of preference
+BACKENDS = ("orjson", "ujson", "json")
+
+# Everything a decode can raise for bad input is a ValueError subclass,
+#   JSONDecodeError and UnicodeDecodeError included, whichever the backend
+DECODE_ERRORS = (ValueError,)
+
+# ...and everything an encode can raise for data that isn't JSON
+ENCODE_ERRORS = (TypeError, ValueError, OverflowError)
+
+
+def _json_dumps(obj):
+    """
+    Encode 'obj' to compact UTF-8 JSON bytes with the json module
+    """
+    return json.dumps(obj, ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def _json_loads(data, _loads=json.loads):
+    """
+    Decode 'data' with the json module
+    """
+    if isinstance(data, memoryview):
+        # json.loads only takes str, bytes and bytearray. It decodes to a
+        #   str internally anyway, so this copy is the cheaper of the two
+        data = data.tobytes()
+    return _loads(data)
+
+
+def _load_json():
+    """
+    Returns loads, dumps for the json module
+    json.loads takes str, bytes and bytearray, decoding bytes itself
+    """
+    return _json_loads, _json_dumps
+
+
+def _load_orjson():
+    """
+    Returns loads, dumps for orjson, raises ImportError if not installed
+    orjson.loads takes str, bytes, bytearray and memoryview
+    """
+    import orjson  # pylint: disable=import-error,import-outside-toplevel
+
+    orjson_dumps = orjson.dumps
+    option = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj):
+        """
+        Encode 'obj' to compact UTF-8 JSON bytes with orjson
+        """
+        try:
+            return orjson_dumps(obj, option=option)
+        except TypeError:
+            # orjson can't encode ints wider than 64 bits, json can
+            return _json_dumps(obj)
+
+    return orjson.loads, dumps
+
+
+def _load_ujson():
+    """
+    Returns loads, dumps for ujson, raises ImportError if not installed
+    ujson.loads takes str and bytes
+    """
+    import ujson  # pylint: disable=import-error,import-outside-toplevel
+
+    ujson_loads = ujson.loads
+    ujson_dumps = ujson.dumps
+
+    def loads(data):
+        """
+        Decode 'data' with ujson
+        """
+        if isinstance(data, (bytearray, memoryview)):
+            data = bytes(data)
+        return ujson_loads(data)
+
+    def dumps(obj):
+        """
+        Encode 'obj' to compact UTF-8 JSON bytes with ujson
+        """
+        return ujson_dumps(obj, ensure_ascii=False,
+                           escape_forward_slashes=False).encode("utf-8")
+
+    return loads, dumps
+
+
+_LOADERS = {
+    "orjson": _load_orjson,
+    "ujson": _load_ujson,
+    "json": _load_json
+}
+
+
+def available_backends():
+    """
+    Returns the names of the backends that are installed, in order of
+    preference
+    """
+    available = []
+
+    for name in BACKENDS:
+        try:
+            _LOADERS[name]()
+        except ImportError:
+            continue
+        available.append(name)
+
+    return available
+
+
+def set_backend(name=None):
+    """
+    Switch every decode and encode in the module over to backend 'name',
+    or to the fastest one installed if 'name' is None
+    Returns the name of the backend now in use, raises ImportError if
+        'name' isn't installed or isn't a known backend
+    """
+    global BACKEND, loads, dumps  # pylint: disable=global-statement
+
+    if name is None:
+        name = available_backends()[0]
+
+    if name not in _LOADERS:
+        raise ImportError("Unknown JSON backend '{}', expected one of"
+                          " {}".format(name, ", ".join(BACKENDS)))
+
+    loads, dumps = _LOADERS[name]()
+    BACKEND = name
+
+    return name
+
+
+# Filled in by set_backend, below
+#   loads(data) decodes a str, bytes, bytearray or C-contiguous memoryview
+#       of bytes, without copying it where the backend allows
+#   dumps(obj) encodes to compact UTF-8 JSON bytes
+BACKEND = None
+loads = None    # pylint: disable=invalid-name
+dumps = None    # pylint: disable=invalid-name
+
+# The JRPC_HELPER_JSON environment variable can pin a backend by name
+set_backend(os.environ.get("JRPC_HELPER_JSON") or None)
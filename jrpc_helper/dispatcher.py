@@ -0,0 +1,655 @@
+"""
+Method dispatching for the JSON-RPC module
+Routes JSON-RPC request packets to registered Python callables
+
+The MIT License (MIT)
+
+Copyright (c) 2016 RPiAwesomneness
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import functools
+import inspect
+import logging
+import pickle
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from time import perf_counter
+
+from . import (JSONRPCTypes, JSONRPCException, JSONRPCResult, JSONRPCError,
+               JSONRPCBatch, codec, generate_error, get_validation,
+               _check_valid_json, _check_data, _validation_level,
+               _CONTENT_CHECKS, _STRUCTURE_CHECKS, _PARAMS_TYPES,
+               _VERIFY_OK, _STRICT, _TRUST)
+from .schema import compile_schema
+from .cache import ResultCache
+
+
+LOGGER = logging.getLogger(__name__)
+
+# (request check, notification check) for the STRICT and FAST levels,
+#   indexed by whether the packet is a notification
+_STRICT_CHECKS = (_CONTENT_CHECKS[JSONRPCTypes.REQUEST],
+                  _CONTENT_CHECKS[JSONRPCTypes.NOTIF])
+_FAST_CHECKS = (_STRUCTURE_CHECKS[JSONRPCTypes.REQUEST],
+                _STRUCTURE_CHECKS[JSONRPCTypes.NOTIF])
+
+_NO_ARGS = ((), {})
+
+# Where a registered method runs: on the caller's thread or event loop, in
+#   a thread pool or in a process pool
+EXECUTIONS = ("inline", "thread", "process")
+
+
+def _compile_binder(func):
+    """
+    Inspect the signature of 'func' once and return a function that binds
+    JSON-RPC 'params' to it without inspecting anything again
+        binder(params) returns args, kwargs to call 'func' with
+                            OR
+        binder(params) returns None if 'params' doesn't fit the signature
+    """
+    positional = 0              # Parameters that can be passed positionally
+    required_positional = 0     # ...and how many of them have no default
+    keywords = set()            # Parameters that can be passed by name
+    required_keywords = set()   # ...and which of them have no default
+    required_keyword_only = False
+    required_positional_only = False
+    var_positional = var_keyword = False
+
+    for param in inspect.signature(func).parameters.values():
+        required = param.default is param.empty
+
+        if param.kind is param.VAR_POSITIONAL:
+            var_positional = True
+        elif param.kind is param.VAR_KEYWORD:
+            var_keyword = True
+        elif param.kind is param.KEYWORD_ONLY:
+            # Can't be given in a list 'params'
+            required_keyword_only |= required
+            keywords.add(param.name)
+            if required:
+                required_keywords.add(param.name)
+        else:
+            positional += 1
+            if required:
+                required_positional += 1
+
+            if param.kind is param.POSITIONAL_ONLY:
+                # Can't be given in a dict 'params'
+                required_positional_only |= required
+            else:
+                keywords.add(param.name)
+                if required:
+                    required_keywords.add(param.name)
+
+    keywords = frozenset(keywords)
+    required_keywords = frozenset(required_keywords)
+    max_positional = None if var_positional else positional
+    list_ok = not required_keyword_only
+    dict_ok = not required_positional_only
+
+    def binder(params):
+        """
+        Bind 'params' to the compiled signature
+        """
+        if params is None:
+            if required_positional or required_keywords:
+                return None
+            return _NO_ARGS
+
+        if isinstance(params, list):
+            if not list_ok or len(params) < required_positional:
+                return None
+            if max_positional is not None and len(params) > max_positional:
+                return None
+            return params, {}
+
+        if not isinstance(params, dict) or not dict_ok or \
+                not required_keywords <= params.keys():
+            return None
+        if not var_keyword and not params.keys() <= keywords:
+            return None
+        return (), params
+
+    return binder
+
+
+class _Method:
+    """
+    A registered method, its callable, its precompiled binder, the
+    precompiled validator of its params (None if they aren't checked) and
+    the ResultCache of its results (None if they aren't cached) and where
+    it's executed, one of EXECUTIONS
+    """
+    __slots__ = ("name", "func", "bind", "validate", "cache", "is_async",
+                 "execution")
+
+    def __init__(self, name, func, schema=None, cache=None,
+                 execution="inline"):
+        self.name = name
+        self.func = func
+        self.execution = execution
+        self.bind = _compile_binder(func)
+        self.is_async = asyncio.iscoroutinefunction(func)
+        self.cache = ResultCache() if cache is True else cache
+
+        if schema is None:
+            self.validate = None
+        else:
+            self.validate = compile_schema(func if schema is True else schema)
+
+
+class Dispatcher:
+    """
+    JSON-RPC method dispatcher
+
+    Python callables are registered by method name, and dispatch() routes a
+    request packet to the right one and returns the response to send back.
+    Each callable's signature is inspected once, when it's registered.
+
+    A callable may return any JSON value to have it sent as the result, or a
+    JSONRPCError object to have that sent instead (its 'id' is filled in).
+    It may also return bytes, or a result with bytes inside, which only a
+    MessagePack connection can send. A server answers it with a -32603 on
+    a JSON connection.
+    If it raises, a -32603 "Internal error" is sent and the exception is
+    logged.
+
+    'validation' sets how thoroughly requests are checked, a
+    JSONRPCValidation value or name, default None for the global level at
+    the time of each dispatch. FAST only checks a request has the keys it
+    needs, TRUST only that it's an object with a method, an id that can
+    be echoed and params that are a list or an object, and skips params
+    schemas too. Use them for requests from trusted services.
+
+    'metrics' is an optional jrpc_helper.Metrics object to record calls,
+    errors and the time spent in each stage into.
+
+    Example:
+        dispatcher = jrpc_helper.Dispatcher()
+
+        @dispatcher.register
+        def add(a, b):
+            return a + b
+
+        response = dispatcher.dispatch(
+            '{"jsonrpc": "2.0", "id": 1, "method": "add", "params": [1, 2]}')
+        response.packet     # {"jsonrpc": "2.0", "id": 1, "result": 3}
+    """
+
+    def __init__(self, validation=None, metrics=None):
+        self.methods = {}
+        self.metrics = metrics
+        # How dispatch() decodes a packet, as _check_valid_json
+        self._parse = _check_valid_json
+        self.validation = None if validation is None else \
+            _validation_level(validation)
+
+    def register(self, func=None, name=None, schema=None, cache=None,
+                 execution="inline"):
+        """
+        Register 'func' under the method name 'name', default func.__name__
+        Works as a plain call, as @register and as @register(name="...")
+        'schema' is anything compile_schema accepts, or True to check params
+            against the type hints of 'func'. Params that fail it get a
+            -32602 "Invalid params" error, with the reason as its 'data',
+            without 'func' being called
+        'cache' is a ResultCache, or True for one of its own with the
+            default limits, to answer repeated calls with the same params
+            from. Only for methods whose result depends on nothing else
+        'execution' is where 'func' runs, one of EXECUTIONS. "thread" and
+            "process" need an AsyncDispatcher, see there
+        Returns 'func' so it can be used as a decorator
+        """
+        if func is None:
+            return lambda func: self.register(func, name=name, schema=schema,
+                                              cache=cache,
+                                              execution=execution)
+
+        if not callable(func):
+            raise JSONRPCException("Unexpected data type for argument"
+                                   " 'func': '{}'. Must be"
+                                   " callable".format(type(func)))
+
+        if name is None:
+            name = func.__name__
+
+        if not isinstance(name, str):
+            raise JSONRPCException("Unexpected data type for argument"
+                                   " 'name': '{}'. Must be type"
+                                   " {}".format(type(name), str))
+        if name.startswith("rpc."):
+            raise JSONRPCException(
+                "'method' value '{}' starts with reserved for internal"
+                " JSON-RPC use value 'rpc.'".format(name)
+            )
+
+        if cache is not None and cache is not True and \
+                not isinstance(cache, ResultCache):
+            raise JSONRPCException("Unexpected data type for argument"
+                                   " 'cache': '{}'. Must be type {} or"
+                                   " True".format(type(cache), ResultCache))
+
+        if execution not in EXECUTIONS:
+            raise JSONRPCException("Unexpected value for argument"
+                                   " 'execution': '{}'. Must be one of"
+                                   " {}".format(execution, EXECUTIONS))
+
+        method = _Method(name, func, schema, cache, execution)
+
+        if method.is_async and not isinstance(self, AsyncDispatcher):
+            raise JSONRPCException("Method '{}' is a coroutine function, it"
+                                   " must be registered with an"
+                                   " AsyncDispatcher".format(name))
+
+        if execution != "inline":
+            self._check_execution(method)
+
+        self.methods[name] = method
+
+        return func
+
+    def _check_execution(self, method):
+        """
+        Raise JSONRPCException if 'method' can't run in a pool
+        """
+        if not isinstance(self, AsyncDispatcher):
+            raise JSONRPCException("Method '{}' has execution '{}', it must"
+                                   " be registered with an"
+                                   " AsyncDispatcher".format(
+                                       method.name, method.execution))
+
+        if method.is_async:
+            raise JSONRPCException("Method '{}' is a coroutine function, it"
+                                   " can only have execution"
+                                   " 'inline'".format(method.name))
+
+        if method.execution == "process":
+            # It's sent to the worker processes by reference
+            try:
+                pickle.dumps(method.func)
+            except Exception as exception:  # pylint: disable=W0703
+                raise JSONRPCException(
+                    "Method '{}' has execution 'process', but can't be"
+                    " pickled, it must be a module level"
+                    " function: {}".format(method.name, exception)
+                ) from exception
+
+    def unregister(self, name):
+        """
+        Remove the method registered as 'name', if there is one
+        """
+        self.methods.pop(name, None)
+
+    def __contains__(self, name):
+        return name in self.methods
+
+    def dispatch(self, packet):
+        """
+        Dispatch a request, notification or batch of them
+        'packet' may be anything verify_packet accepts, or a batch array
+        Returns:
+            - JSONRPCResult or JSONRPCError object for a single request
+            - JSONRPCBatch object for a batch
+            - None when there is nothing to send back, which is the case for
+                notifications and batches made up only of notifications
+        """
+        success, data = self._decode(packet)
+
+        if not success:
+            return data
+
+        if isinstance(data, list):
+            batch = JSONRPCBatch((self._dispatch_one(item) for item in data),
+                                 level=self._level())
+            return batch if len(batch) else None
+
+        return self._dispatch_one(data)
+
+    def _level(self):
+        """
+        Returns the JSONRPCValidation value to dispatch at right now
+        """
+        return get_validation() if self.validation is None else \
+            self.validation
+
+    def _decode(self, packet):
+        """
+        Decode a packet passed to dispatch()
+        Returns True, decoded data if it's a packet or a non-empty batch
+            otherwise False, the error response to send back
+        """
+        metrics = self.metrics
+
+        if metrics is None:
+            success, data = self._parse(packet)
+        else:
+            start = perf_counter()
+            success, data = self._parse(packet)
+            metrics.observe_stage("parse", perf_counter() - start)
+
+        if not success:
+            if isinstance(data, JSONRPCException):
+                response = generate_error(-32600)
+            else:
+                response = generate_error(-32700)
+        elif isinstance(data, list) and not data:
+            response = generate_error(-32600)
+        else:
+            return True, data
+
+        if metrics is not None:
+            metrics.observe_response(response)
+
+        return False, response
+
+    def _prepare(self, data):
+        """
+        Verify a decoded request or notification and bind its params
+        Returns:
+            - method, args, kwargs, response_id, is_notif if it can be called
+                            OR
+            - None, response if it can't, response being what to send back
+        """
+        level = self._level()
+        is_notif = isinstance(data, dict) and "id" not in data
+        response = self._check_envelope(data, level, is_notif)
+
+        if response is not None:
+            return None, response
+
+        response_id = None if is_notif else data["id"]
+        method = self.methods.get(data["method"])
+
+        if method is None:
+            return None, (None if is_notif else
+                          generate_error(-32601, response_id))
+
+        params = data.get("params")
+        bound = method.bind(params)
+
+        if bound is None:
+            return None, (None if is_notif else
+                          generate_error(-32602, response_id))
+
+        if method.validate is not None and level is not _TRUST:
+            message = method.validate(params)
+            if message is not None:
+                return None, (None if is_notif else
+                              generate_error(-32602, response_id,
+                                             data=message))
+
+        return method, bound[0], bound[1], response_id, is_notif
+
+    @staticmethod
+    def _check_envelope(data, level, is_notif):
+        """
+        Check decoded request or notification 'data' at validation 'level'
+        Returns the -32600 error to send back if it fails, otherwise None
+        """
+        if level is _TRUST:
+            # Only what's needed to route it and answer it
+            is_valid = isinstance(data, dict) and \
+                isinstance(data.get("method"), str) and \
+                isinstance(data.get("id"), (int, str, type(None))) and \
+                isinstance(data.get("params"), _PARAMS_TYPES)
+        else:
+            checks = _STRICT_CHECKS if level is _STRICT else _FAST_CHECKS
+            is_valid = _check_data(data, checks[is_notif]) is _VERIFY_OK
+
+        if is_valid:
+            return None
+
+        response_id = data.get("id") if isinstance(data, dict) else None
+        if not isinstance(response_id, (int, str)):
+            response_id = None
+        return generate_error(-32600, response_id)
+
+    @staticmethod
+    def _respond(result, response_id, method=None, key=None):
+        """
+        Turn a handler's return value into the response object to send
+        With a cache 'key', a result is also cached in 'method's cache
+        """
+        if isinstance(result, JSONRPCError):
+            result.response_id = response_id
+            return result
+
+        try:
+            # Cached results are kept as JSON, bytes never are
+            if key is not None and not isinstance(result, bytes):
+                return method.cache.put(key, result, response_id)
+            return JSONRPCResult(result, response_id=response_id,
+                                 is_json=False, binary=True)
+        except (JSONRPCException,) + codec.ENCODE_ERRORS:
+            LOGGER.error("Method returned a value that isn't JSON: %r",
+                         result)
+            return generate_error(-32603, response_id)
+
+    def _dispatch_one(self, data):
+        """
+        Dispatch a single decoded request or notification
+        """
+        metrics = self.metrics
+
+        if metrics is None:
+            prepared = self._prepare(data)
+        else:
+            start = perf_counter()
+            prepared = self._prepare(data)
+            metrics.observe_stage("validate", perf_counter() - start)
+
+        if prepared[0] is None:
+            if metrics is not None:
+                metrics.observe_response(prepared[1])
+            return prepared[1]
+
+        method, args, kwargs, response_id, is_notif = prepared
+
+        if metrics is not None:
+            start = perf_counter()
+
+        key = response = None
+
+        if method.cache is not None and not is_notif:
+            key = method.cache.key(method.name, args, kwargs)
+            response = method.cache.get(key, response_id)
+
+        if response is None:
+            try:
+                result = method.func(*args, **kwargs)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Method '%s' raised an exception",
+                                 method.name)
+                response = generate_error(-32603, response_id)
+            else:
+                response = None if is_notif else \
+                    self._respond(result, response_id, method, key)
+
+        if metrics is not None:
+            metrics.observe_call(method.name, perf_counter() - start,
+                                 response)
+
+        return None if is_notif else response
+
+
+class AsyncDispatcher(Dispatcher):
+    """
+    asyncio JSON-RPC method dispatcher
+
+    Works just like Dispatcher, but dispatch() is a coroutine and methods
+    may be 'async def' functions, which are awaited. Plain functions are
+    still called inline, so they should be quick, unless they're registered
+    with another execution:
+        - "thread" runs them in 'thread_pool', for blocking I/O
+        - "process" runs them in 'process_pool', for CPU-bound work, so
+            they use every core. Only their args and return value are
+            pickled to and from the worker, never a packet
+    Either pool is any concurrent.futures.Executor, default None for one
+    with the default number of workers, started on first use and shut down
+    by close().
+
+    The elements of a batch are run concurrently, at most 'concurrency' at
+    a time (default None, no limit), and their responses are put back in
+    request order. 'validation' and 'metrics' are as for Dispatcher.
+
+    Example:
+        dispatcher = jrpc_helper.AsyncDispatcher(concurrency=16)
+
+        @dispatcher.register
+        async def fetch(url):
+            ...
+
+        @dispatcher.register(execution="process")
+        def render(scene):
+            ...
+
+        response = await dispatcher.dispatch(packet)
+    """
+
+    def __init__(self, concurrency=None, validation=None, metrics=None,
+                 thread_pool=None, process_pool=None):
+        super().__init__(validation, metrics)
+
+        if concurrency is not None and (not isinstance(concurrency, int) or
+                                        concurrency < 1):
+            raise JSONRPCException("Unexpected value for argument"
+                                   " 'concurrency': '{}'. Must be None or an"
+                                   " int of at least 1".format(concurrency))
+
+        self.concurrency = concurrency
+        self._pools = {"thread": thread_pool, "process": process_pool}
+        # Executions whose pool was started here, so close() shuts it down
+        self._own_pools = set()
+
+    def _pool(self, execution):
+        """
+        Returns the executor for 'execution', starting it if needed
+        """
+        pool = self._pools[execution]
+
+        if pool is None:
+            if execution == "thread":
+                pool = ThreadPoolExecutor(thread_name_prefix="jrpc_helper")
+            else:
+                pool = ProcessPoolExecutor()
+            self._pools[execution] = pool
+            self._own_pools.add(execution)
+
+        return pool
+
+    def close(self, wait=True):
+        """
+        Shut down the pools this dispatcher started, if 'wait' only once
+            the methods running in them return
+        They're started again if another method needs one
+        """
+        for execution in self._own_pools:
+            self._pools[execution].shutdown(wait=wait)
+            self._pools[execution] = None
+        self._own_pools.clear()
+
+    async def dispatch(self, packet):  # pylint: disable=W0236
+        """
+        Dispatch a request, notification or batch of them
+        Returns the same as Dispatcher.dispatch
+        """
+        success, data = self._decode(packet)
+
+        if not success:
+            return data
+
+        if isinstance(data, list):
+            if self.concurrency is None or len(data) <= self.concurrency:
+                responses = await asyncio.gather(
+                    *[self._dispatch_one(item) for item in data])
+            else:
+                semaphore = asyncio.Semaphore(self.concurrency)
+                responses = await asyncio.gather(
+                    *[self._dispatch_limited(item, semaphore)
+                      for item in data])
+
+            # gather keeps the order it was given, so this is request order
+            batch = JSONRPCBatch(responses, level=self._level())
+            return batch if len(batch) else None
+
+        return await self._dispatch_one(data)
+
+    async def _dispatch_limited(self, data, semaphore):
+        """
+        Dispatch a single batch element once 'semaphore' lets it run
+        """
+        async with semaphore:
+            return await self._dispatch_one(data)
+
+    async def _dispatch_one(self, data):  # pylint: disable=W0236
+        """
+        Dispatch a single decoded request or notification
+        """
+        metrics = self.metrics
+
+        if metrics is None:
+            prepared = self._prepare(data)
+        else:
+            start = perf_counter()
+            prepared = self._prepare(data)
+            metrics.observe_stage("validate", perf_counter() - start)
+
+        if prepared[0] is None:
+            if metrics is not None:
+                metrics.observe_response(prepared[1])
+            return prepared[1]
+
+        method, args, kwargs, response_id, is_notif = prepared
+
+        if metrics is not None:
+            start = perf_counter()
+
+        key = response = None
+
+        if method.cache is not None and not is_notif:
+            key = method.cache.key(method.name, args, kwargs)
+            response = method.cache.get(key, response_id)
+
+        if response is None:
+            try:
+                if method.execution == "inline":
+                    result = method.func(*args, **kwargs)
+                    if method.is_async or inspect.isawaitable(result):
+                        result = await result
+                else:
+                    loop = asyncio.get_running_loop()
+                    result = await loop.run_in_executor(
+                        self._pool(method.execution),
+                        functools.partial(method.func, *args, **kwargs))
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Method '%s' raised an exception",
+                                 method.name)
+                response = generate_error(-32603, response_id)
+            else:
+                response = None if is_notif else \
+                    self._respond(result, response_id, method, key)
+
+        if metrics is not None:
+            metrics.observe_call(method.name, perf_counter() - start,
+                                 response)
+
+        return None if is_notif else response
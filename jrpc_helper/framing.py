@@ -0,0 +1,386 @@
+"""
+Stream framing for the JSON-RPC module
+Incremental decoders that turn a byte stream, fed in chunks of any size,
+into complete JSON-RPC packets, and the matching frame encoders
+
+The MIT License (MIT)
+
+Copyright (c) 2016 RPiAwesomneness
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import re
+import struct
+
+from . import JSONRPCException, classify_and_verify
+
+
+# Default largest frame a decoder will buffer, 16 MiB
+MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+_NOT_WHITESPACE = re.compile(rb"[^ \t\r\n]")
+_STRUCTURAL = re.compile(rb'[{}\[\]"]')
+_STRING_SPECIAL = re.compile(rb'["\\]')
+
+_OPEN = frozenset(b"{[")
+_BACKSLASH = ord("\\")
+_QUOTE = ord('"')
+
+_LENGTH_PREFIX = struct.Struct(">I")
+
+# Most bytes of Content-Length headers buffered ahead of a body
+_MAX_HEADERS_SIZE = 4096
+
+
+class FrameDecoder:
+    """
+    Base class of the incremental frame decoders
+
+    Chunks are added to an internal buffer with feed() or feed_frames(),
+    which return every frame the buffer now completes. Each byte is only
+    looked at once, however the stream is chunked: the decoders remember
+    where they stopped scanning. Consumed bytes are dropped after each
+    call, and a partial frame whose payload is bigger than 'max_frame'
+    raises JSONRPCException rather than growing the buffer without bound.
+    The bytes that frame a payload don't count against 'max_frame'.
+
+    Arguments:
+        'max_frame':    OPTIONAL, largest frame payload in bytes that will
+                            be buffered, default MAX_FRAME_SIZE
+    """
+
+    # Most bytes of framing buffered on top of 'max_frame' bytes of payload
+    _FRAMING_SIZE = 0
+
+    def __init__(self, max_frame=MAX_FRAME_SIZE):
+        self.buffer = bytearray()
+        self.max_frame = max_frame
+        self._start = 0     # Start of the frame being collected
+        self._scan = 0      # Where scanning for its end resumes
+
+    def feed(self, data):
+        """
+        Add 'data' to the stream
+        Returns a list of (j_type, data, errors) tuples, one for each frame
+            completed, as returned by classify_and_verify
+        """
+        self.buffer += data
+        results = []
+
+        with memoryview(self.buffer) as view:
+            for start, end in self._frames():
+                with view[start:end] as frame:
+                    results.append(classify_and_verify(frame))
+
+        self._compact()
+
+        return results
+
+    def feed_frames(self, data):
+        """
+        Add 'data' to the stream
+        Returns a list of bytes objects, the raw payload of each frame
+            completed, without decoding them
+        """
+        self.buffer += data
+        buffer = self.buffer
+        frames = [bytes(buffer[start:end]) for start, end in self._frames()]
+
+        self._compact()
+
+        return frames
+
+    @staticmethod
+    def frame(payload):
+        """
+        Returns encoded packet 'payload' (bytes) framed for this decoder
+        """
+        raise NotImplementedError
+
+    def _frames(self):
+        """
+        Generator of the (start, end) buffer offsets of each complete frame
+        Must move self._start past each frame it yields
+        """
+        raise NotImplementedError
+
+    def _compact(self):
+        """
+        Drop the bytes of every frame already returned from the buffer
+        """
+        if self._start:
+            # Deleting from the front of a bytearray is cheap in CPython,
+            #   it just moves the start of the array along
+            del self.buffer[:self._start]
+            self._scan -= self._start
+            self._start = 0
+
+        if len(self.buffer) > self.max_frame + self._FRAMING_SIZE:
+            raise JSONRPCException("Frame exceeds the maximum size of {}"
+                                   " bytes".format(self.max_frame))
+
+
+class NewlineDecoder(FrameDecoder):
+    """
+    Decoder for newline-delimited JSON, one packet per line
+    Blank lines are skipped
+    """
+
+    @staticmethod
+    def frame(payload):
+        """
+        Returns encoded packet 'payload' (bytes) followed by a newline
+        Compact JSON never contains a raw newline, so it needs no escaping
+        """
+        return payload + b"\n"
+
+    def _frames(self):
+        buffer = self.buffer
+
+        while True:
+            end = buffer.find(b"\n", self._scan)
+
+            if end < 0:
+                self._scan = len(buffer)
+                return
+
+            start = self._start
+            self._start = self._scan = end + 1
+
+            if _NOT_WHITESPACE.search(buffer, start, end) is not None:
+                yield start, end
+
+
+class ContentLengthDecoder(FrameDecoder):
+    """
+    Decoder for LSP-style framing, where each packet is preceded by
+    headers, one of which is 'Content-Length', and a blank line
+        Content-Length: 42\\r\\n
+        \\r\\n
+        {"jsonrpc": "2.0", ...}
+    Raises JSONRPCException if the headers have no valid Content-Length
+    """
+
+    # The headers are dropped once read, the buffer then holds only body
+    _FRAMING_SIZE = _MAX_HEADERS_SIZE
+
+    def __init__(self, max_frame=MAX_FRAME_SIZE):
+        super().__init__(max_frame=max_frame)
+        self._length = None     # Length of the body being collected
+
+    @staticmethod
+    def frame(payload):
+        """
+        Returns encoded packet 'payload' (bytes) after its headers
+        """
+        return b"Content-Length: %d\r\n\r\n" % len(payload) + payload
+
+    def _read_length(self, end):
+        """
+        Returns the Content-Length of the headers from self._start to 'end'
+        """
+        length = None
+
+        for line in bytes(self.buffer[self._start:end]).split(b"\r\n"):
+            name, _, value = line.partition(b":")
+            if name.strip().lower() == b"content-length":
+                try:
+                    length = int(value)
+                except ValueError:
+                    length = None
+                break
+
+        if length is None or length < 0:
+            raise JSONRPCException("Missing or invalid Content-Length header"
+                                   " in {!r}".format(
+                                       bytes(self.buffer[self._start:end])))
+
+        if length > self.max_frame:
+            raise JSONRPCException("Frame exceeds the maximum size of {}"
+                                   " bytes".format(self.max_frame))
+
+        return length
+
+    def _frames(self):
+        buffer = self.buffer
+
+        while True:
+            if self._length is None:
+                # The separator may have started in the previous chunk
+                end = buffer.find(b"\r\n\r\n",
+                                  max(self._start, self._scan - 3))
+
+                if end < 0:
+                    self._scan = len(buffer)
+                    return
+
+                self._length = self._read_length(end)
+                self._start = self._scan = end + 4
+
+            if len(buffer) - self._start < self._length:
+                return
+
+            start = self._start
+            self._start = self._scan = start + self._length
+            self._length = None
+
+            yield start, self._start
+
+
+class LengthPrefixDecoder(FrameDecoder):
+    """
+    Decoder for binary length-prefixed framing, where each packet is
+    preceded by its length as a 4-byte big-endian unsigned int
+    """
+
+    _FRAMING_SIZE = _LENGTH_PREFIX.size
+
+    @staticmethod
+    def frame(payload):
+        """
+        Returns encoded packet 'payload' (bytes) after its length
+        """
+        return _LENGTH_PREFIX.pack(len(payload)) + payload
+
+    def _frames(self):
+        buffer = self.buffer
+
+        while len(buffer) - self._start >= 4:
+            length = _LENGTH_PREFIX.unpack_from(buffer, self._start)[0]
+
+            if length > self.max_frame:
+                raise JSONRPCException("Frame exceeds the maximum size of {}"
+                                       " bytes".format(self.max_frame))
+
+            start = self._start + 4
+            if len(buffer) - start < length:
+                return
+
+            self._start = self._scan = start + length
+
+            yield start, self._start
+
+
+class ConcatenatedDecoder(FrameDecoder):
+    """
+    Decoder for raw JSON values sent back to back, with or without
+    whitespace between them
+        {"jsonrpc": "2.0", ...}{"jsonrpc": "2.0", ...}[...]
+    Every value must be an object or an array, which is all JSON-RPC
+    sends, so the end of each can be found by counting brackets outside of
+    strings, without decoding anything. Raises JSONRPCException if
+    anything else is found between values
+    """
+
+    def __init__(self, max_frame=MAX_FRAME_SIZE):
+        super().__init__(max_frame=max_frame)
+        self._depth = 0
+        self._in_string = False
+
+    @staticmethod
+    def frame(payload):
+        """
+        Returns encoded packet 'payload' (bytes), which needs no framing
+        """
+        return payload
+
+    def _frames(self):
+        buffer = self.buffer
+        size = len(buffer)
+        pos = self._scan
+
+        while pos < size:
+            if self._depth == 0:
+                # Between values, skip whitespace to the next one
+                match = _NOT_WHITESPACE.search(buffer, pos)
+
+                if match is None:
+                    self._start = pos = size
+                    break
+
+                pos = match.start()
+                if buffer[pos] not in _OPEN:
+                    raise JSONRPCException("Unexpected byte {!r} between"
+                                           " JSON values".format(
+                                               bytes(buffer[pos:pos + 1])))
+
+                self._start = pos
+                self._depth = 1
+                pos += 1
+
+            elif self._in_string:
+                match = _STRING_SPECIAL.search(buffer, pos)
+
+                if match is None:
+                    pos = size
+                    break
+
+                pos = match.start()
+                if buffer[pos] == _BACKSLASH:
+                    if pos + 1 == size:
+                        # The escaped byte isn't here yet, look at this
+                        #   backslash again with the next chunk
+                        break
+                    pos += 2
+                else:
+                    self._in_string = False
+                    pos += 1
+
+            else:
+                match = _STRUCTURAL.search(buffer, pos)
+
+                if match is None:
+                    pos = size
+                    break
+
+                pos = match.end()
+                byte = buffer[pos - 1]
+
+                if byte == _QUOTE:
+                    self._in_string = True
+                elif byte in _OPEN:
+                    self._depth += 1
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        start = self._start
+                        self._start = self._scan = pos
+                        yield start, pos
+
+        self._scan = pos
+
+
+DECODERS = {
+    "newline": NewlineDecoder,
+    "content-length": ContentLengthDecoder,
+    "length-prefix": LengthPrefixDecoder,
+    "concatenated": ConcatenatedDecoder
+}
+
+
+def get_decoder(framing, max_frame=MAX_FRAME_SIZE):
+    """
+    Returns a new decoder for 'framing', one of the names in DECODERS
+    """
+    if framing not in DECODERS:
+        raise JSONRPCException("Unknown framing '{}', expected one of"
+                               " {}".format(framing, ", ".join(DECODERS)))
+
+    return DECODERS[framing](max_frame=max_frame)
@@ -0,0 +1,439 @@
+"""
+Lazy parsing for the JSON-RPC module
+Reads the envelope of a JSON packet without decoding its params or result
+
+The MIT License (MIT)
+
+Copyright (c) 2016 RPiAwesomneness
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import re
+
+from . import (JSONRPCException, codec, verify_packet, check_packet,
+               _check_valid_json)
+from .framing import _NOT_WHITESPACE, _OPEN, _BACKSLASH, _QUOTE
+
+
+# Keys whose values are left as undecoded spans until they're asked for
+LAZY_KEYS = frozenset(("params", "result"))
+
+# Where a number, true, false or null ends
+_SCALAR_END = re.compile(rb"[ \t\r\n,}\]]")
+
+# The rest of a string after its opening quote, up to its closing one
+_STRING_REST = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+
+# Everything up to and including the next bracket outside of a string.
+#   Each part can only match one way, so a failed match never backtracks
+#   more than linearly, and the scanning between brackets is done by the
+#   regex engine, not a Python loop
+_TO_BRACKET = re.compile(rb'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"'
+                         rb'[^"\[\]{}]*)*([\[\]{}])', re.S)
+
+# Stand-ins for lazy values in LazyPacket.shape(), by their first byte,
+#   only their type matters to the checks. Built fresh for each call
+_PLACEHOLDERS = {ord("{"): dict, ord("["): list, _QUOTE: str}
+
+_RAW_TYPES = (str, bytes, bytearray, memoryview)
+
+
+def _skip_whitespace(data, pos, end):
+    """
+    Returns the position of the first byte from 'pos' that isn't whitespace
+    Raises JSONRPCException if there is none before 'end'
+    """
+    match = _NOT_WHITESPACE.search(data, pos, end)
+
+    if match is None:
+        raise JSONRPCException("Unexpected end of JSON data")
+
+    return match.start()
+
+
+def _skip_string(data, pos, end):
+    """
+    Returns the position after the string whose opening quote is just
+    before 'pos'
+    """
+    match = _STRING_REST.match(data, pos, end)
+
+    if match is None:
+        raise JSONRPCException("Unterminated JSON string")
+
+    return match.end()
+
+
+def _skip_value(data, pos, end):
+    """
+    Returns the position after the JSON value starting at 'pos', found by
+    counting brackets outside of strings as the concatenated framing does,
+    without decoding anything
+    """
+    byte = data[pos]
+
+    if byte == _QUOTE:
+        return _skip_string(data, pos + 1, end)
+
+    if byte in _OPEN:
+        depth = 1
+        pos += 1
+        to_bracket = _TO_BRACKET.match
+
+        while depth:
+            match = to_bracket(data, pos, end)
+
+            if match is None:
+                raise JSONRPCException("Unterminated JSON object or array")
+
+            pos = match.end()
+
+            if data[pos - 1] in _OPEN:
+                depth += 1
+            else:
+                depth -= 1
+
+        return pos
+
+    match = _SCALAR_END.search(data, pos, end)
+
+    return end if match is None else match.start()
+
+
+def _scan_object(data, pos, end):
+    """
+    Scan the top level of the JSON object starting at 'pos'
+    Returns a dict of each key to the (start, end) span of its value
+    """
+    if data[pos] != ord("{"):
+        raise JSONRPCException("JSON-RPC packet must be a JSON object")
+
+    spans = {}
+    pos = _skip_whitespace(data, pos + 1, end)
+
+    if data[pos] == ord("}"):
+        return spans, pos + 1
+
+    while True:
+        if data[pos] != _QUOTE:
+            raise JSONRPCException("Expected a key at byte {}".format(pos))
+
+        key_end = _skip_string(data, pos + 1, end)
+        key = data[pos + 1:key_end - 1]
+        key = codec.loads(data[pos:key_end]) if _BACKSLASH in key else \
+            str(key, "utf-8")
+
+        pos = _skip_whitespace(data, key_end, end)
+        if data[pos] != ord(":"):
+            raise JSONRPCException("Expected ':' at byte {}".format(pos))
+
+        pos = _skip_whitespace(data, pos + 1, end)
+        value_end = _skip_value(data, pos, end)
+        spans[key] = (pos, value_end)
+
+        pos = _skip_whitespace(data, value_end, end)
+        if data[pos] == ord("}"):
+            return spans, pos + 1
+        if data[pos] != ord(","):
+            raise JSONRPCException("Expected ',' or '}}' at byte"
+                                   " {}".format(pos))
+        pos = _skip_whitespace(data, pos + 1, end)
+
+
+class LazyPacket:
+    """
+    A JSON-RPC packet whose envelope has been read, but whose 'params' or
+    'result' are only decoded if they're asked for
+
+    Parsing finds where the value of each top-level key starts and ends,
+    by counting brackets outside of strings, without decoding any of
+    them. Values are decoded on first access and kept. A proxy can route
+    on 'method' and forward raw() unchanged, or splice in a new 'id' with
+    replace(), without ever holding a large body as Python objects.
+
+    The scan runs in Python, one step per bracket, so it takes more time
+    than decoding the whole packet with any codec backend. What it saves
+    is memory: a large 'params' or 'result' is never turned into objects.
+
+    Only the structure of the top-level object is checked while parsing.
+    A value that isn't valid JSON raises JSONRPCException when it's
+    decoded.
+
+    Arguments:
+        'data':     REQUIRED, JSON object as str, bytes, bytearray or
+                        memoryview
+        'start':    OPTIONAL, where the object starts in 'data', default 0
+        'end':      OPTIONAL, where it ends, default the end of 'data'
+    Raises JSONRPCException if it isn't a JSON object
+
+    Example:
+        packet = jrpc_helper.LazyPacket(frame)
+        packet["method"]            # decodes only the method
+        packet.raw("params")        # b'[...]', not decoded
+        packet.replace("id", 7)     # the packet's bytes with another id
+    """
+    __slots__ = ("data", "start", "end", "spans", "_values")
+
+    def __init__(self, data, start=0, end=None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        elif isinstance(data, memoryview) and (data.itemsize != 1 or
+                                               not data.c_contiguous):
+            data = data.tobytes()
+        elif not isinstance(data, (bytes, bytearray, memoryview)):
+            raise JSONRPCException("Unexpected data type for argument"
+                                   " 'data': '{}'. Must be type {}, {},"
+                                   " {} or {}".format(type(data),
+                                                      *_RAW_TYPES))
+
+        if end is None:
+            end = len(data)
+
+        try:
+            start = _skip_whitespace(data, start, end)
+            self.spans, object_end = _scan_object(data, start, end)
+        except _SCAN_ERRORS as exception:
+            raise _scan_error(exception) from exception
+
+        if _NOT_WHITESPACE.search(data, object_end, end) is not None:
+            raise JSONRPCException("Extra data after the JSON object")
+
+        self.data = data
+        self.start = start
+        self.end = object_end
+        self._values = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+
+        start, end = self.spans[key]
+
+        try:
+            value = codec.loads(self.data[start:end])
+        except codec.DECODE_ERRORS as exception:
+            raise JSONRPCException("Value of key '{}' isn't valid JSON:"
+                                   " {}".format(key, exception)
+                                   ) from exception
+
+        self._values[key] = value
+        return value
+
+    def get(self, key, default=None):
+        """
+        Returns the decoded value of 'key', or 'default' if there is none
+        """
+        return self[key] if key in self.spans else default
+
+    def __contains__(self, key):
+        return key in self.spans
+
+    def __iter__(self):
+        return iter(self.spans)
+
+    def __len__(self):
+        return len(self.spans)
+
+    def keys(self):
+        """
+        Returns the keys of the packet, in order
+        """
+        return self.spans.keys()
+
+    def raw(self, key=None):
+        """
+        Returns the undecoded bytes of the value of 'key', or of the whole
+            packet if 'key' is None
+        """
+        if key is None:
+            return bytes(self.data[self.start:self.end])
+
+        start, end = self.spans[key]
+        return bytes(self.data[start:end])
+
+    def shape(self):
+        """
+        Returns the packet as a dict, with LAZY_KEYS values that are
+            objects, arrays or strings replaced by empty ones of the same
+            type, without decoding them
+        This is all the checks need, so check_packet(packet.shape(), ...)
+            checks the packet at the cost of its envelope alone
+        """
+        shape = {}
+        data = self.data
+
+        for key, (start, _) in self.spans.items():
+            placeholder = _PLACEHOLDERS.get(data[start])
+            if key in LAZY_KEYS and placeholder is not None and \
+                    key not in self._values:
+                shape[key] = placeholder()
+            else:
+                shape[key] = self[key]
+
+        return shape
+
+    def decode(self):
+        """
+        Returns the whole packet decoded as a dict
+        """
+        return {key: self[key] for key in self.spans}
+
+    def check(self, j_type, level=None):
+        """
+        Quietly checks the packet as check_packet does, without decoding
+            LAZY_KEYS
+        Returns JSONRPCVerifyCodes.OK (0) if it passes
+        """
+        return check_packet(self.shape(), j_type, level)
+
+    def verify(self, j_type, level=None):
+        """
+        Verifies the packet as verify_packet does, without decoding
+            LAZY_KEYS
+        Returns True, None if it passes, otherwise False, errors
+        """
+        return verify_packet(self.shape(), j_type, level)
+
+    def replace(self, key, value):
+        """
+        Returns the bytes of the packet with the value of 'key' set to
+            'value', encoded, or with 'key' added if it isn't there. The
+            other values are copied as they are
+        """
+        encoded = codec.dumps(value)
+        data = self.data
+
+        if key in self.spans:
+            start, end = self.spans[key]
+            return b"".join((data[self.start:start], encoded,
+                             data[end:self.end]))
+
+        # Before the closing brace, after a comma if there are other keys
+        return b"".join((data[self.start:self.end - 1],
+                         b"," if self.spans else b"", codec.dumps(key),
+                         b":", encoded, b"}"))
+
+    def __repr__(self):
+        return "JSON-RPC LazyPacket: {}".format(
+            ", ".join(self.spans))
+
+
+def lazy_parse(data):
+    """
+    Parse a JSON-RPC packet or batch without decoding 'params' or 'result'
+    Arguments:
+        'data':     REQUIRED, JSON as str, bytes, bytearray or memoryview
+    Returns a LazyPacket, or for a batch a list with a LazyPacket for each
+        element that is an object and any other element decoded. Any
+        other JSON value is decoded and returned as it is
+    Raises JSONRPCException if it isn't valid JSON
+    """
+    try:
+        return _lazy_parse(data)
+    except _SCAN_ERRORS as exception:
+        raise _scan_error(exception) from exception
+
+
+def _lazy_parse(data):
+    """
+    lazy_parse, but a scan that runs off the end of 'data' or into bytes
+        that aren't UTF-8 raises one of _SCAN_ERRORS
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    elif isinstance(data, memoryview) and (data.itemsize != 1 or
+                                           not data.c_contiguous):
+        data = data.tobytes()
+
+    end = len(data)
+    pos = _skip_whitespace(data, 0, end)
+
+    if data[pos] == ord("{"):
+        return LazyPacket(data, pos, end)
+
+    if data[pos] != ord("["):
+        return _loads(data[pos:end])
+
+    items = []
+    pos = _skip_whitespace(data, pos + 1, end)
+
+    if data[pos] != ord("]"):
+        while True:
+            item_end = _skip_value(data, pos, end)
+
+            if data[pos] == ord("{"):
+                items.append(LazyPacket(data, pos, item_end))
+            else:
+                items.append(_loads(data[pos:item_end]))
+
+            pos = _skip_whitespace(data, item_end, end)
+            if data[pos] == ord("]"):
+                break
+            if data[pos] != ord(","):
+                raise JSONRPCException("Expected ',' or ']' at byte"
+                                       " {}".format(pos))
+            pos = _skip_whitespace(data, pos + 1, end)
+
+    if _NOT_WHITESPACE.search(data, pos + 1, end) is not None:
+        raise JSONRPCException("Extra data after the JSON array")
+
+    return items
+
+
+# What scanning malformed data raises besides JSONRPCException: IndexError
+#   for running off its end, ValueError for a key that isn't UTF-8 or JSON
+_SCAN_ERRORS = (IndexError, ValueError)
+
+
+def _scan_error(exception):
+    """
+    Returns the JSONRPCException for one of _SCAN_ERRORS
+    """
+    if isinstance(exception, IndexError):
+        return JSONRPCException("Unexpected end of JSON data")
+    return JSONRPCException("Invalid JSON: {}".format(exception))
+
+
+def _loads(data):
+    """
+    Returns JSON 'data' decoded, raises JSONRPCException if it isn't JSON
+    """
+    try:
+        return codec.loads(data)
+    except codec.DECODE_ERRORS as exception:
+        raise JSONRPCException("Invalid JSON: {}".format(exception)
+                               ) from exception
+
+
+def _check_lazy_json(packet):
+    """
+    As _check_valid_json, but a str or bytes-like 'packet' is parsed with
+        lazy_parse, and a parse failure is returned as a ValueError, like
+        the decode errors of the codec
+    """
+    if not isinstance(packet, _RAW_TYPES):
+        return _check_valid_json(packet)
+
+    try:
+        return True, lazy_parse(packet)
+    except JSONRPCException as exception:
+        return False, ValueError(exception.message)
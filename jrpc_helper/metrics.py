@@ -0,0 +1,287 @@
+"""
+Metrics for the JSON-RPC module
+Counters and latency histograms a Dispatcher fills in as it works, exported
+as a dict or as Prometheus text
+
+The MIT License (MIT)
+
+Copyright (c) 2016 RPiAwesomneness
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import bisect
+
+from . import JSONRPCException, JSONRPCError
+
+
+# Default histogram bucket upper bounds, in seconds, from 50us to 10s
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# The stages of handling a packet that are timed
+STAGES = ("parse", "validate", "dispatch", "serialize")
+
+
+class Histogram:
+    """
+    Histogram with fixed buckets, observing a value is a bisect and three
+    additions
+
+    Arguments:
+        'bounds':   REQUIRED, sorted upper bounds of the buckets, a last
+                        bucket for anything bigger is added
+    """
+    __slots__ = ("bounds", "counts", "count", "total")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        """
+        Add 'value' to the histogram
+        """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def merge(self, other):
+        """
+        Add the counts of Histogram 'other', which must have the same
+            bounds, to this one
+        """
+        if other.bounds != self.bounds:
+            raise JSONRPCException("Can't merge histograms with different"
+                                   " bucket bounds")
+
+        self.counts = [count + other_count for count, other_count
+                       in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+
+    def snapshot(self):
+        """
+        Returns a dict of the histogram, its "buckets" being a list of
+            [upper bound, cumulative count] with None for the last bound
+        """
+        buckets = []
+        cumulative = 0
+
+        for bound, count in zip(list(self.bounds) + [None], self.counts):
+            cumulative += count
+            buckets.append([bound, cumulative])
+
+        return {"buckets": buckets, "count": self.count, "sum": self.total}
+
+
+class Metrics:
+    """
+    Counters and latency histograms of what a Dispatcher does
+
+    Pass one to a Dispatcher or AsyncDispatcher as 'metrics' and it
+    records, for every method registered:
+        - the number of calls, and of calls that ended in an error
+        - a histogram of how long the method took
+    and for everything dispatched:
+        - error responses by JSON-RPC error code, including -32700 and
+            -32600 for packets that never reached a method
+        - a histogram of the time spent in each of STAGES: "parse" decoding
+            the packet, "validate" checking and binding it, "dispatch"
+            running the method and building its response, and "serialize"
+            encoding the response (recorded by the server module)
+
+    A dispatcher without metrics pays for a single 'is not None' check at
+    each stage. Updates aren't locked: under threads, counts may rarely be
+    lost, never corrupted.
+
+    Arguments:
+        'buckets':  OPTIONAL, sorted histogram bucket bounds in seconds,
+                        default BUCKETS
+
+    Example:
+        metrics = jrpc_helper.Metrics()
+        dispatcher = jrpc_helper.Dispatcher(metrics=metrics)
+        ...
+        print(metrics.prometheus())
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.calls = {}
+        self.method_errors = {}
+        self.latency = {}
+        self.errors = {}
+        self.stages = {stage: Histogram(self.buckets) for stage in STAGES}
+
+    def observe_stage(self, stage, seconds):
+        """
+        Record that a packet spent 'seconds' in 'stage', one of STAGES
+        """
+        self.stages[stage].observe(seconds)
+
+    def observe_call(self, method, seconds, response):
+        """
+        Record a call of 'method' that took 'seconds' and ended with
+        'response', the object sent back (None for a notification)
+        """
+        self.stages["dispatch"].observe(seconds)
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        histogram = self.latency.get(method)
+        if histogram is None:
+            histogram = self.latency[method] = Histogram(self.buckets)
+        histogram.observe(seconds)
+
+        if isinstance(response, JSONRPCError):
+            self.observe_error(response.code, method)
+
+    def observe_response(self, response):
+        """
+        Record 'response' to a packet that never reached a method
+        """
+        if isinstance(response, JSONRPCError):
+            self.observe_error(response.code)
+
+    def observe_error(self, code, method=None):
+        """
+        Record an error response with 'code', as an error of 'method' too
+            if it's given, for errors that aren't JSONRPCError objects
+        """
+        if method is not None:
+            self.method_errors[method] = \
+                self.method_errors.get(method, 0) + 1
+        self.errors[code] = self.errors.get(code, 0) + 1
+
+    def merge(self, other):
+        """
+        Add every counter and histogram of Metrics 'other', such as one
+            from another process, to these, its buckets must be the same
+        Returns these Metrics
+        """
+        for counts, other_counts in ((self.calls, other.calls),
+                                     (self.method_errors,
+                                      other.method_errors),
+                                     (self.errors, other.errors)):
+            for key, count in other_counts.items():
+                counts[key] = counts.get(key, 0) + count
+
+        for method, histogram in other.latency.items():
+            if method not in self.latency:
+                self.latency[method] = Histogram(self.buckets)
+            self.latency[method].merge(histogram)
+
+        for stage, histogram in other.stages.items():
+            self.stages[stage].merge(histogram)
+
+        return self
+
+    def reset(self):
+        """
+        Clear every counter and histogram
+        """
+        self.__init__(self.buckets)
+
+    def snapshot(self):
+        """
+        Returns a dict of every counter and histogram:
+            {
+                "methods": {name: {"calls": int, "errors": int,
+                                   "latency": histogram}},
+                "errors": {code: int},
+                "stages": {stage: histogram}
+            }
+            with each histogram as returned by Histogram.snapshot
+        """
+        return {
+            "methods": {
+                method: {"calls": calls,
+                         "errors": self.method_errors.get(method, 0),
+                         "latency": self.latency[method].snapshot()}
+                for method, calls in self.calls.items()
+            },
+            "errors": dict(self.errors),
+            "stages": {stage: histogram.snapshot()
+                       for stage, histogram in self.stages.items()}
+        }
+
+    def prometheus(self, prefix="jrpc"):
+        """
+        Returns the metrics in the Prometheus text exposition format, every
+            metric name starting with 'prefix'
+        """
+        lines = []
+
+        lines.extend(_counter(
+            prefix + "_calls_total", "Calls of each method", "method",
+            self.calls))
+        lines.extend(_counter(
+            prefix + "_call_errors_total",
+            "Calls of each method that ended in an error", "method",
+            self.method_errors))
+        lines.extend(_counter(
+            prefix + "_errors_total", "Error responses by JSON-RPC code",
+            "code", self.errors))
+        lines.extend(_histograms(
+            prefix + "_call_duration_seconds", "Time each method took",
+            "method", self.latency))
+        lines.extend(_histograms(
+            prefix + "_stage_duration_seconds",
+            "Time spent in each stage of handling a packet", "stage",
+            self.stages))
+
+        return "\n".join(lines) + "\n"
+
+
+def _label(value):
+    """
+    Returns 'value' escaped for use as a Prometheus label value
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace(
+        "\n", "\\n")
+
+
+def _counter(name, description, label, values):
+    """
+    Generator of the Prometheus text lines of a counter with one label
+    """
+    yield "# HELP {} {}".format(name, description)
+    yield "# TYPE {} counter".format(name)
+
+    for key, value in sorted(values.items(), key=lambda item: str(item[0])):
+        yield '{}{{{}="{}"}} {}'.format(name, label, _label(key), value)
+
+
+def _histograms(name, description, label, histograms):
+    """
+    Generator of the Prometheus text lines of a histogram with one label
+    """
+    yield "# HELP {} {}".format(name, description)
+    yield "# TYPE {} histogram".format(name)
+
+    for key, histogram in sorted(histograms.items()):
+        labels = '{}="{}"'.format(label, _label(key))
+        for bound, count in histogram.snapshot()["buckets"]:
+            yield '{}_bucket{{{},le="{}"}} {}'.format(
+                name, labels, "+Inf" if bound is None else repr(bound),
+                count)
+        yield "{}_sum{{{}}} {!r}".format(name, labels, histogram.total)
+        yield "{}_count{{{}}} {}".format(name, labels, histogram.count)
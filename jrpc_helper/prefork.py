@@ -0,0 +1,446 @@
+"""
+Pre-fork multi-process server for the JSON-RPC module
+Runs one server per core, sharing a port with SO_REUSEPORT
+
+The MIT License (MIT)
+
+Copyright (c) 2016 RPiAwesomneness
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import logging
+import os
+import pickle
+import selectors
+import signal
+import socket
+import time
+
+from . import JSONRPCException
+from .dispatcher import AsyncDispatcher
+from .framing import LengthPrefixDecoder
+from .metrics import Metrics
+from .server import serve_tcp, _split_kwargs
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Default seconds between the metrics each worker sends the supervisor
+STATS_INTERVAL = 1.0
+
+# Default seconds a worker slot waits between starts, so a worker that
+#   crashes as it starts isn't forked in a tight loop
+RESTART_DELAY = 1.0
+
+# Seconds workers get to finish once asked to stop, before they're killed
+STOP_TIMEOUT = 10.0
+
+# Seconds start() waits for the workers to be listening
+START_TIMEOUT = 10.0
+
+
+class _StatsPipe(asyncio.BaseProtocol):
+    """
+    Write end of a worker's stats pipe, knows when it has been flushed and
+    closed
+    """
+
+    def __init__(self):
+        self.closed = asyncio.get_running_loop().create_future()
+
+    def connection_lost(self, exc):
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+
+class _Worker:
+    """
+    A worker process as the supervisor sees it: its pid, the read end of
+    its stats pipe, a decoder of the frames on it, the last Metrics it
+    sent and whether it's listening, which it tells by sending its first
+    """
+    __slots__ = ("index", "pid", "stats_fd", "decoder", "metrics", "ready")
+
+    def __init__(self, index, pid, stats_fd):
+        self.index = index
+        self.pid = pid
+        self.stats_fd = stats_fd
+        self.decoder = LengthPrefixDecoder()
+        self.metrics = None
+        self.ready = False
+
+
+class PreforkServer:
+    """
+    JSON-RPC TCP server that forks 'workers' processes, each serving the
+    same port on its own event loop
+
+    Every worker opens its own listening socket with SO_REUSEPORT, so the
+    kernel spreads new connections between them, and runs the usual
+    serve_tcp pipeline of framing, checking and dispatching. The
+    supervisor, the process that created this object, reserves the port
+    and watches the workers: one that exits or crashes is forked again,
+    at most once every 'restart_delay' seconds.
+
+    If the dispatcher has metrics, each worker sends its own to the
+    supervisor every 'stats_interval' seconds, and stats() adds them up,
+    keeping the counts of workers that have since been replaced.
+
+    Needs os.fork and SO_REUSEPORT, so Linux and other Unixes only. The
+    dispatcher is forked along with the workers, so create it, and
+    anything its methods share, before start(), but don't start an event
+    loop or open connections it needs until the methods run.
+
+    Arguments:
+        'dispatcher':       REQUIRED, Dispatcher or AsyncDispatcher
+        'host':             OPTIONAL, address to listen on, default all
+        'port':             OPTIONAL, port to listen on, default one the OS
+                                picks, see 'port' once started
+        'workers':          OPTIONAL, number of worker processes, default
+                                one per CPU
+        'stats_interval':   OPTIONAL, seconds, default STATS_INTERVAL
+        'restart_delay':    OPTIONAL, seconds, default RESTART_DELAY
+        'kwargs':           OPTIONAL, passed on to serve_tcp
+
+    Example:
+        server = jrpc_helper.PreforkServer(dispatcher, "0.0.0.0", 4000)
+        server.run()    # until SIGTERM or SIGINT
+    """
+
+    def __init__(self, dispatcher, host=None, port=0, workers=None,
+                 stats_interval=STATS_INTERVAL, restart_delay=RESTART_DELAY,
+                 **kwargs):
+        if not hasattr(os, "fork") or not hasattr(socket, "SO_REUSEPORT"):
+            raise JSONRPCException("PreforkServer needs os.fork and"
+                                   " SO_REUSEPORT, which this platform"
+                                   " doesn't have")
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        if not isinstance(workers, int) or workers < 1:
+            raise JSONRPCException("Unexpected value for argument"
+                                   " 'workers': '{}'. Must be None or an int"
+                                   " of at least 1".format(workers))
+
+        # Bad framings and such fail here rather than in every worker
+        _split_kwargs(kwargs)
+
+        self.dispatcher = dispatcher
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.stats_interval = stats_interval
+        self.restart_delay = restart_delay
+        self.kwargs = kwargs
+        self.restarts = 0
+        self._socket = None
+        self._workers = {}          # pid: _Worker
+        self._next_start = {}       # index: earliest time to fork it again
+        self._selector = None
+        self._stopping = False
+        self._retired = None        # Metrics of workers that have exited
+
+    def start(self, timeout=START_TIMEOUT):
+        """
+        Reserve the port and fork the workers, returns once they're all
+            listening, or after 'timeout' seconds
+        Call poll() or run() after to supervise them
+        """
+        if self._socket is not None:
+            raise JSONRPCException("PreforkServer is already started")
+
+        family = socket.getaddrinfo(self.host, self.port,
+                                    type=socket.SOCK_STREAM,
+                                    flags=socket.AI_PASSIVE)[0][0]
+        self._socket = socket.socket(family, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        # Bound but never listening: it only holds the port, so workers can
+        #   be replaced without another process taking it
+        self._socket.bind((self.host or "", self.port))
+        self.port = self._socket.getsockname()[1]
+
+        self._selector = selectors.DefaultSelector()
+        self._stopping = False
+
+        for index in range(self.workers):
+            self._fork(index)
+
+        deadline = time.monotonic() + timeout
+        while not all(worker.ready for worker in self._workers.values()):
+            if time.monotonic() >= deadline:
+                LOGGER.warning("Workers aren't listening after %s seconds",
+                               timeout)
+                break
+            self.poll(0.01)
+
+    def poll(self, timeout=0):
+        """
+        Read the stats the workers have sent and fork any that have exited
+            again, waiting up to 'timeout' seconds for stats to arrive
+        """
+        if self._workers:
+            events = self._selector.select(timeout)
+        else:
+            time.sleep(timeout)
+            events = ()
+
+        for key, _ in events:
+            self._read_stats(key.data)
+
+        self._reap()
+
+        if not self._stopping:
+            now = time.monotonic()
+            running = {worker.index for worker in self._workers.values()}
+            for index in range(self.workers):
+                if index not in running and \
+                        self._next_start.get(index, 0) <= now:
+                    self.restarts += 1
+                    self._fork(index)
+
+    def run(self):
+        """
+        start() and supervise the workers until SIGTERM or SIGINT, then
+            stop() them
+        Must be called from the main thread
+        """
+        previous = {signum: signal.signal(signum, self._on_signal)
+                    for signum in (signal.SIGTERM, signal.SIGINT)}
+
+        try:
+            self.start()
+            while not self._stopping:
+                self.poll(self.stats_interval)
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+            self.stop()
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """
+        Ask every worker to stop with SIGTERM, wait up to 'timeout' seconds
+            for them to finish, then kill any that are left
+        """
+        self._stopping = True
+
+        for pid in self._workers:
+            _kill(pid, signal.SIGTERM)
+
+        deadline = time.monotonic() + timeout
+        while self._workers and time.monotonic() < deadline:
+            self.poll(0.05)
+
+        for pid in list(self._workers):
+            _kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self._retire(self._workers[pid])
+
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+            self._selector.close()
+
+    def stats(self):
+        """
+        Returns a Metrics object adding up those of every worker, current
+            and past, as of the last poll(), or None if the dispatcher has
+            no metrics
+        """
+        if self.dispatcher.metrics is None:
+            return None
+
+        total = Metrics(self.dispatcher.metrics.buckets)
+
+        for metrics in [self._retired] + [worker.metrics for worker
+                                          in self._workers.values()]:
+            if metrics is not None:
+                total.merge(metrics)
+
+        return total
+
+    def worker_pids(self):
+        """
+        Returns a list of the pids of the running workers
+        """
+        return list(self._workers)
+
+    def _on_signal(self, signum, frame):  # pylint: disable=unused-argument
+        """
+        Signal handler, ends run()
+        """
+        self._stopping = True
+
+    def _fork(self, index):
+        """
+        Fork worker number 'index'
+        """
+        self._next_start[index] = time.monotonic() + self.restart_delay
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+
+        if pid == 0:
+            os.close(read_fd)
+            self._run_worker(write_fd)
+
+        os.close(write_fd)
+        worker = _Worker(index, pid, read_fd)
+        self._workers[pid] = worker
+        self._selector.register(read_fd, selectors.EVENT_READ, worker)
+
+    def _read_stats(self, worker):
+        """
+        Read what 'worker' has sent, keeping the latest of its Metrics
+        """
+        try:
+            data = os.read(worker.stats_fd, 65536)
+        except OSError:
+            data = b""
+
+        if not data:
+            # The worker has closed its end, it's exiting, or it has exited
+            #   and there's nothing more to read
+            self._selector.unregister(worker.stats_fd)
+            return
+
+        frames = worker.decoder.feed_frames(data)
+        if frames:
+            worker.metrics = pickle.loads(frames[-1])
+            worker.ready = True
+
+    def _reap(self):
+        """
+        Collect the workers that have exited
+        """
+        for pid in list(self._workers):
+            done, status = os.waitpid(pid, os.WNOHANG)
+            if not done:
+                continue
+
+            worker = self._workers[pid]
+            if not self._stopping:
+                LOGGER.warning("Worker %d (pid %d) exited with status %d",
+                               worker.index, pid,
+                               os.waitstatus_to_exitcode(status))
+            self._retire(worker)
+
+    def _retire(self, worker):
+        """
+        Forget exited 'worker', keeping the last of its Metrics
+        """
+        # Anything it wrote before exiting is still in the pipe. Not blocking,
+        #   in case a process it forked holds the other end open
+        os.set_blocking(worker.stats_fd, False)
+        while worker.stats_fd in self._selector.get_map():
+            self._read_stats(worker)
+        os.close(worker.stats_fd)
+
+        if worker.metrics is not None:
+            if self._retired is None:
+                self._retired = Metrics(worker.metrics.buckets)
+            self._retired.merge(worker.metrics)
+
+        del self._workers[worker.pid]
+
+    def _run_worker(self, stats_fd):
+        """
+        Body of a worker process, never returns
+        """
+        status = 1
+
+        try:
+            # The supervisor's files aren't the worker's business
+            self._socket.close()
+            self._selector.close()
+            for worker in self._workers.values():
+                os.close(worker.stats_fd)
+
+            # A terminal's Ctrl+C reaches every process in the group, the
+            #   supervisor stops the workers in order instead
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+            asyncio.run(self._serve(stats_fd))
+            status = 0
+        except BaseException:  # pylint: disable=broad-except
+            LOGGER.exception("Worker process failed")
+        finally:
+            os._exit(status)  # pylint: disable=protected-access
+
+    async def _serve(self, stats_fd):
+        """
+        Serve on the port until SIGTERM, sending stats to the supervisor
+        """
+        loop = asyncio.get_running_loop()
+        stopping = asyncio.Event()
+        loop.add_signal_handler(signal.SIGTERM, stopping.set)
+
+        server = await serve_tcp(self.dispatcher, self.host, self.port,
+                                 reuse_port=True, **self.kwargs)
+        pipe, protocol = await loop.connect_write_pipe(
+            _StatsPipe, os.fdopen(stats_fd, "wb", buffering=0))
+        # The first stats tell the supervisor this worker is listening
+        self._send_stats(pipe, force=True)
+
+        try:
+            while not stopping.is_set():
+                try:
+                    await asyncio.wait_for(stopping.wait(),
+                                           self.stats_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._send_stats(pipe)
+        finally:
+            server.close()
+            await server.wait_closed()
+
+            if isinstance(self.dispatcher, AsyncDispatcher):
+                self.dispatcher.close()
+
+            self._send_stats(pipe, force=True)
+            pipe.close()
+            try:
+                await asyncio.wait_for(protocol.closed, self.stats_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def _send_stats(self, pipe, force=False):
+        """
+        Send the dispatcher's metrics to the supervisor, unless the last
+            ones haven't been read yet and not 'force'. Without metrics
+            only a forced send is made, of None
+        """
+        metrics = self.dispatcher.metrics
+
+        if not force and (metrics is None or pipe.get_write_buffer_size()):
+            return
+
+        pipe.write(LengthPrefixDecoder.frame(pickle.dumps(metrics)))
+
+
+def _kill(pid, signum):
+    """
+    Send 'signum' to process 'pid', if it still exists
+    """
+    try:
+        os.kill(pid, signum)
+    except ProcessLookupError:
+        pass
@@ -0,0 +1,295 @@
+"""
+JSON-RPC proxy for the JSON-RPC module
+Routes requests by method name prefix to pools of backend servers
+
+The MIT License (MIT)
+
+Copyright (c) 2016 RPiAwesomneness
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import logging
+from time import perf_counter
+
+from . import JSONRPCException, codec, generate_error
+from .client import ClientPool
+from .dispatcher import AsyncDispatcher
+from .lazy import LazyPacket, _check_lazy_json
+
+
+LOGGER = logging.getLogger(__name__)
+
+
+class _RawResponse:
+    """
+    A response that's already JSON, sent back as it is
+    Works wherever the server expects a packet object
+    """
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    def serialize(self, dumps=None):
+        """
+        Returns the response as bytes, re-encoded with 'dumps' if it's given
+        """
+        if dumps is None:
+            return self.data
+        return dumps(codec.loads(self.data))
+
+
+class JSONRPCProxy(AsyncDispatcher):
+    """
+    JSON-RPC proxy, balancing requests over backend servers by method
+
+    'routes' maps a method name prefix to the backends that serve the
+    methods starting with it, either a list of endpoints as ClientPool
+    takes them or a ClientPool of its own. The longest prefix that
+    matches wins, and the prefix "" catches every method no other prefix
+    matches. Methods no prefix matches get a -32601 "Method not found".
+
+    Each request goes to the connection of its pool with the fewest
+    requests in flight, so a slow backend gets less work rather than the
+    same share. Requests are forwarded under an id of the upstream
+    connection, so any number of clients share the same connections, and
+    the response gets the client's id back.
+
+    Packets are decoded and encoded again on the way through, which is
+    the quickest with any codec backend. With 'lazy' True they're parsed
+    with lazy_parse instead, and params and results are copied as bytes,
+    never decoded. That takes more time, but keeps large bodies out of
+    memory.
+
+    The elements of a batch are routed one by one, to different backends
+    if their methods say so, and the responses are put back together in
+    request order. With 'batch_window' in 'kwargs' the elements bound for
+    the same connection are sent on as one batch.
+
+    A backend that can't be reached, or doesn't answer within 'timeout'
+    seconds, gets the request a -32603 "Internal error" whose 'data'
+    says why.
+
+    It's an AsyncDispatcher, so it's served with serve_tcp or serve_unix,
+    and methods registered on it are answered by the proxy itself, such
+    as a health check. 'validation' and 'metrics' are as for Dispatcher.
+    Forwarded calls are recorded under their route, its prefix followed
+    by "*", never under the method name a client chose, and timed from
+    the request being forwarded to the response coming back. Error
+    responses from backends are counted by their code.
+
+    Arguments:
+        'routes':       REQUIRED, dict of method name prefix to a list of
+                            endpoints or a ClientPool
+        'timeout':      OPTIONAL, seconds to wait for a backend, default
+                            None, wait as long as it takes
+        'size':         OPTIONAL, connections per endpoint, default 1
+        'retry_delay':  OPTIONAL, seconds before reconnecting to a backend
+                            that failed, default 1.0
+        'concurrency':  OPTIONAL, as for AsyncDispatcher
+        'lazy':         OPTIONAL, forward params and results undecoded,
+                            default False
+        'kwargs':       OPTIONAL, passed on to every ClientPool made here
+
+    Example:
+        proxy = jrpc_helper.JSONRPCProxy({
+            "users.": [("10.0.0.1", 4000), ("10.0.0.2", 4000)],
+            "": [("10.0.0.3", 4000)]}, timeout=5)
+        server = await jrpc_helper.serve_tcp(proxy, "0.0.0.0", 4000)
+    """
+
+    def __init__(self, routes, timeout=None, size=1, retry_delay=1.0,
+                 concurrency=None, validation=None, metrics=None, lazy=False,
+                 **kwargs):
+        super().__init__(concurrency, validation, metrics)
+
+        if not isinstance(routes, dict) or not routes:
+            raise JSONRPCException("Unexpected value for argument 'routes':"
+                                   " '{}'. Must be a non-empty"
+                                   " dict".format(routes))
+
+        self.timeout = timeout
+        self.lazy = lazy
+        self.routes = {}
+        # Metrics name of each route
+        self._labels = {}
+
+        for prefix, backends in routes.items():
+            if not isinstance(prefix, str):
+                raise JSONRPCException("Unexpected data type for route"
+                                       " prefix: '{}'. Must be type"
+                                       " {}".format(type(prefix), str))
+            if not isinstance(backends, ClientPool):
+                backends = ClientPool(backends, size=size,
+                                      retry_delay=retry_delay, lazy=lazy,
+                                      **kwargs)
+            self.routes[prefix] = backends
+            self._labels[prefix] = prefix + "*"
+
+        # Longest first, so the first that matches is the most specific
+        self._prefixes = sorted(self.routes, key=len, reverse=True)
+
+        if lazy:
+            self._parse = _check_lazy_json
+
+    def route(self, method):
+        """
+        Returns the ClientPool for 'method', or None if no prefix matches
+        """
+        prefix = self._match(method)
+        return None if prefix is None else self.routes[prefix]
+
+    def _match(self, method):
+        """
+        Returns the longest route prefix 'method' starts with, or None
+        """
+        for prefix in self._prefixes:
+            if method.startswith(prefix):
+                return prefix
+        return None
+
+    def close(self, wait=True):
+        """
+        Close every backend connection, and shut down pools as
+            AsyncDispatcher.close does
+        """
+        for pool in self.routes.values():
+            pool.close()
+        super().close(wait)
+
+    async def dispatch(self, packet):
+        """
+        Forward a request, notification or batch of them
+        Returns the response to send back, as AsyncDispatcher.dispatch
+        """
+        success, data = self._decode(packet)
+
+        if not success:
+            return data
+
+        if not isinstance(data, list):
+            return await self._dispatch_one(data)
+
+        if self.concurrency is None or len(data) <= self.concurrency:
+            responses = await asyncio.gather(
+                *[self._dispatch_one(item) for item in data])
+        else:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            responses = await asyncio.gather(
+                *[self._dispatch_limited(item, semaphore) for item in data])
+
+        # Backend responses are JSON already, so they're joined as they are
+        parts = [response.serialize() for response in responses
+                 if response is not None]
+
+        if not parts:
+            return None
+
+        return _RawResponse(b"[" + b",".join(parts) + b"]")
+
+    async def _dispatch_one(self, data):
+        """
+        Forward a single decoded request or notification, or answer it here
+            if it's for a method registered on the proxy
+        """
+        if type(data) is LazyPacket:  # pylint: disable=C0123
+            try:
+                shape = data.shape()
+            except JSONRPCException:
+                return generate_error(-32700)
+        elif isinstance(data, dict):
+            shape = data
+        else:
+            # Not an object, refused as any dispatcher refuses it
+            return await super()._dispatch_one(data)
+
+        method = shape.get("method")
+
+        if isinstance(method, str) and method in self.methods:
+            if data is not shape:
+                # Answered here, so it's decoded like any other request
+                try:
+                    data = data.decode()
+                except JSONRPCException:
+                    return generate_error(-32700)
+            return await super()._dispatch_one(data)
+
+        metrics = self.metrics
+        is_notif = "id" not in shape
+        response = self._check_envelope(shape, self._level(), is_notif)
+
+        if response is not None:
+            if metrics is not None:
+                metrics.observe_response(response)
+            return response
+
+        response_id = None if is_notif else shape["id"]
+        prefix = self._match(method)
+
+        if prefix is None:
+            response = None if is_notif else \
+                generate_error(-32601, response_id)
+            if metrics is not None:
+                metrics.observe_response(response)
+            return response
+
+        if metrics is not None:
+            start = perf_counter()
+
+        upstream = None
+
+        try:
+            client = await self.routes[prefix].get_client()
+            upstream = await client.forward(data, self.timeout)
+        except codec.ENCODE_ERRORS:
+            # Decoded from MessagePack, with values JSON can't carry
+            response = generate_error(-32600, response_id)
+        except asyncio.TimeoutError:
+            LOGGER.warning("Backend timed out on method '%s'", method)
+            response = generate_error(-32603, response_id,
+                                      data="Backend timed out")
+        except (JSONRPCException, OSError) as exception:
+            LOGGER.warning("Backend failed on method '%s': %s", method,
+                           exception)
+            response = generate_error(-32603, response_id,
+                                      data="Backend unavailable")
+        else:
+            response = None if is_notif else \
+                _RawResponse(_restore_id(upstream, response_id))
+
+        if metrics is not None:
+            label = self._labels[prefix]
+            metrics.observe_call(label, perf_counter() - start, response)
+            error = None if upstream is None else upstream.get("error")
+            if isinstance(error, dict):
+                metrics.observe_error(error.get("code"), label)
+
+        return None if is_notif else response
+
+
+def _restore_id(response, response_id):
+    """
+    Returns upstream 'response' as JSON, with the client's 'response_id'
+        in place of the id of the upstream connection
+    """
+    if type(response) is LazyPacket:  # pylint: disable=C0123
+        return response.replace("id", response_id)
+    return codec.dumps(dict(response, id=response_id))
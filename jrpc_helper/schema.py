@@ -0,0 +1,502 @@
+"""
+Params schemas for the JSON-RPC module
+Compiles a schema once into a validator function, so checking the params
+of every request is just a few calls rather than a walk over the schema
+
+The MIT License (MIT)
+
+Copyright (c) 2016 RPiAwesomneness
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import dataclasses
+import inspect
+import re
+import types
+import typing
+
+from . import JSONRPCException
+
+
+_NONE_TYPE = type(None)
+
+# JSON-Schema "type" names and a test for each
+_JSON_TYPES = {
+    "null": lambda value: value is None,
+    "boolean": lambda value: isinstance(value, bool),
+    "integer": lambda value: (isinstance(value, int) and
+                              not isinstance(value, bool)),
+    "number": lambda value: (isinstance(value, (int, float)) and
+                             not isinstance(value, bool)),
+    "string": lambda value: isinstance(value, str),
+    "array": lambda value: isinstance(value, list),
+    "object": lambda value: isinstance(value, dict)
+}
+
+# Keywords that only describe a schema, they are accepted and ignored
+_ANNOTATIONS = frozenset(("$schema", "$id", "$comment", "title",
+                          "description", "default", "examples",
+                          "deprecated", "readOnly", "writeOnly"))
+
+_KEYWORDS = frozenset(("type", "enum", "const", "anyOf", "minimum",
+                       "maximum", "exclusiveMinimum", "exclusiveMaximum",
+                       "minLength", "maxLength", "pattern", "items",
+                       "minItems", "maxItems", "properties", "required",
+                       "additionalProperties")) | _ANNOTATIONS
+
+
+def _json_type_name(value):
+    """
+    Returns the JSON-Schema type name of 'value', for error messages
+    """
+    for name in ("null", "boolean", "integer", "number", "string", "array",
+                 "object"):
+        if _JSON_TYPES[name](value):
+            return name
+    return type(value).__name__
+
+
+def _all_of(checks):
+    """
+    Combine a list of checks into one that runs them in order
+    Every check takes a value and returns None if it passes, otherwise the
+        error message, starting with the path below the value if any
+    """
+    checks = [check for check in checks if check is not None]
+
+    if not checks:
+        return None
+    if len(checks) == 1:
+        return checks[0]
+
+    def check_all(value):
+        for check in checks:
+            message = check(value)
+            if message is not None:
+                return message
+        return None
+
+    return check_all
+
+
+def _any_of(checks, description):
+    """
+    Combine a list of checks into one that passes if any of them does
+    """
+    if any(check is None for check in checks):
+        return None
+
+    def check_any(value):
+        for check in checks:
+            if check(value) is None:
+                return None
+        return ": expected {}, got {}".format(description,
+                                              _json_type_name(value))
+
+    return check_any
+
+
+def _type_check(names):
+    """
+    Returns a check that the value is one of the JSON-Schema types 'names'
+    """
+    for name in names:
+        if name not in _JSON_TYPES:
+            raise JSONRPCException("Unknown JSON-Schema type"
+                                   " '{}'".format(name))
+
+    tests = [_JSON_TYPES[name] for name in names]
+    description = " or ".join(names)
+
+    if len(tests) == 1:
+        test = tests[0]
+
+        def check_type(value):
+            if not test(value):
+                return ": expected {}, got {}".format(description,
+                                                      _json_type_name(value))
+            return None
+    else:
+        def check_type(value):
+            for test in tests:
+                if test(value):
+                    return None
+            return ": expected {}, got {}".format(description,
+                                                  _json_type_name(value))
+
+    return check_type
+
+
+def _items_check(item_check):
+    """
+    Returns a check that applies 'item_check' to every element of a list
+    """
+    def check_items(value):
+        if isinstance(value, list):
+            for index, item in enumerate(value):
+                message = item_check(item)
+                if message is not None:
+                    return "[{}]{}".format(index, message)
+        return None
+
+    return check_items
+
+
+def _values_check(value_check):
+    """
+    Returns a check that applies 'value_check' to every value of a dict
+    """
+    def check_values(value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                message = value_check(item)
+                if message is not None:
+                    return ".{}{}".format(key, message)
+        return None
+
+    return check_values
+
+
+def _object_check(properties, required, additional):
+    """
+    Returns a check of a dict's keys and values
+        'properties':   dict of key to check (or None) of its value
+        'required':     keys that MUST be present
+        'additional':   True to allow other keys, False to forbid them, or
+                            a check of their values
+    """
+    # Declared keys are known even if their values aren't checked
+    known = frozenset(properties) | frozenset(required)
+    properties = [(key, check) for key, check in properties.items()
+                  if check is not None]
+    required = tuple(required)
+
+    def check_object(value):
+        if not isinstance(value, dict):
+            return None
+
+        for key in required:
+            if key not in value:
+                return ": missing required key '{}'".format(key)
+
+        for key, check in properties:
+            if key in value:
+                message = check(value[key])
+                if message is not None:
+                    return ".{}{}".format(key, message)
+
+        if additional is not True:
+            for key in value.keys() - known:
+                if additional is False:
+                    return ": unexpected key '{}'".format(key)
+                message = additional(value[key])
+                if message is not None:
+                    return ".{}{}".format(key, message)
+
+        return None
+
+    return check_object
+
+
+def _bounds_check(schema):
+    """
+    Returns a check of the numeric, length and pattern keywords in 'schema'
+    Each only applies to values of its own type, as in JSON-Schema
+    """
+    checks = []
+    is_number = _JSON_TYPES["number"]
+
+    for keyword, test, text in (
+            ("minimum", lambda value, bound: value >= bound, ">="),
+            ("maximum", lambda value, bound: value <= bound, "<="),
+            ("exclusiveMinimum", lambda value, bound: value > bound, ">"),
+            ("exclusiveMaximum", lambda value, bound: value < bound, "<")):
+        if keyword in schema:
+            def check_number(value, bound=schema[keyword], test=test,
+                             text=text):
+                if is_number(value) and not test(value, bound):
+                    return ": expected a number {} {}, got {}".format(
+                        text, bound, value)
+                return None
+            checks.append(check_number)
+
+    for keyword, kinds, test, text in (
+            ("minLength", str, lambda size, bound: size >= bound, "at least"),
+            ("maxLength", str, lambda size, bound: size <= bound, "at most"),
+            ("minItems", list, lambda size, bound: size >= bound, "at least"),
+            ("maxItems", list, lambda size, bound: size <= bound, "at most")):
+        if keyword in schema:
+            def check_length(value, bound=schema[keyword], kinds=kinds,
+                             test=test, text=text):
+                if isinstance(value, kinds) and not test(len(value), bound):
+                    return ": expected a length of {} {}, got {}".format(
+                        text, bound, len(value))
+                return None
+            checks.append(check_length)
+
+    if "pattern" in schema:
+        pattern = re.compile(schema["pattern"])
+
+        def check_pattern(value):
+            if isinstance(value, str) and pattern.search(value) is None:
+                return ": expected a string matching '{}'".format(
+                    pattern.pattern)
+            return None
+        checks.append(check_pattern)
+
+    return _all_of(checks)
+
+
+def _compile_json_schema(schema):
+    """
+    Compile a JSON-Schema (the subset in _KEYWORDS) into a check
+    """
+    if schema is True:
+        return None
+    if schema is False:
+        return lambda value: ": no value is allowed"
+    if not isinstance(schema, dict):
+        raise JSONRPCException("Unexpected data type for JSON-Schema: '{}'."
+                               " Must be type {} or {}".format(
+                                   type(schema), dict, bool))
+
+    unsupported = schema.keys() - _KEYWORDS
+    if unsupported:
+        raise JSONRPCException("Unsupported JSON-Schema keywords: {}".format(
+            ", ".join(sorted(unsupported))))
+
+    checks = []
+
+    if "type" in schema:
+        names = schema["type"]
+        checks.append(_type_check([names] if isinstance(names, str)
+                                  else names))
+
+    if "enum" in schema or "const" in schema:
+        allowed = schema["enum"] if "enum" in schema else [schema["const"]]
+
+        def check_enum(value):
+            # bool == int in Python, but not in JSON
+            for option in allowed:
+                if value == option and \
+                        isinstance(value, bool) == isinstance(option, bool):
+                    return None
+            return ": expected one of {!r}, got {!r}".format(allowed, value)
+        checks.append(check_enum)
+
+    if "anyOf" in schema:
+        checks.append(_any_of([_compile_json_schema(option)
+                               for option in schema["anyOf"]],
+                              "a value matching anyOf"))
+
+    checks.append(_bounds_check(schema))
+
+    if "items" in schema:
+        item_check = _compile_json_schema(schema["items"])
+        if item_check is not None:
+            checks.append(_items_check(item_check))
+
+    if "properties" in schema or "required" in schema or \
+            "additionalProperties" in schema:
+        additional = schema.get("additionalProperties", True)
+        if additional is not True and additional is not False:
+            additional = _compile_json_schema(additional) or True
+        checks.append(_object_check(
+            {key: _compile_json_schema(value) for key, value in
+             schema.get("properties", {}).items()},
+            schema.get("required", ()), additional))
+
+    return _all_of(checks)
+
+
+def _compile_hint(hint):
+    """
+    Compile a type hint (int, str, list[int], Optional[str], a dataclass...)
+    into a check
+    """
+    if hint is typing.Any or hint is object or hint is inspect.Parameter.empty:
+        return None
+    if hint is None or hint is _NONE_TYPE:
+        return _type_check(["null"])
+    if hint is bool:
+        return _type_check(["boolean"])
+    if hint is int:
+        return _type_check(["integer"])
+    if hint is float:
+        # JSON has no separate int and float, 1 is a fine float
+        return _type_check(["number"])
+    if hint is str:
+        return _type_check(["string"])
+    if dataclasses.is_dataclass(hint) and isinstance(hint, type):
+        return _compile_dataclass(hint)
+
+    origin = typing.get_origin(hint)
+    args = typing.get_args(hint)
+
+    if hint is list or origin is list:
+        item_check = _compile_hint(args[0]) if args else None
+        return _all_of([_type_check(["array"]),
+                        item_check and _items_check(item_check)])
+    if hint is dict or origin is dict:
+        value_check = _compile_hint(args[1]) if len(args) == 2 else None
+        return _all_of([_type_check(["object"]),
+                        value_check and _values_check(value_check)])
+    if origin is typing.Union or (hasattr(types, "UnionType") and
+                                  isinstance(hint, types.UnionType)):
+        options = [arg for arg in args if arg is not _NONE_TYPE]
+        if len(options) == 1:
+            # Optional[X], report why X failed rather than just the types
+            check = _compile_hint(options[0])
+            if check is None:
+                return None
+            return lambda value: None if value is None else check(value)
+        return _any_of([_compile_hint(arg) for arg in args],
+                       " or ".join(getattr(arg, "__name__", str(arg))
+                                   for arg in args))
+    if origin is typing.Literal:
+        return _compile_json_schema({"enum": list(args)})
+
+    raise JSONRPCException("Unsupported type hint for params:"
+                           " {!r}".format(hint))
+
+
+def _compile_dataclass(cls):
+    """
+    Compile a dataclass into a check of a dict with a key per field
+    Fields without a default are required, other keys aren't allowed
+    """
+    hints = typing.get_type_hints(cls)
+    properties = {}
+    required = []
+
+    for field in dataclasses.fields(cls):
+        properties[field.name] = _compile_hint(hints.get(field.name,
+                                                         typing.Any))
+        if field.default is dataclasses.MISSING and \
+                field.default_factory is dataclasses.MISSING:
+            required.append(field.name)
+
+    return _all_of([_type_check(["object"]),
+                    _object_check(properties, required, False)])
+
+
+def _compile_signature(func):
+    """
+    Compile the type hints of the parameters of 'func' into a check of
+    list (positional) or dict (by name) params. Which arguments are missing
+    or unexpected is left to the dispatcher's binding
+    """
+    hints = typing.get_type_hints(func)
+    positional = []
+    by_name = {}
+    var_positional = var_keyword = None
+
+    for param in inspect.signature(func).parameters.values():
+        check = _compile_hint(hints.get(param.name, typing.Any))
+
+        if param.kind is param.VAR_POSITIONAL:
+            var_positional = check
+        elif param.kind is param.VAR_KEYWORD:
+            var_keyword = check
+        else:
+            if param.kind is not param.KEYWORD_ONLY:
+                positional.append((param.name, check))
+            if param.kind is not param.POSITIONAL_ONLY:
+                by_name[param.name] = check
+
+    if not any(check for _, check in positional) and \
+            not any(by_name.values()) and var_positional is None and \
+            var_keyword is None:
+        return None
+
+    def check_params(params):
+        if isinstance(params, list):
+            for index, value in enumerate(params):
+                if index < len(positional):
+                    name, check = positional[index]
+                else:
+                    name, check = index, var_positional
+                if check is not None:
+                    message = check(value)
+                    if message is not None:
+                        return "[{}]{}".format(index, message)
+
+        elif isinstance(params, dict):
+            for name, value in params.items():
+                check = by_name.get(name, var_keyword)
+                if check is not None:
+                    message = check(value)
+                    if message is not None:
+                        return ".{}{}".format(name, message)
+
+        return None
+
+    return check_params
+
+
+def compile_schema(schema):
+    """
+    Compile a schema for a method's params into a validator function
+
+    Arguments:
+        'schema':   REQUIRED, one of
+                        - a JSON-Schema, as a dict. The supported keywords
+                            are type, enum, const, anyOf, minimum, maximum,
+                            exclusiveMinimum, exclusiveMaximum, minLength,
+                            maxLength, pattern, items, minItems, maxItems,
+                            properties, required and additionalProperties
+                        - a dataclass, params must be a dict with a key for
+                            each field without a default, and no others
+                        - a function, whose parameters' type hints are
+                            checked against list or dict params
+                        - a type hint, such as dict or list[int]
+    Returns validator(params), which returns None if 'params' passes or a
+        message saying where and why it fails, such as
+        "params.rows[3]: expected integer, got string"
+    Raises JSONRPCException if the schema can't be compiled
+
+    Example:
+        validate = jrpc_helper.compile_schema({
+            "type": "object",
+            "properties": {"towel": {"type": "integer", "minimum": 0}},
+            "required": ["towel"]
+        })
+        validate({"towel": -1})   # "params.towel: expected a number >= 0..."
+    """
+    if isinstance(schema, (dict, bool)):
+        check = _compile_json_schema(schema)
+    elif inspect.isfunction(schema) or inspect.ismethod(schema):
+        check = _compile_signature(schema)
+    else:
+        check = _compile_hint(schema)
+
+    if check is None:
+        return lambda params: None
+
+    def validate(params):
+        """
+        Returns None if 'params' passes, otherwise the error message
+        """
+        message = check(params)
+        if message is not None:
+            return "params" + message
+        return None
+
+    return validate
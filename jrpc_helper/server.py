@@ -0,0 +1,344 @@
+"""
+asyncio server for the JSON-RPC module
+Serves a Dispatcher over TCP or Unix domain sockets, many requests in
+flight per connection, each response written as soon as it's ready
+
+The MIT License (MIT)
+
+Copyright (c) 2016 RPiAwesomneness
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+import asyncio
+import logging
+from time import perf_counter
+
+from . import (JSONRPCException, JSONRPCError, JSONRPCBatch, codec,
+               generate_error, generate_error_bytes)
+from .binary import (packb, pack_array, unpackb, detect_encoding,
+                     check_encoding)
+from .dispatcher import AsyncDispatcher
+from .framing import MAX_FRAME_SIZE, get_decoder
+
+
+LOGGER = logging.getLogger(__name__)
+
+# Default number of requests in flight on a connection before it stops
+#   reading more
+MAX_PENDING = 128
+
+# Default transport write buffer limits, in bytes. Above 'high' the
+#   connection stops reading requests until the buffer drains below 'low'
+WRITE_BUFFER_HIGH = 256 * 1024
+WRITE_BUFFER_LOW = 64 * 1024
+
+
+class JSONRPCServerProtocol(asyncio.Protocol):
+    """
+    One connection of a JSON-RPC server
+
+    Every frame received is dispatched straight away, without waiting for
+    the requests before it to finish, so one connection can pipeline many
+    requests. Responses are written in the order they complete, clients
+    match them to requests by 'id'. An AsyncDispatcher runs each request
+    as its own task, a plain Dispatcher runs it inline as it's read.
+
+    Backpressure: reading stops while 'max_pending' requests are in
+    flight, or while the transport's write buffer is above its high-water
+    mark because the client isn't reading its responses, and starts again
+    once both have gone back down.
+
+    A frame that can't be decoded, such as one bigger than 'max_frame',
+    gets a -32700 "Parse error" and the connection is closed, since there
+    is no telling where the next frame starts.
+
+    Packets are JSON text, or MessagePack with 'encoding' "msgpack", which
+    is smaller for numbers and carries byte strings as they are, and is
+    checked and dispatched as decoded, never turned into JSON. "auto"
+    answers each connection in the encoding of the first frame it sends.
+    Binary encodings need a framing from binary.BINARY_FRAMINGS.
+
+    Arguments:
+        'dispatcher':           REQUIRED, Dispatcher or AsyncDispatcher
+        'framing':              OPTIONAL, name of the framing, see
+                                    jrpc_helper.framing.DECODERS, default
+                                    "newline"
+        'max_frame':            OPTIONAL, largest frame in bytes, default
+                                    framing.MAX_FRAME_SIZE
+        'max_pending':          OPTIONAL, requests in flight before reading
+                                    pauses, default MAX_PENDING
+        'write_buffer_high':    OPTIONAL, write buffer high-water mark in
+                                    bytes, default WRITE_BUFFER_HIGH
+        'write_buffer_low':     OPTIONAL, write buffer low-water mark in
+                                    bytes, default WRITE_BUFFER_LOW
+        'encoding':             OPTIONAL, "json", "msgpack" or "auto",
+                                    default "json"
+    """
+
+    def __init__(self, dispatcher, framing="newline",
+                 max_frame=MAX_FRAME_SIZE, max_pending=MAX_PENDING,
+                 write_buffer_high=WRITE_BUFFER_HIGH,
+                 write_buffer_low=WRITE_BUFFER_LOW, encoding="json"):
+        check_encoding(encoding, framing, allow_auto=True)
+
+        self.dispatcher = dispatcher
+        self.decoder = get_decoder(framing, max_frame)
+        self.encoding = encoding
+        self.max_pending = max_pending
+        self.write_buffer_limits = (write_buffer_high, write_buffer_low)
+        self.transport = None
+        self.pending = set()
+        self._is_async = isinstance(dispatcher, AsyncDispatcher)
+        self._write_paused = False
+        self._read_paused = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        high, low = self.write_buffer_limits
+        transport.set_write_buffer_limits(high=high, low=low)
+
+    def connection_lost(self, exc):
+        for task in self.pending:
+            task.cancel()
+        self.pending.clear()
+        self.transport = None
+
+    def data_received(self, data):
+        try:
+            frames = self.decoder.feed_frames(data)
+        except JSONRPCException as exception:
+            LOGGER.warning("Closing connection: %s", exception.message)
+            self.transport.write(self.decoder.frame(
+                generate_error_bytes(-32700)))
+            self.transport.close()
+            return
+
+        if frames and self.encoding == "auto":
+            self.encoding = detect_encoding(frames[0])
+
+        if self.encoding == "msgpack":
+            frames = [self._unpack(frame) for frame in frames]
+
+        if self._is_async:
+            loop = asyncio.get_running_loop()
+            for frame in frames:
+                task = loop.create_task(self._dispatch(frame))
+                self.pending.add(task)
+                task.add_done_callback(self._done)
+            self._update_reading()
+        else:
+            for frame in frames:
+                if not isinstance(frame, JSONRPCError):
+                    try:
+                        frame = self.dispatcher.dispatch(frame)
+                    except Exception:  # pylint: disable=broad-except
+                        LOGGER.exception("Dispatching a request failed")
+                        frame = generate_error(-32603)
+                self._write(frame)
+
+    def pause_writing(self):
+        self._write_paused = True
+        self._update_reading()
+
+    def resume_writing(self):
+        self._write_paused = False
+        self._update_reading()
+
+    @staticmethod
+    def _unpack(frame):
+        """
+        Returns MessagePack 'frame' decoded for the dispatcher, or the error
+            to answer it with if it isn't a packet or a batch
+        """
+        try:
+            data = unpackb(frame)
+        except ValueError:
+            return generate_error(-32700)
+
+        # A str would be taken for JSON text
+        if not isinstance(data, (dict, list)):
+            return generate_error(-32600)
+
+        return data
+
+    async def _dispatch(self, frame):
+        """
+        Dispatch one frame with the AsyncDispatcher and write its response
+        """
+        if isinstance(frame, JSONRPCError):
+            # A frame that couldn't be decoded, already answered
+            self._write(frame)
+            return
+
+        try:
+            response = await self.dispatcher.dispatch(frame)
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception("Dispatching a request failed")
+            response = generate_error(-32603)
+
+        self._write(response)
+
+    def _write(self, response):
+        """
+        Frame and write 'response', if there is one and it can still be sent
+        """
+        if response is None or self.transport is None or \
+                self.transport.is_closing():
+            return
+
+        metrics = self.dispatcher.metrics
+        dumps = packb if self.encoding == "msgpack" else None
+
+        if metrics is None:
+            data = _serialize(response, dumps)
+        else:
+            start = perf_counter()
+            data = _serialize(response, dumps)
+            metrics.observe_stage("serialize", perf_counter() - start)
+
+        self.transport.write(self.decoder.frame(data))
+
+    def _done(self, task):
+        """
+        Forget a finished request task and see if reading can resume
+        """
+        self.pending.discard(task)
+
+        if not task.cancelled() and task.exception() is not None:
+            LOGGER.error("Dispatching a request failed",
+                         exc_info=task.exception())
+
+        self._update_reading()
+
+    def _update_reading(self):
+        """
+        Pause or resume reading from the transport to match the backpressure
+        """
+        if self.transport is None or self.transport.is_closing():
+            return
+
+        should_pause = self._write_paused or \
+            len(self.pending) >= self.max_pending
+
+        if should_pause and not self._read_paused:
+            self.transport.pause_reading()
+            self._read_paused = True
+        elif not should_pause and self._read_paused:
+            self.transport.resume_reading()
+            self._read_paused = False
+
+
+def _serialize(response, dumps):
+    """
+    Returns 'response' encoded with 'dumps', None for JSON
+    A response whose result can't be encoded, which only shows once it
+        is, is replaced by a -32603 "Internal error" for its id, in a batch
+        only the elements that can't be
+    """
+    try:
+        return response.serialize(dumps)
+    except codec.ENCODE_ERRORS:
+        if not isinstance(response, JSONRPCBatch):
+            LOGGER.error("Response can't be encoded: %r", response)
+            return generate_error(-32603, getattr(
+                response, "response_id", None)).serialize(dumps)
+
+    items = [_serialize_packet(item[1], dumps) for item in response.items]
+
+    if dumps is not None:
+        return pack_array(items)
+    return b"[" + b",".join(items) + b"]"
+
+
+def _serialize_packet(packet, dumps):
+    """
+    Returns batch element 'packet' encoded with 'dumps', None for JSON, or
+        a -32603 "Internal error" for its id if it can't be encoded
+    """
+    try:
+        return (dumps or codec.dumps)(packet)
+    except codec.ENCODE_ERRORS:
+        LOGGER.error("Response can't be encoded: %r", packet)
+        return generate_error(-32603, packet.get("id")).serialize(dumps)
+
+
+async def serve_tcp(dispatcher, host=None, port=None, **kwargs):
+    """
+    Start a JSON-RPC server on a TCP socket
+    Arguments:
+        'dispatcher':   REQUIRED, Dispatcher or AsyncDispatcher
+        'host':         OPTIONAL, address(es) to listen on, default all
+        'port':         OPTIONAL, port to listen on, default one the OS picks
+        'kwargs':       OPTIONAL, passed on to JSONRPCServerProtocol, apart
+                            from those asyncio's create_server takes (such as
+                            'ssl', 'backlog' or 'reuse_port')
+    Returns the asyncio.Server, already serving
+
+    Example:
+        server = await jrpc_helper.serve_tcp(dispatcher, "127.0.0.1", 4000)
+        async with server:
+            await server.serve_forever()
+    """
+    protocol_kwargs, server_kwargs = _split_kwargs(kwargs)
+
+    return await asyncio.get_running_loop().create_server(
+        lambda: JSONRPCServerProtocol(dispatcher, **protocol_kwargs),
+        host, port, **server_kwargs)
+
+
+async def serve_unix(dispatcher, path, **kwargs):
+    """
+    Start a JSON-RPC server on a Unix domain socket
+    Arguments:
+        'dispatcher':   REQUIRED, Dispatcher or AsyncDispatcher
+        'path':         REQUIRED, filesystem path of the socket
+        'kwargs':       OPTIONAL, as for serve_tcp
+    Returns the asyncio.Server, already serving
+    """
+    protocol_kwargs, server_kwargs = _split_kwargs(kwargs)
+
+    return await asyncio.get_running_loop().create_unix_server(
+        lambda: JSONRPCServerProtocol(dispatcher, **protocol_kwargs),
+        path, **server_kwargs)
+
+
+_PROTOCOL_KWARGS = frozenset(("framing", "max_frame", "max_pending",
+                              "write_buffer_high", "write_buffer_low",
+                              "encoding"))
+
+
+def _split_kwargs(kwargs):
+    """
+    Split keyword arguments into those for JSONRPCServerProtocol and those
+    for asyncio's create_server
+    Raises JSONRPCException for an unknown framing or encoding, before the
+        socket is bound rather than on the first connection
+    """
+    protocol_kwargs = {key: value for key, value in kwargs.items()
+                       if key in _PROTOCOL_KWARGS}
+    server_kwargs = {key: value for key, value in kwargs.items()
+                     if key not in _PROTOCOL_KWARGS}
+
+    framing = protocol_kwargs.get("framing", "newline")
+    get_decoder(framing)
+    check_encoding(protocol_kwargs.get("encoding", "json"), framing,
+                   allow_auto=True)
+
+    return protocol_kwargs, server_kwargs
@@ -0,0 +1,167 @@
+"""
+Streaming responses for the JSON-RPC module
+Writes result packets whose result is too big to build in memory
+
+The MIT License (MIT)
+
+Copyright (c) 2016 RPiAwesomneness
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+from . import JSONRPCException, codec
+
+
+# Default number of bytes gathered before each write, 64 KiB
+CHUNK_SIZE = 64 * 1024
+
+
+class JSONRPCResultStream:
+    """
+    JSON-RPC Result stream object, a result packet whose result is a JSON
+    array of the values produced by an iterable, encoded a chunk at a time
+
+    Neither the whole result nor the whole encoded packet is ever held in
+    memory: the envelope is written first, then the values are encoded as
+    the iterable produces them, so the first bytes can go out before the
+    last value even exists. The result can only be iterated over once.
+
+    Arguments:
+        'items':        REQUIRED, iterable (a generator is fine) of JSON
+                            values, the elements of the result array
+        'response_id':  REQUIRED, otherwise it will be set to None/NULL
+        'chunk_size':   OPTIONAL, number of bytes gathered before each
+                            write, default CHUNK_SIZE
+        'terminator':   OPTIONAL, bytes written after the packet, such as
+                            b"\\n" for newline-delimited framing, default b""
+
+    Example:
+        stream = jrpc_helper.JSONRPCResultStream(
+            (row for row in huge_query()), response_id=7, terminator=b"\\n")
+        stream.write_to(sock.makefile("wb"))
+    """
+    __slots__ = ("items", "response_id", "chunk_size", "terminator")
+    type = "Result stream"
+
+    def __init__(self, items, response_id=None, chunk_size=CHUNK_SIZE,
+                 terminator=b""):
+        """
+        Create a JSON-RPC Result stream object
+        Returns nothing on success, otherwise JSONRPCException is raised
+        """
+        if isinstance(response_id, (int, str)) or response_id is None:
+            self.response_id = response_id
+        else:
+            raise JSONRPCException("Unexpected data type for argument"
+                                   " 'response_id': '{}'. Must be type"
+                                   " {} or {}".format(type(response_id), int,
+                                                      str))
+
+        try:
+            self.items = iter(items)
+        except TypeError:
+            raise JSONRPCException("Unexpected data type for argument"
+                                   " 'items': '{}'. Must be"
+                                   " iterable".format(type(items))) from None
+
+        if not isinstance(chunk_size, int) or chunk_size < 1:
+            raise JSONRPCException("Unexpected value for argument"
+                                   " 'chunk_size': '{}'. Must be an int of"
+                                   " at least 1".format(chunk_size))
+
+        self.chunk_size = chunk_size
+        self.terminator = bytes(terminator)
+
+    def __iter__(self):
+        """
+        Generator of the encoded packet, in chunks of about chunk_size bytes
+        Raises JSONRPCException if an item isn't a JSON value, by which time
+            part of the packet has already been produced
+        """
+        dumps = codec.dumps
+        chunk_size = self.chunk_size
+
+        # Same key order as JSONRPCResult, "result" last so it can stream
+        pending = [b'{"jsonrpc":"2.0","id":' + dumps(self.response_id) +
+                   b',"result":[']
+        pending_size = len(pending[0])
+        separator = b""
+
+        for item in self.items:
+            try:
+                encoded = dumps(item)
+            except codec.ENCODE_ERRORS as exception:
+                raise JSONRPCException(
+                    "Unable to encode result item {!r}: {}".format(
+                        item, exception)
+                ) from exception
+
+            pending.append(separator)
+            pending.append(encoded)
+            pending_size += len(encoded) + 1
+            separator = b","
+
+            if pending_size >= chunk_size:
+                yield b"".join(pending)
+                pending = []
+                pending_size = 0
+
+        pending.append(b"]}")
+        pending.append(self.terminator)
+        yield b"".join(pending)
+
+    def write_to(self, writer):
+        """
+        Write the whole packet to 'writer', a file-like object with a
+        write() method (a binary file, socket.makefile("wb"), BytesIO) or a
+        callable taking bytes, such as socket.sendall
+        Returns the number of bytes written
+        """
+        write = writer.write if hasattr(writer, "write") else writer
+        written = 0
+
+        for chunk in self:
+            write(chunk)
+            written += len(chunk)
+
+        return written
+
+    async def write_to_stream(self, writer):
+        """
+        Write the whole packet to 'writer', an asyncio.StreamWriter, waiting
+        for it to drain after each chunk so memory stays bounded however
+        slow the client is
+        Returns the number of bytes written
+        """
+        written = 0
+
+        for chunk in self:
+            writer.write(chunk)
+            written += len(chunk)
+            await writer.drain()
+
+        return written
+
+    def __repr__(self):
+        return "JSON-RPC Result stream: {}".format(repr(self.items))
+
+    def __str__(self):
+        return "<JSON-RPC {type} object - {id}>".format(
+            type=self.type,
+            id=self.response_id)
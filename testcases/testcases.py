@@ -26,8 +26,18 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+import asyncio
+import dataclasses
+import math
+import os
+import tempfile
+import threading
+import time
+import typing
+
 import jrpc_helper
-from jrpc_helper import JSONRPCTypes, JSONRPCException
+from jrpc_helper import JSONRPCTypes, JSONRPCVerifyCodes, JSONRPCException
+from jrpc_helper import framing
 
 
 def print_results(did_pass, errors, should_pass=True, packet_type=None):
@@ -322,6 +332,83 @@ VERIFY_VALIDATE.append((TEST, JSONRPCTypes.REQUEST, False))
 for TEST in VERIFY_VALIDATE:
     run_validate_test(TEST[0], TEST[1], should_pass=TEST[2])
 
+# ---------------------------------------
+# Quiet checking, check_packet must agree with verify_packet on every case
+# ---------------------------------------
+for TEST in VERIFY_VALIDATE:
+    CODE = jrpc_helper.check_packet(TEST[0], TEST[1])
+    print_results(CODE == JSONRPCVerifyCodes.OK, repr(CODE),
+                  should_pass=TEST[2], packet_type="CHECK")
+
+# Append tuple of (packet, j_type, expected JSONRPCVerifyCodes value)
+VERIFY_CHECK_CODES = [
+    ('{"jsonrpc": "2.0", "id": 1, "method": "spam"', JSONRPCTypes.REQUEST,
+     JSONRPCVerifyCodes.INVALID_JSON),
+    ({"jsonrpc": "2.0", "id": 1, "method": "spam"}, "request",
+     JSONRPCVerifyCodes.UNKNOWN_TYPE),
+    ({"jsonrpc": "1.0", "id": 1, "method": "spam"}, JSONRPCTypes.REQUEST,
+     JSONRPCVerifyCodes.BAD_JSONRPC_VERSION),
+    ({"jsonrpc": "2.0", "id": 1, "method": "rpc.spam"}, JSONRPCTypes.REQUEST,
+     JSONRPCVerifyCodes.RESERVED_METHOD),
+    ({"jsonrpc": "2.0", "method": "spam", "params": "eggs"},
+     JSONRPCTypes.NOTIF, JSONRPCVerifyCodes.BAD_PARAMS_TYPE),
+    ({"jsonrpc": "2.0", "id": 1, "error": "spam"}, JSONRPCTypes.RESPONSE,
+     JSONRPCVerifyCodes.BAD_ERROR_TYPE),
+]
+
+for TEST in VERIFY_CHECK_CODES:
+    CODE = jrpc_helper.check_packet(TEST[0], TEST[1])
+    print_results(CODE == TEST[2], repr(CODE), packet_type="CHECK CODE")
+
+# ---------------------------------------------------
+# Batch tests
+# ---------------------------------------------------
+VERIFY_BATCH = []
+
+# Pass (a request and a notification)
+TEST = [
+    {"jsonrpc": "2.0", "id": 1, "method": "spam", "params": [1, 2]},
+    {"jsonrpc": "2.0", "method": "notify:eggs"}
+]
+VERIFY_BATCH.append((TEST, JSONRPCTypes.REQUEST, True))
+
+# Pass (same batch, JSON-encoded)
+TEST = '[{"jsonrpc": "2.0", "id": 1, "method": "spam", "params": [1, 2]},' \
+    ' {"jsonrpc": "2.0", "method": "notify:eggs"}]'
+VERIFY_BATCH.append((TEST, JSONRPCTypes.REQUEST, True))
+
+# Pass (a result and an error)
+TEST = [
+    {"jsonrpc": "2.0", "id": 1, "result": 3},
+    {"jsonrpc": "2.0", "id": 2,
+     "error": {"code": -32601, "message": "Method not found"}}
+]
+VERIFY_BATCH.append((TEST, JSONRPCTypes.RESPONSE, True))
+
+# Fail (empty batch)
+VERIFY_BATCH.append(([], JSONRPCTypes.REQUEST, False))
+
+# Fail (not an array)
+TEST = {"jsonrpc": "2.0", "id": 1, "method": "spam"}
+VERIFY_BATCH.append((TEST, JSONRPCTypes.REQUEST, False))
+
+# Fail (second element isn't an object, third uses a reserved method)
+TEST = [
+    {"jsonrpc": "2.0", "id": 1, "method": "spam"},
+    1,
+    {"jsonrpc": "2.0", "id": 3, "method": "rpc.eggs"}
+]
+VERIFY_BATCH.append((TEST, JSONRPCTypes.REQUEST, False))
+
+for TEST in VERIFY_BATCH:
+    DID_PASS, ERRORS = jrpc_helper.verify_batch(TEST[0], TEST[1])
+    print_results(DID_PASS, ERRORS, should_pass=TEST[2], packet_type="BATCH")
+
+# Per-element results come back in batch order
+DID_PASS, ERRORS = jrpc_helper.verify_batch(VERIFY_BATCH[-1][0])
+print_results([result[0] for result in ERRORS] == [True, False, False],
+              ERRORS, packet_type="BATCH ORDER")
+
 # ---------------------------------------
 # Begin testing of packet creation
 # ---------------------------------------
@@ -512,14 +599,30 @@ TEST = {
 SHOULD_PASS = True
 VERIFY_CREATE_RESULT.append((TEST, SHOULD_PASS))
 
-# Fail (id is not type int)
+# Pass (a response echoes the request's id, which may be a str)
 TEST = {
     "response_id": "foo bar",
     "result": "Success! It's working!"
 }
+SHOULD_PASS = True
+VERIFY_CREATE_RESULT.append((TEST, SHOULD_PASS))
+
+# Fail (id is not type int or str)
+TEST = {
+    "response_id": 13.5,
+    "result": "Success! It's working!"
+}
 SHOULD_PASS = False
 VERIFY_CREATE_RESULT.append((TEST, SHOULD_PASS))
 
+# Pass (result may be any JSON value)
+TEST = {
+    "response_id": 13,
+    "result": [1, 2, 3]
+}
+SHOULD_PASS = True
+VERIFY_CREATE_RESULT.append((TEST, SHOULD_PASS))
+
 # Fail (result isn't type dict or str)
 TEST = {
     "response_id": 13,
@@ -569,3 +672,1476 @@ for TEST in VERIFY_CREATE_RESULT:
 print(jrpc_helper.generate_error_packet(-32700))
 # Will return JSON-RPC Error packet for "Invalid Request"
 print(jrpc_helper.generate_error_packet("Invalid Request"))
+
+# ---------------------------------------
+# Batch creation
+# ---------------------------------------
+
+# A response batch drops the None response to a notification
+BATCH = jrpc_helper.JSONRPCBatch([
+    jrpc_helper.JSONRPCResult({"spam": "eggs"}, response_id=1),
+    None,
+    jrpc_helper.JSONRPCError(-32601, "Method not found", response_id=2)
+])
+DID_PASS, PACKET, ERRORS = BATCH.return_packet()
+print_results(DID_PASS and [item["id"] for item in PACKET] == [1, 2],
+              ERRORS, packet_type="BATCH RESULT")
+
+# A response batch of only notification responses has nothing to send
+DID_PASS, PACKET, ERRORS = jrpc_helper.JSONRPCBatch([None]).return_packet()
+print_results(PACKET is None, ERRORS, packet_type="BATCH RESULT")
+
+# Fail (only packet objects may be batched)
+try:
+    jrpc_helper.JSONRPCBatch([{"jsonrpc": "2.0", "id": 1, "result": 1}])
+    DID_PASS = True
+except JSONRPCException as exception:
+    DID_PASS = False
+    ERRORS = exception
+print_results(DID_PASS, ERRORS, should_pass=False, packet_type="BATCH RESULT")
+
+# ---------------------------------------
+# Packet objects own their packets
+# ---------------------------------------
+
+# Two objects held at once keep their own ids and data
+FIRST = jrpc_helper.JSONRPCResult({"spam": "eggs"}, response_id=1)
+SECOND = jrpc_helper.JSONRPCResult({"foo": "bar"}, response_id=2)
+print_results(FIRST.packet["id"] == 1 and SECOND.packet["id"] == 2 and
+              FIRST.packet["result"] == {"spam": "eggs"},
+              [FIRST.packet, SECOND.packet], packet_type="OWNED PACKET")
+
+# A notification has no 'id' key and validates as a notification
+NOTIF = jrpc_helper.JSONRPCRequest("notify:eggs", ["spam"], is_notif=True)
+DID_PASS, PACKET, ERRORS = NOTIF.return_packet()
+print_results(DID_PASS and "id" not in PACKET, ERRORS,
+              packet_type="OWNED PACKET")
+
+# Packets are built on demand, so update_packet is reflected in them
+FIRST.update_packet(id=3)
+print_results(FIRST.return_packet()[1]["id"] == 3, FIRST.packet,
+              packet_type="OWNED PACKET")
+
+# ---------------------------------------
+# Dispatching
+# ---------------------------------------
+DISPATCHER = jrpc_helper.Dispatcher()
+
+
+@DISPATCHER.register
+def subtract(minuend, subtrahend=0):
+    """
+    Test method taking list or dict params
+    """
+    return minuend - subtrahend
+
+
+@DISPATCHER.register(name="spam:eggs")
+def spam_eggs(*, towel):
+    """
+    Test method taking only keyword params
+    """
+    return {"towel": towel}
+
+
+# Append tuple of (request packet, expected response packet)
+#   An expected response of None means nothing should be sent back
+VERIFY_DISPATCH = [
+    ({"jsonrpc": "2.0", "id": 1, "method": "subtract", "params": [42, 23]},
+     {"jsonrpc": "2.0", "id": 1, "result": 19}),
+    ({"jsonrpc": "2.0", "id": "a", "method": "subtract",
+      "params": {"subtrahend": 23, "minuend": 42}},
+     {"jsonrpc": "2.0", "id": "a", "result": 19}),
+    ({"jsonrpc": "2.0", "id": 2, "method": "spam:eggs",
+      "params": {"towel": 42}},
+     {"jsonrpc": "2.0", "id": 2, "result": {"towel": 42}}),
+    ({"jsonrpc": "2.0", "method": "subtract", "params": [42, 23]}, None),
+    ({"jsonrpc": "2.0", "id": 3, "method": "foobar"},
+     jrpc_helper.generate_error_packet(-32601, 3)),
+    ({"jsonrpc": "2.0", "id": 4, "method": "subtract", "params": [1, 2, 3]},
+     jrpc_helper.generate_error_packet(-32602, 4)),
+    ({"jsonrpc": "2.0", "id": 5, "method": "spam:eggs", "params": [42]},
+     jrpc_helper.generate_error_packet(-32602, 5)),
+    ({"jsonrpc": "2.0", "id": 6, "method": 1},
+     jrpc_helper.generate_error_packet(-32600, 6)),
+    ('{"jsonrpc": "2.0", "method": "foobar, "params": "bar", "baz]',
+     jrpc_helper.generate_error_packet(-32700)),
+    ([], jrpc_helper.generate_error_packet(-32600)),
+    ([{"jsonrpc": "2.0", "method": "subtract", "params": [1]}], None),
+    ([{"jsonrpc": "2.0", "id": 1, "method": "subtract", "params": [1]}, 1],
+     [{"jsonrpc": "2.0", "id": 1, "result": 1},
+      jrpc_helper.generate_error_packet(-32600)]),
+]
+
+for TEST in VERIFY_DISPATCH:
+    RESPONSE = DISPATCHER.dispatch(TEST[0])
+    PACKET = None if RESPONSE is None else RESPONSE.return_packet()[1]
+    print_results(PACKET == TEST[1], PACKET, packet_type="DISPATCH")
+
+# ---------------------------------------
+# Params schemas
+# ---------------------------------------
+
+
+@dataclasses.dataclass
+class Towel:
+    """
+    Test dataclass schema
+    """
+    colour: str
+    size: int = 42
+    note: typing.Any = None
+
+
+@DISPATCHER.register(schema=True)
+def fold(towel: dict, times: int = 1, *, neat: bool = False):
+    """
+    Test method checked against its own type hints
+    """
+    return [towel, times, neat]
+
+
+DISPATCHER.register(lambda *values: sum(values), name="total", schema={
+    "type": "array", "items": {"type": "number", "minimum": 0},
+    "maxItems": 3})
+DISPATCHER.register(lambda **towel: towel, name="towel", schema=Towel)
+DISPATCHER.register(lambda **label: label, name="label", schema={
+    "type": "object", "properties": {"text": {}},
+    "additionalProperties": False})
+
+# Append tuple of (request params, method, error data or None to pass)
+VERIFY_SCHEMA = [
+    ([{}, 2], "fold", None),
+    ({"towel": {}, "neat": True}, "fold", None),
+    ([{}, "2"], "fold", "params[1]: expected integer, got string"),
+    ({"towel": {}, "neat": 1}, "fold",
+     "params.neat: expected boolean, got integer"),
+    ([1, 2.5], "total", None),
+    ([1, -2], "total", "params[1]: expected a number >= 0, got -2"),
+    ([1, True], "total", "params[1]: expected number, got boolean"),
+    ([1, 2, 3, 4], "total",
+     "params: expected a length of at most 3, got 4"),
+    ({"colour": "blue"}, "towel", None),
+    ({"size": 1}, "towel", "params: missing required key 'colour'"),
+    ({"colour": "blue", "smell": "bad"}, "towel",
+     "params: unexpected key 'smell'"),
+    ({"colour": "blue", "note": [1]}, "towel", None),
+    ({"text": 1}, "label", None),
+    ({"text": 1, "smell": "bad"}, "label",
+     "params: unexpected key 'smell'"),
+]
+
+for TEST in VERIFY_SCHEMA:
+    RESPONSE = DISPATCHER.dispatch({"jsonrpc": "2.0", "id": 1,
+                                    "method": TEST[1], "params": TEST[0]})
+    PACKET = RESPONSE.packet
+    if TEST[2] is None:
+        DID_PASS = "result" in PACKET
+    else:
+        DID_PASS = PACKET["error"] == {"code": -32602,
+                                       "message": "Invalid params",
+                                       "data": TEST[2]}
+    print_results(DID_PASS, PACKET, packet_type="PARAMS SCHEMA")
+
+# Fail (unsupported keywords and hints are refused when compiling)
+for TEST in ({"$ref": "#/definitions/towel"}, set):
+    try:
+        jrpc_helper.compile_schema(TEST)
+        DID_PASS = True
+    except JSONRPCException as exception:
+        DID_PASS = False
+        ERRORS = exception
+    print_results(DID_PASS, ERRORS, should_pass=False,
+                  packet_type="PARAMS SCHEMA")
+
+# ---------------------------------------
+# asyncio dispatching
+# ---------------------------------------
+ASYNC_DISPATCHER = jrpc_helper.AsyncDispatcher(concurrency=2)
+ASYNC_DISPATCHER.register(subtract)
+
+
+@ASYNC_DISPATCHER.register
+async def delayed_echo(value, delay):
+    """
+    Test coroutine method, finishes after 'delay' seconds
+    """
+    await asyncio.sleep(delay)
+    return value
+
+
+# Later elements finish first, responses must still be in request order
+TEST = [{"jsonrpc": "2.0", "id": index, "method": "delayed_echo",
+         "params": [index, 0.01 * (4 - index)]} for index in range(4)]
+TEST.append({"jsonrpc": "2.0", "method": "delayed_echo", "params": [9, 0]})
+TEST.append({"jsonrpc": "2.0", "id": 5, "method": "subtract",
+             "params": [42, 23]})
+RESPONSE = asyncio.run(ASYNC_DISPATCHER.dispatch(TEST))
+PACKET = RESPONSE.return_packet()[1]
+print_results([(item["id"], item["result"]) for item in PACKET] ==
+              [(0, 0), (1, 1), (2, 2), (3, 3), (5, 19)],
+              PACKET, packet_type="ASYNC DISPATCH")
+
+# Coroutine methods can't be registered with the plain Dispatcher
+try:
+    jrpc_helper.Dispatcher().register(delayed_echo)
+    DID_PASS = True
+except JSONRPCException as exception:
+    DID_PASS = False
+    ERRORS = exception
+print_results(DID_PASS, ERRORS, should_pass=False,
+              packet_type="ASYNC DISPATCH")
+
+# ---------------------------------------
+# Serialization
+# ---------------------------------------
+
+# serialize() gives compact UTF-8 JSON bytes that decode back to the packet
+for TEST in (jrpc_helper.JSONRPCRequest("spam:eggs", {"été": 1},
+                                        response_id=1),
+             jrpc_helper.JSONRPCResult([1, "two", None], response_id="a"),
+             jrpc_helper.JSONRPCError(200, "Success", data=["spam"])):
+    DATA = TEST.serialize()
+    print_results(isinstance(DATA, bytes) and
+                  jrpc_helper.codec.loads(DATA) == TEST.packet,
+                  DATA, packet_type="SERIALIZE " + jrpc_helper.codec.BACKEND)
+
+# Bytes are decoded straight from UTF-8
+print_results(jrpc_helper.check_packet(
+    '{"jsonrpc": "2.0", "id": 1, "result": "été"}'.encode("utf-8"),
+    JSONRPCTypes.RESPONSE) == JSONRPCVerifyCodes.OK, None,
+              packet_type="SERIALIZE " + jrpc_helper.codec.BACKEND)
+
+# ---------------------------------------
+# Bytes-like packets
+# ---------------------------------------
+
+# Frames sliced out of a larger receive buffer are checked in place
+BUFFER = bytearray(b'{"jsonrpc": "2.0", "id": 1, "method": "spam"}\n'
+                   b'{"jsonrpc": "2.0", "id": 2, "result": [1, 2]}\n')
+VIEW = memoryview(BUFFER)
+SPLIT = BUFFER.index(b"\n")
+
+# Append tuple of (packet, j_type, should_pass)
+VERIFY_BYTES = [
+    (VIEW[:SPLIT], JSONRPCTypes.REQUEST, True),
+    (VIEW[SPLIT + 1:-1], JSONRPCTypes.RESPONSE, True),
+    (bytearray(VIEW[SPLIT + 1:-1]), JSONRPCTypes.RESPONSE, True),
+    # Fail (cut off mid-packet)
+    (VIEW[:SPLIT - 1], JSONRPCTypes.REQUEST, False),
+    # Strided views are copied first, this one skips every other byte
+    (memoryview(b'{ " j s o n r p c " :   " 2 . 0 " ,   " i d " :   1 ,'
+                b'   " r e s u l t " :   1 } ')[::2],
+     JSONRPCTypes.RESPONSE, True),
+]
+
+for TEST in VERIFY_BYTES:
+    CODE = jrpc_helper.check_packet(TEST[0], TEST[1])
+    print_results(CODE == JSONRPCVerifyCodes.OK, repr(CODE),
+                  should_pass=TEST[2],
+                  packet_type="BYTES " + jrpc_helper.codec.BACKEND)
+
+# ---------------------------------------
+# Classifying packets of unknown type
+# ---------------------------------------
+
+# Append tuple of (packet, expected JSONRPCTypes value, should_pass)
+VERIFY_CLASSIFY = [
+    ({"jsonrpc": "2.0", "id": 1, "method": "spam", "params": [1]},
+     JSONRPCTypes.REQUEST, True),
+    ('{"jsonrpc": "2.0", "method": "notify:eggs"}', JSONRPCTypes.NOTIF, True),
+    (b'{"jsonrpc": "2.0", "id": 1, "result": 19}', JSONRPCTypes.RESPONSE,
+     True),
+    ({"jsonrpc": "2.0", "id": 1,
+      "error": {"code": -32601, "message": "Method not found"}},
+     JSONRPCTypes.ERROR, True),
+    # Fail (reserved method name)
+    ({"jsonrpc": "2.0", "id": 1, "method": "rpc.spam"},
+     JSONRPCTypes.REQUEST, False),
+    # Fail (both 'error' and 'result')
+    ({"jsonrpc": "2.0", "id": 1, "result": 19,
+      "error": {"code": -32601, "message": "Method not found"}},
+     JSONRPCTypes.ERROR, False),
+    # Fail (can't tell the type)
+    ({"jsonrpc": "2.0", "id": 1}, None, False),
+    # Fail (not JSON)
+    ('{"jsonrpc": "2.0", "id": 1', None, False),
+]
+
+for TEST in VERIFY_CLASSIFY:
+    J_TYPE, DATA, ERRORS = jrpc_helper.classify_and_verify(TEST[0])
+    print_results(J_TYPE == TEST[1] and (ERRORS is None) == TEST[2],
+                  ERRORS, packet_type="CLASSIFY {}".format(J_TYPE))
+
+# A batch is classified element by element
+J_TYPE, DATA, ERRORS = jrpc_helper.classify_and_verify(
+    '[{"jsonrpc": "2.0", "id": 1, "result": 19}, {"jsonrpc": "2.0"}]')
+print_results(J_TYPE == JSONRPCTypes.BATCH and ERRORS[0] is None and
+              ERRORS[1] is not None, ERRORS, packet_type="CLASSIFY BATCH")
+
+# ---------------------------------------
+# Stream framing
+# ---------------------------------------
+STREAM_PACKETS = [
+    {"jsonrpc": "2.0", "id": 1, "method": "spam", "params": ["{[\\\"]}\n"]},
+    {"jsonrpc": "2.0", "method": "notify:eggs", "params": {"été": None}},
+    [{"jsonrpc": "2.0", "id": 2, "result": 19}],
+]
+
+# Every framing must give back the same packets however the stream is cut
+for FRAMING, DECODER_CLASS in sorted(framing.DECODERS.items()):
+    STREAM = b"".join(DECODER_CLASS.frame(jrpc_helper.codec.dumps(TEST))
+                      for TEST in STREAM_PACKETS)
+    for CHUNK_SIZE in (1, 7, len(STREAM)):
+        DECODER = framing.get_decoder(FRAMING)
+        RESULTS = []
+        for INDEX in range(0, len(STREAM), CHUNK_SIZE):
+            RESULTS.extend(DECODER.feed(STREAM[INDEX:INDEX + CHUNK_SIZE]))
+        print_results([RESULT[1] for RESULT in RESULTS] == STREAM_PACKETS and
+                      all(RESULT[2] is None for RESULT in RESULTS) and
+                      not DECODER.buffer, RESULTS,
+                      packet_type="FRAMING {} {}".format(FRAMING, CHUNK_SIZE))
+
+# A bad line doesn't stop the lines after it from being decoded
+RESULTS = framing.NewlineDecoder().feed(
+    b'{"jsonrpc": "2.0", "id": 1\n\n{"jsonrpc": "2.0", "method": "spam"}\n')
+print_results(RESULTS[0][0] is None and RESULTS[1][0] == JSONRPCTypes.NOTIF,
+              RESULTS, packet_type="FRAMING newline")
+
+# The bytes that frame a payload don't count against max_frame, however
+#   the frame is split
+for DECODER_CLASS in (framing.LengthPrefixDecoder,
+                      framing.ContentLengthDecoder):
+    DECODER = DECODER_CLASS(max_frame=8)
+    FRAME = DECODER_CLASS.frame(b"12345678")
+    try:
+        RESULTS = DECODER.feed_frames(FRAME[:9]) + \
+            DECODER.feed_frames(FRAME[9:])
+        DID_PASS = RESULTS == [b"12345678"] and not DECODER.buffer
+    except JSONRPCException as exception:
+        DID_PASS = False
+        RESULTS = exception
+    print_results(DID_PASS, RESULTS,
+                  packet_type="FRAMING {}".format(DECODER_CLASS.__name__))
+
+# Fail (a partial frame bigger than max_frame isn't buffered)
+for DECODER in (framing.NewlineDecoder(max_frame=16),
+                framing.ContentLengthDecoder(max_frame=16),
+                framing.LengthPrefixDecoder(max_frame=16),
+                framing.ConcatenatedDecoder(max_frame=16)):
+    try:
+        DECODER.feed(DECODER.frame(b"[" * 17)[:-1] if isinstance(
+            DECODER, (framing.ContentLengthDecoder,
+                      framing.LengthPrefixDecoder)) else b"[" * 17)
+        DID_PASS = True
+    except JSONRPCException as exception:
+        DID_PASS = False
+        ERRORS = exception
+    print_results(DID_PASS, ERRORS, should_pass=False,
+                  packet_type="FRAMING max_frame")
+
+# ---------------------------------------
+# Streaming results
+# ---------------------------------------
+
+# A streamed result decodes to the same packet JSONRPCResult builds
+STREAM = jrpc_helper.JSONRPCResultStream(
+    ({"row": INDEX, "name": "été"} for INDEX in range(100)),
+    response_id=7, chunk_size=64, terminator=b"\n")
+CHUNKS = list(STREAM)
+PACKET = jrpc_helper.JSONRPCResult(
+    [{"row": INDEX, "name": "été"} for INDEX in range(100)],
+    response_id=7).packet
+print_results(len(CHUNKS) > 1 and CHUNKS[-1].endswith(b"\n") and
+              jrpc_helper.codec.loads(b"".join(CHUNKS)) == PACKET,
+              len(CHUNKS), packet_type="STREAM RESULT")
+
+# Fail (items must be iterable)
+try:
+    jrpc_helper.JSONRPCResultStream(42, response_id=7)
+    DID_PASS = True
+except JSONRPCException as exception:
+    DID_PASS = False
+    ERRORS = exception
+print_results(DID_PASS, ERRORS, should_pass=False, packet_type="STREAM RESULT")
+
+# ---------------------------------------
+# Error cache
+# ---------------------------------------
+
+# Pre-serialized error bodies decode to the same packets as the objects
+for TEST in (-32700, -32600, "method not found", "Invalid params", -32603):
+    for RESPONSE_ID in (None, 13, "spam"):
+        DATA = jrpc_helper.generate_error_bytes(TEST, RESPONSE_ID)
+        print_results(jrpc_helper.codec.loads(DATA) ==
+                      jrpc_helper.generate_error_packet(TEST, RESPONSE_ID) ==
+                      jrpc_helper.codec.loads(jrpc_helper.generate_error(
+                          TEST, RESPONSE_ID).serialize()),
+                      DATA, packet_type="ERROR CACHE")
+
+# Application-defined errors register into the same cache
+jrpc_helper.register_error(4200, "Towel not found")
+PACKET = jrpc_helper.generate_error_packet("towel NOT found", 42)
+print_results(PACKET["error"] == {"code": 4200, "message": "Towel not found"}
+              and jrpc_helper.codec.loads(jrpc_helper.generate_error_bytes(
+                  4200, 42)) == PACKET, PACKET, packet_type="ERROR CACHE")
+
+# Fail (reserved code, and a message already registered to another code)
+for TEST in ((-32001, "Spam"), (4201, "Towel not found")):
+    try:
+        jrpc_helper.register_error(*TEST)
+        DID_PASS = True
+    except JSONRPCException as exception:
+        DID_PASS = False
+        ERRORS = exception
+    print_results(DID_PASS, ERRORS, should_pass=False,
+                  packet_type="ERROR CACHE")
+
+# Unknown codes give None, as before
+print_results(jrpc_helper.generate_error_packet(12345) is None and
+              jrpc_helper.generate_error_bytes("spam") is None, None,
+              packet_type="ERROR CACHE")
+
+# ---------------------------------------
+# asyncio server
+# ---------------------------------------
+
+
+async def run_tcp_server():
+    """
+    Pipeline requests on one TCP connection, returns the response ids in
+    the order they arrived
+    """
+    server = await jrpc_helper.serve_tcp(ASYNC_DISPATCHER, "127.0.0.1", 0)
+    async with server:
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", server.sockets[0].getsockname()[1])
+        for index in range(4):
+            writer.write(jrpc_helper.JSONRPCRequest(
+                "delayed_echo", [index, 0.02 * (4 - index)],
+                response_id=index).serialize() + b"\n")
+        writer.write(b'{"jsonrpc": "2.0", "method": "subtract", '
+                     b'"params": [1]}\n')
+        response_ids = [jrpc_helper.codec.loads(await reader.readline())["id"]
+                        for _ in range(4)]
+        writer.close()
+        await writer.wait_closed()
+    return response_ids
+
+
+async def run_unix_server(path, payloads):
+    """
+    Send each of 'payloads' length-prefixed over a Unix socket to a plain
+    Dispatcher, one at a time, returns the decoded responses until the
+    server stops sending
+    """
+    server = await jrpc_helper.serve_unix(DISPATCHER, path,
+                                          framing="length-prefix",
+                                          max_frame=1024)
+    async with server:
+        reader, writer = await asyncio.open_unix_connection(path)
+        decoder = framing.LengthPrefixDecoder()
+        responses = []
+        for payload in payloads:
+            writer.write(framing.LengthPrefixDecoder.frame(payload))
+            data = await reader.read(65536)
+            responses.extend(decoder.feed_frames(data))
+        while data:
+            data = await reader.read(65536)
+            responses.extend(decoder.feed_frames(data))
+        writer.close()
+    return [jrpc_helper.codec.loads(response) for response in responses]
+
+
+# Responses are written as they complete, so the slowest comes back last
+RESULTS = asyncio.run(run_tcp_server())
+print_results(RESULTS == [3, 2, 1, 0], RESULTS, packet_type="SERVER TCP")
+
+# A frame over 'max_frame' gets a parse error and closes the connection
+with tempfile.TemporaryDirectory() as TEMP_DIR:
+    RESULTS = asyncio.run(run_unix_server(
+        os.path.join(TEMP_DIR, "jrpc.sock"),
+        [b'{"jsonrpc": "2.0", "id": 1, "method": "subtract", '
+         b'"params": [42, 23]}', b"[" + b"1, " * 1024 + b"1]"]))
+print_results(RESULTS == [{"jsonrpc": "2.0", "id": 1, "result": 19},
+                          jrpc_helper.generate_error_packet(-32700)],
+              RESULTS, packet_type="SERVER UNIX")
+
+
+async def run_unencodable_server():
+    """
+    Call a plain Dispatcher's method whose result only fails once it's
+    encoded, alone and in a batch, returns the decoded responses
+    """
+    dispatcher = jrpc_helper.Dispatcher()
+    dispatcher.register(subtract)
+    dispatcher.register(lambda: {"x": {1, 2}}, name="sets")
+    server = await jrpc_helper.serve_tcp(dispatcher, "127.0.0.1", 0)
+    async with server:
+        reader, writer = await asyncio.open_connection(
+            "127.0.0.1", server.sockets[0].getsockname()[1])
+        writer.write(b'{"jsonrpc": "2.0", "id": 1, "method": "sets"}\n'
+                     b'[{"jsonrpc": "2.0", "id": 2, "method": "sets"},'
+                     b' {"jsonrpc": "2.0", "id": 3, "method": "subtract",'
+                     b' "params": [2, 1]}]\n')
+        responses = [jrpc_helper.codec.loads(await reader.readline())
+                     for _ in range(2)]
+        writer.close()
+        await writer.wait_closed()
+    return responses
+
+
+# A result that can't be encoded is an internal error, the connection lives
+RESULTS = asyncio.run(run_unencodable_server())
+print_results(RESULTS == [jrpc_helper.generate_error_packet(-32603, 1),
+                          [jrpc_helper.generate_error_packet(-32603, 2),
+                           {"jsonrpc": "2.0", "id": 3, "result": 1}]],
+              RESULTS, packet_type="SERVER TCP")
+
+
+class PausingTransport:
+    """
+    Stand-in transport that records the calls backpressure makes
+    """
+    # pylint: disable=missing-docstring,unused-argument
+
+    def __init__(self):
+        self.calls = []
+
+    def set_write_buffer_limits(self, high=None, low=None):
+        self.calls.append("limits")
+
+    def pause_reading(self):
+        self.calls.append("pause")
+
+    def resume_reading(self):
+        self.calls.append("resume")
+
+    @staticmethod
+    def is_closing():
+        return False
+
+
+# Reading pauses while the write buffer is full, and resumes once it drains
+PROTOCOL = jrpc_helper.JSONRPCServerProtocol(DISPATCHER)
+TRANSPORT = PausingTransport()
+PROTOCOL.connection_made(TRANSPORT)
+PROTOCOL.pause_writing()
+PROTOCOL.pause_writing()
+PROTOCOL.resume_writing()
+print_results(TRANSPORT.calls == ["limits", "pause", "resume"],
+              TRANSPORT.calls, packet_type="SERVER BACKPRESSURE")
+
+# Fail (unknown framing is refused before listening)
+try:
+    asyncio.run(jrpc_helper.serve_tcp(DISPATCHER, "127.0.0.1", 0,
+                                      framing="carrier-pigeon"))
+    DID_PASS = True
+except JSONRPCException as exception:
+    DID_PASS = False
+    ERRORS = exception
+print_results(DID_PASS, ERRORS, should_pass=False, packet_type="SERVER TCP")
+
+# ---------------------------------------
+# asyncio client
+# ---------------------------------------
+
+
+@ASYNC_DISPATCHER.register(name="towel:find")
+def find_towel():
+    """
+    Test method that responds with an application error
+    """
+    return jrpc_helper.JSONRPCError(4200, "Towel not found", data=["spam"])
+
+
+async def run_client(func):
+    """
+    Start a TCP server for ASYNC_DISPATCHER and return await func(port)
+    """
+    server = await jrpc_helper.serve_tcp(ASYNC_DISPATCHER, "127.0.0.1", 0)
+    async with server:
+        return await func(server.sockets[0].getsockname()[1])
+
+
+async def pipeline_calls(port):
+    """
+    Make calls that finish in reverse order on a single connection
+    """
+    client = await jrpc_helper.connect_tcp("127.0.0.1", port)
+    results = await asyncio.gather(*[
+        client.call("delayed_echo", [index, 0.01 * (4 - index)])
+        for index in range(4)])
+    client.close()
+    return results
+
+
+async def call_errors(port):
+    """
+    Returns the exception each failing call raises
+    """
+    client = await jrpc_helper.connect_tcp("127.0.0.1", port)
+    raised = []
+    for call in (client.call("towel:find"),
+                 client.call("delayed_echo", [1, 1], timeout=0.01)):
+        try:
+            await call
+        except (JSONRPCException, asyncio.TimeoutError) as exception:
+            raised.append(exception)
+    client.close()
+    await asyncio.sleep(0)
+    try:
+        await client.call("subtract", [1])
+    except JSONRPCException as exception:
+        raised.append(exception)
+    return raised
+
+
+async def pool_calls(port):
+    """
+    Spread calls over a pool with a dead endpoint, returns the results and
+    which of its connections are open
+    """
+    pool = jrpc_helper.ClientPool([("127.0.0.1", port), ("127.0.0.1", 1)],
+                                  size=2)
+    results = await asyncio.gather(*[pool.call("subtract", [index, 1])
+                                     for index in range(10)])
+    is_open = [client is not None for client in pool.clients]
+    pool.close()
+    return results, is_open
+
+
+async def dead_pool_call():
+    """
+    Returns what a call on a pool with no reachable endpoint raises
+    """
+    pool = jrpc_helper.ClientPool([("127.0.0.1", 1), ("127.0.0.1", 1)])
+    try:
+        await pool.call("subtract", [1, 1])
+    except Exception as exception:  # pylint: disable=broad-except
+        return exception
+    return None
+
+
+async def refused_batch_calls():
+    """
+    Batch two calls to a server that refuses every frame with a null id
+    error, then make one more on its own, returns what each raises
+    """
+    async def refuse(reader, writer):
+        while await reader.readline():
+            writer.write(jrpc_helper.generate_error_bytes(-32600) + b"\n")
+        writer.close()
+
+    server = await asyncio.start_server(refuse, "127.0.0.1", 0)
+    async with server:
+        client = await jrpc_helper.connect_tcp(
+            "127.0.0.1", server.sockets[0].getsockname()[1], batch_window=0)
+        raised = await asyncio.gather(
+            *[client.call("subtract", [index, 1], timeout=2)
+              for index in range(2)], return_exceptions=True)
+        raised += await asyncio.gather(client.call("subtract", [1, 1],
+                                                   timeout=2),
+                                       return_exceptions=True)
+        client.close()
+    return raised
+
+
+async def mixed_batch_calls():
+    """
+    Batch two calls to a server that answers the first and refuses the
+    other with a null id error inside the batch response, returns what
+    each returns or raises
+    """
+    async def answer_one(reader, writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            batch = jrpc_helper.codec.loads(line)
+            responses = [jrpc_helper.generate_error(-32600).packet,
+                         {"jsonrpc": "2.0", "id": batch[0]["id"],
+                          "result": 1}]
+            writer.write(jrpc_helper.codec.dumps(responses) + b"\n")
+        writer.close()
+
+    server = await asyncio.start_server(answer_one, "127.0.0.1", 0)
+    async with server:
+        client = await jrpc_helper.connect_tcp(
+            "127.0.0.1", server.sockets[0].getsockname()[1], batch_window=0)
+        results = await asyncio.gather(
+            *[client.call("subtract", [index, 1], timeout=0.2)
+              for index in range(2)], return_exceptions=True)
+        client.close()
+    return results
+
+
+# Results come back to the right caller whatever order they arrive in
+RESULTS = asyncio.run(run_client(pipeline_calls))
+print_results(RESULTS == [0, 1, 2, 3], RESULTS, packet_type="CLIENT")
+
+# Error responses raise JSONRPCRemoteError, and calls time out or fail
+#   once the connection is closed
+RESULTS = asyncio.run(run_client(call_errors))
+print_results(len(RESULTS) == 3 and
+              isinstance(RESULTS[0], jrpc_helper.JSONRPCRemoteError) and
+              (RESULTS[0].code, RESULTS[0].data) == (4200, ["spam"]) and
+              isinstance(RESULTS[1], asyncio.TimeoutError) and
+              type(RESULTS[2]) is JSONRPCException,
+              RESULTS, packet_type="CLIENT")
+
+# Only reachable endpoints get calls
+RESULTS = asyncio.run(run_client(pool_calls))
+print_results(RESULTS == ([index - 1 for index in range(10)],
+                          [True, True, False, False]),
+              RESULTS, packet_type="CLIENT POOL")
+
+# ...and with none, the connection error is raised
+RESULTS = asyncio.run(dead_pool_call())
+print_results(isinstance(RESULTS, OSError), RESULTS,
+              packet_type="CLIENT POOL")
+
+# A null id error fails the calls of the frame it answers, not after
+#   they time out
+RESULTS = asyncio.run(refused_batch_calls())
+print_results(len(RESULTS) == 3 and
+              all(isinstance(result, jrpc_helper.JSONRPCRemoteError) and
+                  result.code == -32600 for result in RESULTS),
+              RESULTS, packet_type="CLIENT")
+
+# ...but one inside a batch response only answers an element of the batch,
+#   so it's dropped, and the other elements are still answered
+RESULTS = asyncio.run(mixed_batch_calls())
+print_results(len(RESULTS) == 2 and RESULTS[0] == 1 and
+              isinstance(RESULTS[1], asyncio.TimeoutError),
+              RESULTS, packet_type="CLIENT")
+
+# ---------------------------------------
+# Client batching
+# ---------------------------------------
+
+
+class CountingDispatcher(jrpc_helper.AsyncDispatcher):
+    """
+    AsyncDispatcher that keeps every packet it's given
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.packets = []
+
+    async def dispatch(self, packet):
+        self.packets.append(jrpc_helper.codec.loads(packet))
+        return await super().dispatch(packet)
+
+
+COUNTING_DISPATCHER = CountingDispatcher()
+COUNTING_DISPATCHER.register(subtract)
+
+
+async def batch_calls():
+    """
+    Make 20 calls and a notification at once on a batching client
+    """
+    server = await jrpc_helper.serve_tcp(COUNTING_DISPATCHER, "127.0.0.1", 0)
+    async with server:
+        client = await jrpc_helper.connect_tcp(
+            "127.0.0.1", server.sockets[0].getsockname()[1],
+            batch_window=0.01, batch_size=8)
+        results = await asyncio.gather(
+            client.notify("subtract", [1, 1]),
+            *[client.call("subtract", [index, 1]) for index in range(20)])
+        client.close()
+    return results
+
+
+# The 21 packets go as batches of 8, 8 and 5, and each caller still gets
+#   its own result
+RESULTS = asyncio.run(batch_calls())
+print_results(RESULTS == [None] + [index - 1 for index in range(20)] and
+              [len(PACKET) for PACKET in COUNTING_DISPATCHER.packets] ==
+              [8, 8, 5], COUNTING_DISPATCHER.packets,
+              packet_type="CLIENT BATCHING")
+
+# Fail (a negative window)
+try:
+    jrpc_helper.JSONRPCClient(batch_window=-1)
+    DID_PASS = True
+except JSONRPCException as exception:
+    DID_PASS = False
+    ERRORS = exception
+print_results(DID_PASS, ERRORS, should_pass=False,
+              packet_type="CLIENT BATCHING")
+
+# ---------------------------------------
+# Validation levels
+# ---------------------------------------
+
+# Breaks value rules only, its structure is fine
+PACKET = {"jsonrpc": "2.0", "id": 1, "method": "rpc.spam", "params": ["eggs"]}
+
+# Append tuple of (level, should pass verify_packet)
+VERIFY_LEVELS = [
+    (jrpc_helper.JSONRPCValidation.STRICT, False),
+    ("fast", True),
+    ("TRUST", True),
+]
+
+for TEST in VERIFY_LEVELS:
+    DID_PASS, ERRORS = jrpc_helper.verify_packet(PACKET, JSONRPCTypes.REQUEST,
+                                                 TEST[0])
+    print_results(DID_PASS, ERRORS, should_pass=TEST[1],
+                  packet_type="VALIDATION {}".format(TEST[0]))
+
+# FAST still catches a missing key, with the same messages as STRICT
+DID_PASS, ERRORS = jrpc_helper.verify_packet(
+    {"jsonrpc": "2.0", "method": "spam"}, JSONRPCTypes.RESPONSE, "fast")
+print_results(DID_PASS, ERRORS, should_pass=False,
+              packet_type="VALIDATION fast")
+
+# The global level applies to calls that don't give one, and to
+#   return_packet
+PREVIOUS = jrpc_helper.set_validation("trust")
+RESULTS = (jrpc_helper.check_packet("not even JSON", JSONRPCTypes.REQUEST),
+           jrpc_helper.check_packet("not even JSON", JSONRPCTypes.REQUEST,
+                                    "strict"))
+TEST = jrpc_helper.JSONRPCRequest("spam", response_id=1)
+TEST.update_packet(method="rpc.spam")
+RESULTS += (TEST.return_packet()[0], TEST.return_packet("strict")[0])
+jrpc_helper.set_validation(PREVIOUS)
+print_results(RESULTS == (JSONRPCVerifyCodes.OK,
+                          JSONRPCVerifyCodes.INVALID_JSON, True, False) and
+              jrpc_helper.get_validation() ==
+              jrpc_helper.JSONRPCValidation.STRICT,
+              RESULTS, packet_type="VALIDATION global")
+
+# A trusting dispatcher routes what a strict one refuses, and skips schemas
+for TEST in ("strict", "fast", "trust"):
+    TRUSTING_DISPATCHER = jrpc_helper.Dispatcher(validation=TEST)
+    TRUSTING_DISPATCHER.register(subtract, schema={"maxItems": 1})
+    PACKET = TRUSTING_DISPATCHER.dispatch(
+        {"jsonrpc": "1.0", "id": 1, "method": "subtract",
+         "params": [42, 23]}).packet
+    print_results(("result" in PACKET) == (TEST == "trust"), PACKET,
+                  packet_type="VALIDATION dispatch {}".format(TEST))
+
+# Params that are neither a list nor an object are refused at every level
+for TEST in ("strict", "fast", "trust"):
+    TRUSTING_DISPATCHER = jrpc_helper.Dispatcher(validation=TEST)
+    TRUSTING_DISPATCHER.register(subtract)
+    RESULTS = [TRUSTING_DISPATCHER.dispatch(
+        {"jsonrpc": "2.0", "id": 1, "method": "subtract",
+         "params": PARAMS}).packet for PARAMS in ("x", 5)]
+    EXPECTED = jrpc_helper.generate_error(-32600, 1).packet
+    print_results(RESULTS == [EXPECTED, EXPECTED], RESULTS,
+                  packet_type="VALIDATION dispatch {}".format(TEST))
+
+# ...and a binder given them anyway doesn't bind them
+BINDER = jrpc_helper.dispatcher._compile_binder(  # pylint: disable=W0212
+    subtract)
+print_results(BINDER("x") is None and BINDER(5) is None, BINDER(5),
+              packet_type="VALIDATION")
+
+# Fail (unknown level)
+try:
+    jrpc_helper.set_validation("lax")
+    DID_PASS = True
+except JSONRPCException as exception:
+    DID_PASS = False
+    ERRORS = exception
+print_results(DID_PASS, ERRORS, should_pass=False,
+              packet_type="VALIDATION")
+
+# ---------------------------------------
+# Metrics
+# ---------------------------------------
+METRICS = jrpc_helper.Metrics()
+MEASURED_DISPATCHER = jrpc_helper.Dispatcher(metrics=METRICS)
+MEASURED_DISPATCHER.register(subtract)
+MEASURED_DISPATCHER.register(find_towel, name="towel:find")
+
+for TEST in ('{"jsonrpc": "2.0", "id": 1, "method": "subtract", '
+             '"params": [42, 23]}',
+             '{"jsonrpc": "2.0", "method": "subtract", "params": [1]}',
+             '{"jsonrpc": "2.0", "id": 2, "method": "towel:find"}',
+             '{"jsonrpc": "2.0", "id": 3, "method": "foobar"}',
+             '{"jsonrpc": "2.0", "method": "foobar, "params": "bar", "baz]'):
+    MEASURED_DISPATCHER.dispatch(TEST)
+
+# Calls per method, errors by code, and every call in the histograms
+SNAPSHOT = METRICS.snapshot()
+print_results({name: (value["calls"], value["errors"],
+                      value["latency"]["count"])
+               for name, value in SNAPSHOT["methods"].items()} ==
+              {"subtract": (2, 0, 2), "towel:find": (1, 1, 1)} and
+              SNAPSHOT["errors"] == {4200: 1, -32601: 1, -32700: 1} and
+              SNAPSHOT["stages"]["parse"]["count"] == 5 and
+              SNAPSHOT["stages"]["validate"]["count"] == 4 and
+              SNAPSHOT["stages"]["dispatch"]["buckets"][-1] == [None, 3],
+              SNAPSHOT, packet_type="METRICS")
+
+# Prometheus text has a line per counter and cumulative buckets
+TEXT = METRICS.prometheus()
+print_results('jrpc_calls_total{method="subtract"} 2' in TEXT and
+              'jrpc_errors_total{code="-32601"} 1' in TEXT and
+              'jrpc_call_duration_seconds_bucket{method="subtract",'
+              'le="+Inf"} 2' in TEXT and
+              'jrpc_stage_duration_seconds_count{stage="parse"} 5' in TEXT,
+              TEXT, packet_type="METRICS PROMETHEUS")
+
+METRICS.reset()
+print_results(METRICS.snapshot()["methods"] == {}, METRICS.snapshot(),
+              packet_type="METRICS")
+
+# ---------------------------------------
+# Result cache
+# ---------------------------------------
+CACHE = jrpc_helper.ResultCache(maxsize=3)
+CACHED_CALLS = []
+
+
+@DISPATCHER.register(cache=CACHE)
+def lookup(name, exact=False):
+    """
+    Test pure method, remembers each time it's really called
+    """
+    CACHED_CALLS.append(name)
+    return {"name": name, "exact": exact}
+
+
+# Append tuple of (params, whether the method should really be called)
+VERIFY_CACHE = [
+    (["towel"], True),
+    (["towel"], False),
+    ({"name": "towel", "exact": 1}, True),
+    ({"exact": 1, "name": "towel"}, False),    # Key order doesn't matter
+    (["towel", True], True),                    # True isn't 1
+    (["spam"], True),                           # Evicts the oldest, ["towel"]
+    (["towel"], True),
+]
+
+for INDEX, TEST in enumerate(VERIFY_CACHE):
+    CALLS = len(CACHED_CALLS)
+    RESPONSE = DISPATCHER.dispatch({"jsonrpc": "2.0", "id": INDEX,
+                                    "method": "lookup", "params": TEST[0]})
+    DATA = RESPONSE.serialize()
+    print_results((len(CACHED_CALLS) > CALLS) == TEST[1] and
+                  jrpc_helper.codec.loads(DATA) == RESPONSE.packet and
+                  RESPONSE.packet["id"] == INDEX,
+                  DATA, packet_type="RESULT CACHE")
+
+print_results((CACHE.hits, CACHE.misses, len(CACHE)) == (2, 5, 3), CACHE,
+              packet_type="RESULT CACHE")
+
+# Results expire after 'ttl' seconds
+CACHE = jrpc_helper.ResultCache(ttl=0.01)
+CACHE.put(CACHE.key("lookup", ["towel"], {}), ["towel"], 1)
+RESULTS = [CACHE.get(CACHE.key("lookup", ["towel"], {}), 2) is not None]
+time.sleep(0.02)
+RESULTS.append(CACHE.get(CACHE.key("lookup", ["towel"], {}), 3) is not None)
+print_results(RESULTS == [True, False], RESULTS, packet_type="RESULT CACHE")
+
+# Fail (not a ResultCache)
+try:
+    DISPATCHER.register(lookup, name="lookup:bad", cache={})
+    DID_PASS = True
+except JSONRPCException as exception:
+    DID_PASS = False
+    ERRORS = exception
+print_results(DID_PASS, ERRORS, should_pass=False,
+              packet_type="RESULT CACHE")
+
+# ---------------------------------------
+# Response templates
+# ---------------------------------------
+TEMPLATE = jrpc_helper.ResponseTemplate.result({"spam": ["eggs", 1.5]})
+
+# Append tuple of (id, the response it should render)
+VERIFY_TEMPLATES = [
+    (7, jrpc_helper.JSONRPCResult({"spam": ["eggs", 1.5]}, response_id=7)),
+    ("été", jrpc_helper.JSONRPCResult({"spam": ["eggs", 1.5]},
+                                      response_id="été")),
+    (None, jrpc_helper.JSONRPCResult({"spam": ["eggs", 1.5]})),
+]
+
+for TEST in VERIFY_TEMPLATES:
+    DATA = TEMPLATE.render(TEST[0])
+    print_results(jrpc_helper.codec.loads(DATA) == TEST[1].packet, DATA,
+                  packet_type="RESPONSE TEMPLATE")
+
+# One template renders many ids, alone or as a batch array
+IDS = [1, "two", 3]
+RESULTS = [jrpc_helper.codec.loads(data) for data in TEMPLATE.render_many(IDS)]
+print_results(RESULTS == jrpc_helper.codec.loads(TEMPLATE.render_batch(IDS))
+              and [packet["id"] for packet in RESULTS] == IDS and
+              TEMPLATE.render_batch([]) is None,
+              RESULTS, packet_type="RESPONSE TEMPLATE")
+
+# Errors, with and without data, and from existing response objects
+VERIFY_TEMPLATES = [
+    (jrpc_helper.ResponseTemplate.error(4200, "Towel not found",
+                                        data={"towel": None}),
+     jrpc_helper.JSONRPCError(4200, "Towel not found", data={"towel": None},
+                              response_id=5)),
+    (jrpc_helper.ResponseTemplate.error(-32601, "Method not found"),
+     jrpc_helper.generate_error(-32601, response_id=5)),
+    (jrpc_helper.ResponseTemplate.from_response(
+        jrpc_helper.JSONRPCResult([1, 2], response_id=99)),
+     jrpc_helper.JSONRPCResult([1, 2], response_id=5)),
+]
+
+for TEST in VERIFY_TEMPLATES:
+    DATA = TEST[0].render(5)
+    print_results(jrpc_helper.codec.loads(DATA) == TEST[1].packet, DATA,
+                  packet_type="RESPONSE TEMPLATE")
+
+# Fail (a result that isn't JSON, a reserved error code)
+for TEST in (lambda: jrpc_helper.ResponseTemplate.result({1.5j}),
+             lambda: jrpc_helper.ResponseTemplate.error(-32000.5, "spam")):
+    try:
+        TEST()
+        DID_PASS = True
+    except JSONRPCException as exception:
+        DID_PASS = False
+        ERRORS = exception
+    print_results(DID_PASS, ERRORS, should_pass=False,
+                  packet_type="RESPONSE TEMPLATE")
+
+# ---------------------------------------
+# Execution policies
+# ---------------------------------------
+POOL_DISPATCHER = jrpc_helper.AsyncDispatcher()
+POOL_DISPATCHER.register(math.factorial, execution="process")
+
+
+@POOL_DISPATCHER.register(execution="thread")
+def thread_ident():
+    """
+    Test blocking method, returns the thread it ran in
+    """
+    return threading.get_ident()
+
+
+async def pool_calls():
+    """
+    Dispatch to methods run in a process pool and in a thread pool
+    """
+    return await asyncio.gather(
+        POOL_DISPATCHER.dispatch([
+            {"jsonrpc": "2.0", "id": index, "method": "factorial",
+             "params": [index]} for index in range(20)]),
+        POOL_DISPATCHER.dispatch({"jsonrpc": "2.0", "id": 1,
+                                  "method": "factorial", "params": [-1]}),
+        POOL_DISPATCHER.dispatch({"jsonrpc": "2.0", "id": 2,
+                                  "method": "thread_ident"}))
+
+RESULTS = asyncio.run(pool_calls())
+POOL_DISPATCHER.close()
+
+# Every result, in request order, and a raising method is an internal error
+print_results([packet["result"] for packet in RESULTS[0].return_packet()[1]] ==
+              [math.factorial(index) for index in range(20)] and
+              RESULTS[1].packet["error"]["code"] == -32603, RESULTS[1],
+              packet_type="EXECUTION POLICY")
+
+print_results(RESULTS[2].packet["result"] != threading.get_ident(),
+              RESULTS[2], packet_type="EXECUTION POLICY")
+
+# Fail (unknown execution, a pool on a sync dispatcher, an async method in
+#   a pool, a process method that can't be pickled)
+
+
+async def pooled_coroutine():
+    """
+    Test coroutine method, may only run inline
+    """
+
+for TEST in ((POOL_DISPATCHER, math.factorial, "cluster"),
+             (jrpc_helper.Dispatcher(), math.factorial, "process"),
+             (POOL_DISPATCHER, pooled_coroutine, "thread"),
+             (POOL_DISPATCHER, lambda: None, "process")):
+    try:
+        TEST[0].register(TEST[1], name="pooled", execution=TEST[2])
+        DID_PASS = True
+    except JSONRPCException as exception:
+        DID_PASS = False
+        ERRORS = exception
+    print_results(DID_PASS, ERRORS, should_pass=False,
+                  packet_type="EXECUTION POLICY")
+
+# ---------------------------------------
+# Pre-fork server
+# ---------------------------------------
+PREFORK_DISPATCHER = jrpc_helper.AsyncDispatcher(
+    metrics=jrpc_helper.Metrics())
+PREFORK_DISPATCHER.register(os.getpid, name="getpid")
+
+PREFORK = jrpc_helper.PreforkServer(PREFORK_DISPATCHER, "127.0.0.1",
+                                    workers=2, stats_interval=0.05,
+                                    restart_delay=0.05)
+
+
+async def prefork_calls(count):
+    """
+    Call getpid 'count' times, each on a new connection
+    """
+    pids = []
+    for _ in range(count):
+        client = await jrpc_helper.connect_tcp("127.0.0.1", PREFORK.port)
+        pids.append(await client.call("getpid", timeout=5))
+        client.close()
+    return pids
+
+
+def prefork_poll(seconds):
+    """
+    Supervise the workers for 'seconds'
+    """
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        PREFORK.poll(0.02)
+
+
+PREFORK.start()
+try:
+    # Every call is answered by one of the workers, not the supervisor
+    PIDS = asyncio.run(prefork_calls(20))
+    WORKER_PIDS = PREFORK.worker_pids()
+    print_results(len(WORKER_PIDS) == 2 and set(PIDS) <= set(WORKER_PIDS),
+                  PIDS, packet_type="PREFORK SERVER")
+
+    # A killed worker is replaced, and the calls it answered still count
+    prefork_poll(0.2)
+    os.kill(WORKER_PIDS[0], 9)
+    prefork_poll(0.3)
+    PIDS = asyncio.run(prefork_calls(5))
+    prefork_poll(0.2)
+    STATS = PREFORK.stats()
+    print_results(PREFORK.restarts == 1 and len(PREFORK.worker_pids()) == 2
+                  and WORKER_PIDS[0] not in PREFORK.worker_pids() and
+                  STATS.calls == {"getpid": 25}, STATS.calls,
+                  packet_type="PREFORK SERVER")
+finally:
+    PREFORK.stop()
+
+print_results(PREFORK.worker_pids() == [] and
+              PREFORK.stats().calls == {"getpid": 25}, PREFORK.stats().calls,
+              packet_type="PREFORK SERVER")
+
+# Fail (no workers)
+try:
+    jrpc_helper.PreforkServer(PREFORK_DISPATCHER, workers=0)
+    DID_PASS = True
+except JSONRPCException as exception:
+    DID_PASS = False
+    ERRORS = exception
+print_results(DID_PASS, ERRORS, should_pass=False,
+              packet_type="PREFORK SERVER")
+
+# ---------------------------------------
+# Binary encoding
+# ---------------------------------------
+# Append tuple of (value, its MessagePack bytes or None to only round trip)
+VERIFY_BINARY = [
+    ({"a": 1}, b"\x81\xa1a\x01"),
+    ([-1, -33, 200, 1.5], b"\x94\xff\xd0\xdf\xcc\xc8\xcb?\xf8" + b"\x00" * 6),
+    (b"\x00\n\xff", b"\xc4\x03\x00\n\xff"),
+    ([None, True, False, "été"], None),
+    ([2 ** 64 - 1, -2 ** 63, 2 ** 32, -2 ** 31 - 1, 65536], None),
+    ({"s": "x" * 300, "b": b"x" * 70000, "l": list(range(40))}, None),
+]
+
+for TEST in VERIFY_BINARY:
+    DATA = jrpc_helper.binary.packb(TEST[0])
+    print_results(jrpc_helper.binary.unpackb(DATA) == TEST[0] and
+                  TEST[1] in (None, DATA), DATA[:40],
+                  packet_type="BINARY ENCODING")
+
+# Decoded packets are checked as they are, byte strings and all
+PACKET = jrpc_helper.binary.unpackb(jrpc_helper.JSONRPCRequest(
+    "store", {"blob": b"\x89PNG"}, response_id=1).serialize(
+        jrpc_helper.binary.packb))
+run_validate_test(PACKET, JSONRPCTypes.REQUEST)
+
+# Fail (truncated, extra data, an extension type, a type it can't encode)
+for TEST in ((jrpc_helper.binary.unpackb, b"\x92\x01"),
+             (jrpc_helper.binary.unpackb, b"\x01\x02"),
+             (jrpc_helper.binary.unpackb, b"\xd4\x01\x00"),
+             (jrpc_helper.binary.packb, {1, 2})):
+    try:
+        TEST[0](TEST[1])
+        DID_PASS = True
+    except (ValueError, TypeError) as exception:
+        DID_PASS = False
+        ERRORS = exception
+    print_results(DID_PASS, ERRORS, should_pass=False,
+                  packet_type="BINARY ENCODING")
+
+
+@ASYNC_DISPATCHER.register(name="blob")
+def blob():
+    """
+    Test method whose result is bytes
+    """
+    return b"\x00\x01"
+
+
+async def binary_calls():
+    """
+    Call an "auto" server with a MessagePack client, batched, and a JSON
+    client, then have each fetch a bytes result
+    """
+    server = await jrpc_helper.serve_tcp(
+        ASYNC_DISPATCHER, "127.0.0.1", 0, framing="length-prefix",
+        encoding="auto")
+    port = server.sockets[0].getsockname()[1]
+    results = []
+
+    async with server:
+        for encoding in ("msgpack", "json"):
+            client = await jrpc_helper.connect_tcp(
+                "127.0.0.1", port, framing="length-prefix",
+                encoding=encoding, batch_window=0)
+            results.append(await asyncio.gather(
+                client.call("subtract", [42, 23]),
+                client.call("subtract", {"minuend": 1.5, "subtrahend": 1})))
+            try:
+                results.append(await client.call("blob"))
+            except jrpc_helper.JSONRPCRemoteError as exception:
+                results.append(exception.code)
+            client.close()
+
+        # A frame that isn't MessagePack is a parse error
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(framing.LengthPrefixDecoder.frame(b"\x92\x01"))
+        results.append(jrpc_helper.binary.unpackb(
+            (await reader.read(1024))[4:]))
+        writer.close()
+
+    return results
+
+RESULTS = asyncio.run(binary_calls())
+print_results(RESULTS[0] == RESULTS[2] == [19, 0.5] and
+              RESULTS[4]["error"]["code"] == -32700, RESULTS,
+              packet_type="BINARY ENCODING")
+
+# A bytes result is sent as it is over MessagePack, over JSON it can't be
+print_results(RESULTS[1] == b"\x00\x01" and RESULTS[3] == -32603, RESULTS,
+              packet_type="BINARY ENCODING")
+
+# A nested map or array deeper than MAX_DEPTH is a ValueError, not a crash
+try:
+    jrpc_helper.binary.unpackb(b"\x91" * 50000 + b"\xc0")
+    DID_PASS = True
+except ValueError as exception:
+    DID_PASS = False
+    ERRORS = exception
+print_results(DID_PASS, ERRORS, should_pass=False,
+              packet_type="BINARY ENCODING")
+
+# Fail (a binary encoding with a text framing, an unknown encoding)
+for TEST in ({"encoding": "msgpack"},
+             {"encoding": "cbor", "framing": "length-prefix"}):
+    try:
+        jrpc_helper.JSONRPCServerProtocol(ASYNC_DISPATCHER, **TEST)
+        DID_PASS = True
+    except JSONRPCException as exception:
+        DID_PASS = False
+        ERRORS = exception
+    print_results(DID_PASS, ERRORS, should_pass=False,
+                  packet_type="BINARY ENCODING")
+
+# ---------------------------------------
+# Lazy parsing
+# ---------------------------------------
+RAW = (b' {"jsonrpc": "2.0", "id": 5, "method": "subtract",'
+       b' "params": [42, {"note": "]}\\" [{"}]} ')
+LAZY = jrpc_helper.LazyPacket(RAW)
+
+# The envelope is read and checked, the params are left as they are
+print_results(LAZY["method"] == "subtract" and "params" not in
+              LAZY._values and  # pylint: disable=protected-access
+              LAZY.raw("params") == b'[42, {"note": "]}\\" [{"}]' and
+              LAZY.check(JSONRPCTypes.REQUEST) == JSONRPCVerifyCodes.OK,
+              LAZY.shape(), packet_type="LAZY PARSING")
+
+# Decoding any of it gives what decoding all of it does
+print_results(LAZY["params"] == [42, {"note": ']}" [{'}] and
+              LAZY.decode() == jrpc_helper.codec.loads(RAW), LAZY.decode(),
+              packet_type="LAZY PARSING")
+
+# A new id is spliced in, and a key can be added, the rest is untouched
+print_results(jrpc_helper.codec.loads(LAZY.replace("id", "proxy-1")) ==
+              dict(LAZY.decode(), id="proxy-1") and
+              jrpc_helper.codec.loads(jrpc_helper.LazyPacket(
+                  b"{}").replace("id", 1)) == {"id": 1},
+              LAZY.replace("id", "proxy-1"), packet_type="LAZY PARSING")
+
+# A batch has a LazyPacket per object
+RESULTS = jrpc_helper.lazy_parse(b'[{"id": 1}, 2, {"id": [3]}]')
+print_results([type(item) for item in RESULTS] ==
+              [jrpc_helper.LazyPacket, int, jrpc_helper.LazyPacket] and
+              RESULTS[2]["id"] == [3], RESULTS, packet_type="LAZY PARSING")
+
+
+async def lazy_dispatch(packets):
+    """
+    Dispatch 'packets' one by one on a lazy proxy that answers "subtract"
+    itself and routes only "users." methods
+    """
+    proxy = jrpc_helper.JSONRPCProxy({"users.": [("127.0.0.1", 4000)]},
+                                     lazy=True)
+    proxy.register(subtract)
+    return [await proxy.dispatch(packet) for packet in packets]
+
+
+# A lazy proxy answers like any other dispatcher, and never decodes the
+#   params of a request it can't route
+# Append tuple of (packet, the response it should get)
+VERIFY_LAZY = [
+    (b'{"jsonrpc": "2.0", "id": 1, "method": "subtract", "params": [42, 23]}',
+     {"jsonrpc": "2.0", "id": 1, "result": 19}),
+    (b'{"jsonrpc": "2.0", "id": 2, "method": "spam", "params": [not json]}',
+     jrpc_helper.generate_error(-32601, 2).packet),
+    (b'{"jsonrpc": "2.0", "id": 3, "method": "subtract", "params": [nope]}',
+     jrpc_helper.generate_error(-32700).packet),
+    (b'{"jsonrpc": "2.0", "id": 4, "method": "subtract", "params": 42}',
+     jrpc_helper.generate_error(-32600, 4).packet),
+    (b'{"jsonrpc": "2.0", "id": 5, "method": "subtract"',
+     jrpc_helper.generate_error(-32700).packet),
+]
+
+for TEST, RESPONSE in zip(VERIFY_LAZY, asyncio.run(
+        lazy_dispatch([TEST[0] for TEST in VERIFY_LAZY]))):
+    print_results(RESPONSE.packet == TEST[1], RESPONSE.packet,
+                  packet_type="LAZY PARSING")
+
+# Fail (not an object, bad structure, extra data, cut short, a key that
+#   isn't UTF-8 or has a bad escape)
+for TEST in (b'"spam"', b'{"id" 1}', b'{"id": 1} {}', b'{"id": [1}',
+             b'{"id"', b'{"i\xffd": 1}', b'{"i\\xd": 1}'):
+    try:
+        jrpc_helper.LazyPacket(TEST)
+        DID_PASS = True
+    except JSONRPCException as exception:
+        DID_PASS = False
+        ERRORS = exception
+    print_results(DID_PASS, ERRORS, should_pass=False,
+                  packet_type="LAZY PARSING")
+
+# ---------------------------------------
+# Proxy
+# ---------------------------------------
+BACKENDS = []
+
+for NAME in ("a", "b"):
+    BACKENDS.append(jrpc_helper.AsyncDispatcher())
+    BACKENDS[-1].register(subtract)
+    BACKENDS[-1].register(lambda name=NAME: name, name=NAME + ".backend")
+
+
+async def nap(name):
+    """
+    Stay busy for a moment, to have calls in flight on a backend
+    """
+    await asyncio.sleep(0.05)
+    return name
+
+BACKENDS[0].register(lambda: nap("a"), name="nap")
+BACKENDS[1].register(lambda: nap("b"), name="nap")
+
+
+async def proxy_calls(lazy):
+    """
+    Serve both backends, and call them through a proxy that routes "a."
+    and "b." methods to each and the rest to either, parsing packets
+    lazily if 'lazy'
+    """
+    servers = [await jrpc_helper.serve_tcp(backend, "127.0.0.1", 0)
+               for backend in BACKENDS]
+    addresses = [server.sockets[0].getsockname()[:2] for server in servers]
+    proxy = jrpc_helper.JSONRPCProxy({"a.": addresses[:1],
+                                      "b.": addresses[1:], "": addresses},
+                                     timeout=5, lazy=lazy,
+                                     metrics=jrpc_helper.Metrics())
+    proxy.register(lambda: "ok", name="health")
+    server = await jrpc_helper.serve_tcp(proxy, "127.0.0.1", 0)
+    clients = [await jrpc_helper.connect_tcp(
+        *server.sockets[0].getsockname()[:2]) for _ in range(2)]
+    results = []
+
+    results.append(await asyncio.gather(clients[0].call("a.backend"),
+                                        clients[0].call("b.backend"),
+                                        clients[0].call("health")))
+
+    # Both clients use the same ids, they share the upstream connections
+    results.append(await asyncio.gather(clients[0].call("subtract", [10, 1]),
+                                        clients[1].call("subtract", [20, 1])))
+
+    # Calls in flight are spread over both backends
+    results.append(sorted(await asyncio.gather(
+        *[clients[index % 2].call("nap") for index in range(4)])))
+
+    results.append(await proxy.dispatch(
+        '[{"jsonrpc": "2.0", "id": "x", "method": "b.backend"},'
+        ' {"jsonrpc": "2.0", "id": 7, "method": "a.backend"},'
+        ' {"jsonrpc": "2.0", "method": "subtract", "params": [1, 2]},'
+        ' {"jsonrpc": "2.0", "id": 8, "method": "c.backend"}, 5]'))
+
+    for client in clients:
+        client.close()
+    proxy.close()
+    server.close()
+    metrics = proxy.metrics
+
+    # A backend that's gone is an internal error
+    for backend in servers:
+        backend.close()
+        await backend.wait_closed()
+    results.append(await jrpc_helper.JSONRPCProxy(
+        {"": addresses[:1]}, lazy=lazy).dispatch(
+            '{"jsonrpc": "2.0", "id": 9, "method": "subtract"}'))
+    results.append(metrics)
+
+    return results
+
+for LAZY_PROXY in (False, True):
+    RESULTS = asyncio.run(proxy_calls(LAZY_PROXY))
+    print_results(RESULTS[0] == ["a", "b", "ok"] and
+                  RESULTS[1] == [9, 19] and
+                  RESULTS[2] == ["a", "a", "b", "b"], RESULTS[:3],
+                  packet_type="PROXY lazy={}".format(LAZY_PROXY))
+
+    # A batch is split over the backends and answered in request order
+    EXPECTED = [{"jsonrpc": "2.0", "id": "x", "result": "b"},
+                {"jsonrpc": "2.0", "id": 7, "result": "a"},
+                jrpc_helper.generate_error(-32601, 8).packet,
+                jrpc_helper.generate_error(-32600).packet]
+    print_results(jrpc_helper.codec.loads(RESULTS[3].serialize()) ==
+                  EXPECTED, RESULTS[3].serialize(),
+                  packet_type="PROXY lazy={}".format(LAZY_PROXY))
+
+    EXPECTED = jrpc_helper.generate_error(-32603, 9,
+                                          data="Backend unavailable")
+    print_results(RESULTS[4].packet == EXPECTED.packet, RESULTS[4].packet,
+                  packet_type="PROXY lazy={}".format(LAZY_PROXY))
+
+    # Calls are counted by route, not by whatever method a client sent,
+    #   and errors from a backend by their code
+    METRICS = RESULTS[5]
+    print_results(set(METRICS.calls) == {"a.*", "b.*", "*", "health"} and
+                  METRICS.method_errors == {"*": 1} and
+                  METRICS.errors == {-32601: 1, -32600: 1},
+                  (METRICS.calls, METRICS.method_errors, METRICS.errors),
+                  packet_type="PROXY lazy={}".format(LAZY_PROXY))
+
+# Fail (no routes, a prefix that isn't a str)
+for TEST in ({}, {1: [("127.0.0.1", 4000)]}):
+    try:
+        jrpc_helper.JSONRPCProxy(TEST)
+        DID_PASS = True
+    except JSONRPCException as exception:
+        DID_PASS = False
+        ERRORS = exception
+    print_results(DID_PASS, ERRORS, should_pass=False,
+                  packet_type="PROXY")